@@ -1,16 +1,21 @@
-import importlib.resources as resources
+import contextlib
 import logging
 import os
 import shutil
-import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from docxtpl import DocxTemplate
-from openpyxl import load_workbook
+import requests
 
 import autocana.constants as C
+from autocana.data.buildcache import BuildCache
+from autocana.data.closemonth import CloseMonthConfig
 from autocana.data.config import (
     SetupConfig,
+    convert_to_pdf,
+    ensure_ffmpeg_is_installed,
+    ensure_handbrake_is_installed,
     ensure_libreoffice_is_installed,
     increment_last_invoice,
     load_user_config,
@@ -18,15 +23,25 @@ from autocana.data.config import (
     save_user_config,
 )
 from autocana.data.download import DownloadConfig
-from autocana.data.invoice import InvoiceConfig
+from autocana.data.downloader import chunk_download_url, download_url, new_session, output_file
+from autocana.data.governor import governor
+from autocana.data.integrity import SHA256, Manifest, StreamHasher, file_digest
+from autocana.data.invoice import InvoiceConfig, invoice_build_key, render_invoice
+from autocana.data.jobqueue import DONE, IN_PROGRESS, DownloadQueue
+from autocana.data.ledger import Ledger, LedgerEntry, ReportConfig, import_invoices
 from autocana.data.newproject import (
     NewProjectConfig,
     change_project_name,
     change_project_version,
     create_virtual_environment_if_available,
 )
-from autocana.data.tsh import TSHConfig, fill_worked_days, fill_worksheet, sign_worksheet_if_configured
-from vscripts.downloader import chunk_download_url, download_url
+from autocana.data.pipeline import Pipeline
+from autocana.data.probe import ProbeConfig, probe_cache
+from autocana.data.profiles import BatchConfig, run_batch
+from autocana.data.reencode import ReencodeConfig, ReencodeIndex, reencode_all
+from autocana.data.tsh import TSHConfig, render_tsh, tsh_build_key
+from autocana.data.vedit import VEditConfig, run_stages
+from autocana.reporters import metrics
 
 logger = logging.getLogger("autocana")
 
@@ -39,24 +54,28 @@ def cmd_init_library(config: NewProjectConfig) -> int:
 
     try:
         logger.info(f"cloning template repo from {TEMPLATE_REPO_URL}")
-        subprocess.run(["git", "clone", TEMPLATE_REPO_URL, config.project_name], check=True)
+        with metrics.stage("clone"):
+            governor.run(["git", "clone", TEMPLATE_REPO_URL, config.project_name], check=True)
 
         path = Path(config.project_name).absolute()
 
         # init new git repo
         logger.info("initializing new git repository")
-        shutil.rmtree(path / ".git")
-        subprocess.run(["git", "init"], cwd=path, check=True)
+        with metrics.stage("init"):
+            shutil.rmtree(path / ".git")
+            governor.run(["git", "init"], cwd=path, check=True)
 
         # rename project
-        change_project_name(path, config.project_name.lower())
-        change_project_version(path, min=config.min_py, versions=config.versions)
+        with metrics.stage("rename"):
+            change_project_name(path, config.project_name.lower())
+            change_project_version(path, min=config.min_py, versions=config.versions)
 
-        shutil.move(path / "library", path / config.project_name)
+            shutil.move(path / "library", path / config.project_name)
 
         # create virtualenv if available
         if config.create_venv:
-            create_virtual_environment_if_available(path)
+            with metrics.stage("venv"):
+                create_virtual_environment_if_available(path)
     except Exception as e:
         shutil.rmtree(config.project_name)
         raise e
@@ -67,82 +86,179 @@ def cmd_init_library(config: NewProjectConfig) -> int:
 def cmd_invoice(config: InvoiceConfig) -> int:
     ensure_libreoffice_is_installed()
 
-    INVOICE_TEMPLATE_PATH = resources.files("autocana.templates") / "invoice.docx"
-    if not INVOICE_TEMPLATE_PATH.is_file():
-        raise ValueError(f"{INVOICE_TEMPLATE_PATH} does not exist")
+    if _generate_invoice(config):
+        metrics.inc("autocana_documents_generated_total", kind="invoice")
 
-    logger.info("creating temporary working directory 'temp'")
-    os.makedirs("temp", exist_ok=True)
+    logger.info(f"Invoice generation completed successfully ({config.output_path})")
+    logger.info("your invoice should be submitted to:")
+    logger.info("\t- signedtimesheet@arhs-developments.com")
+
+    return 0
 
-    try:
-        logger.info(f"loading {INVOICE_TEMPLATE_PATH}")
-        template = DocxTemplate(str(INVOICE_TEMPLATE_PATH))
 
-        logger.info("rendering new data into de template")
-        template.render(config.to_dict())
+def _generate_invoice(config: InvoiceConfig) -> bool:
+    """
+    Build the invoice unless the build cache has it, returns whether it was rendered.
+    """
+    cache = BuildCache()
+    key = invoice_build_key(config)
+    outputs = {"invoice.pdf": Path(config.output_path)}
+    if not config.force and cache.restore(key, outputs):
+        logger.info(f"invoice inputs unchanged, reusing the invoice already issued by cached build {key[:12]}")
+        return False
 
-        logger.info("saving new doc in 'temp/out.docx'")
-        template.save("temp/out.docx")
+    with tempfile.TemporaryDirectory(prefix="autocana-") as work_dir:
+        with metrics.stage("render"):
+            docx = render_invoice(config, Path(work_dir) / f"{Path(config.output_name).stem}.docx")
 
         logger.info("converting docx to pdf")
-        subprocess.run(
-            ["libreoffice", "--headless", "--convert-to", "pdf", "temp/out.docx"],
-            check=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
+        with metrics.stage("convert"):
+            [pdf] = convert_to_pdf([docx], Path(work_dir))
 
         logger.info(f"saving new generated pdf in {config.output_path}")
-        shutil.move("out.pdf", config.output_path)
+        shutil.move(pdf, config.output_path)
+    cache.store(key, outputs)
+    _issue_invoice(config)
+    return True
 
-        logger.info("updating last invoice number in user configuration")
-        increment_last_invoice(last_invoice=config.last_invoice)
-    finally:
-        logger.info("cleaning temp files")
-        shutil.rmtree("temp")
 
-    logger.info(f"Invoice generation completed successfully ({config.output_path})")
-    logger.info("your invoice should be submitted to:")
-    logger.info("\t- signedtimesheet@arhs-developments.com")
+def cmd_tsh(config: TSHConfig) -> int:
+    ensure_libreoffice_is_installed()
+
+    if _generate_tsh(config):
+        metrics.inc("autocana_documents_generated_total", kind="tsh")
+
+    logger.info(f"TSH generation completed successfully ({config.output_path})")
+    logger.info("your timesheet should be submitted to:")
+    logger.info("\t- timesheet@arhs-developments.com (XSLX version)")
+    logger.info("\t- signedtimesheet@arhs-developments.com (PDF version)")
 
     return 0
 
 
-def cmd_tsh(config: TSHConfig) -> int:
+def _generate_tsh(config: TSHConfig) -> bool:
+    """
+    Build the TSH unless the build cache has it, returns whether it was rendered.
+    """
+    cache = BuildCache()
+    key = tsh_build_key(config)
+    xlsx = Path(config.output_path)
+    outputs = {"tsh.xlsx": xlsx, "tsh.pdf": xlsx.with_suffix(".pdf")}
+    if not config.force and cache.restore(key, outputs):
+        logger.info(f"TSH inputs unchanged, reusing cached build {key[:12]}")
+        return False
+
+    with metrics.stage("render"):
+        render_tsh(config, xlsx)
+
+    logger.info("converting xlsx to pdf")
+    with metrics.stage("convert"):
+        convert_to_pdf([xlsx], xlsx.parent)
+    cache.store(key, outputs)
+    return True
+
+
+def cmd_batch(config: BatchConfig) -> int:
     ensure_libreoffice_is_installed()
 
-    TSH_TEMPLATE_PATH = resources.files("autocana.templates") / "tsh.xlsx"
-    if not TSH_TEMPLATE_PATH.is_file():
-        raise ValueError(f"{TSH_TEMPLATE_PATH} does not exist")
+    generate = _generate_invoice if config.command == "invoice" else _generate_tsh
+    logger.info(f"generating {config.command} for {len(config.profiles)} profiles using {config.jobs} processes")
+    results = run_batch(config, generate)
 
-    logger.info(f"loading {TSH_TEMPLATE_PATH}")
-    wb = load_workbook(str(TSH_TEMPLATE_PATH))
-    ws = wb["template to use"]
+    failed = [r for r in results if r.error is not None]
+    # profiles run in worker processes, only their results make it back
+    metrics.inc("autocana_documents_generated_total", sum(r.generated for r in results), kind=config.command)
+    logger.info(f"Batch generation completed ({len(results) - len(failed)} succeeded, {len(failed)} failed)")
+    for result in failed:
+        logger.error(f"\t- {result.profile}: {result.error}")
 
-    logger.info("rendering new data into de template")
-    fill_worksheet(config, ws)
+    return 1 if failed else 0
 
-    logger.info("filling worked days")
-    fill_worked_days(config, ws)
 
-    logger.info("signing worksheet")
-    sign_worksheet_if_configured(ws)
+def cmd_close_month(config: CloseMonthConfig) -> int:
+    ensure_libreoffice_is_installed()
 
-    logger.info(f"saving new generated TSH in {config.output_path}")
-    wb.save(config.output_path)
+    invoice, tsh = config.invoice, config.tsh
+    logger.info(f"closing {invoice.period.first_day.strftime('%B %Y')} with {invoice.billed_days} billed days")
+
+    cache = BuildCache()
+    invoice_key, tsh_key = invoice_build_key(invoice), tsh_build_key(tsh)
+    invoice_outputs = {"invoice.pdf": Path(invoice.output_path)}
+    xlsx = Path(tsh.output_path)
+    tsh_outputs = {"tsh.xlsx": xlsx, "tsh.pdf": xlsx.with_suffix(".pdf")}
+
+    build_invoice = invoice.force or not cache.restore(invoice_key, invoice_outputs)
+    build_tsh = tsh.force or not cache.restore(tsh_key, tsh_outputs)
+    if not build_invoice:
+        logger.info(f"invoice inputs unchanged, reusing the invoice already issued by cached build {invoice_key[:12]}")
+    if not build_tsh:
+        logger.info(f"TSH inputs unchanged, reusing cached build {tsh_key[:12]}")
+
+    if build_invoice or build_tsh:
+        with tempfile.TemporaryDirectory(prefix="autocana-") as work_dir, ThreadPoolExecutor(max_workers=2) as executor:
+            futures = []
+            if build_invoice:
+                docx_path = Path(work_dir) / f"{Path(invoice.output_name).stem}.docx"
+                futures.append(executor.submit(render_invoice, invoice, docx_path))
+            if build_tsh:
+                futures.append(executor.submit(render_tsh, tsh, xlsx))
+            with metrics.stage("render"):
+                sources = [f.result() for f in futures]
+
+            logger.info("converting documents to pdf")
+            with metrics.stage("convert"):
+                pdfs = convert_to_pdf(sources, Path(work_dir))
+            for source, pdf in zip(sources, pdfs):
+                output = invoice_outputs["invoice.pdf"] if source.suffix == ".docx" else tsh_outputs["tsh.pdf"]
+                logger.info(f"saving new generated pdf in {output}")
+                shutil.move(pdf, output)
+
+        if build_invoice:
+            cache.store(invoice_key, invoice_outputs)
+        if build_tsh:
+            cache.store(tsh_key, tsh_outputs)
+
+    if build_invoice:
+        _issue_invoice(invoice)
+        metrics.inc("autocana_documents_generated_total", kind="invoice")
+    if build_tsh:
+        metrics.inc("autocana_documents_generated_total", kind="tsh")
+
+    logger.info(f"Month close completed successfully ({invoice.output_path}, {tsh.output_path})")
+    logger.info("your documents should be submitted to:")
+    logger.info("\t- timesheet@arhs-developments.com (TSH XSLX version)")
+    logger.info("\t- signedtimesheet@arhs-developments.com (invoice and TSH PDF versions)")
 
-    logger.info("converting xlsx to pdf")
-    subprocess.run(
-        ["libreoffice", "--headless", "--convert-to", "pdf", "--outdir", config.output_path],
-        check=True,
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-    )
+    return 0
 
-    logger.info(f"TSH generation completed successfully ({config.output_path})")
-    logger.info("your timesheet should be submitted to:")
-    logger.info("\t- timesheet@arhs-developments.com (XSLX version)")
-    logger.info("\t- signedtimesheet@arhs-developments.com (PDF version)")
+
+def _issue_invoice(config: InvoiceConfig) -> None:
+    # reused invoices were already issued, only new ones take a number and a ledger row
+    logger.info("recording invoice in the ledger")
+    with metrics.stage("ledger"), Ledger() as ledger:
+        ledger.record(LedgerEntry.for_invoice(config))
+
+    logger.info("updating last invoice number in user configuration")
+    increment_last_invoice(last_invoice=config.last_invoice, path=config.config_path)
+
+
+def cmd_report(config: ReportConfig) -> int:
+    with Ledger() as ledger:
+        if config.import_dir is not None:
+            logger.info(f"importing invoices from {config.import_dir}")
+            imported, skipped = import_invoices(ledger, config.import_dir)
+            logger.info(f"{imported} invoices imported, {skipped} skipped")
+
+        for year, quarter, count, days, total in ledger.totals(config.year, config.quarterly):
+            period = f"{year} Q{quarter}" if quarter else f"{year}"
+            logger.info(f"{period}: {count} invoices, {days} days, {total:,.2f} EUR")
+
+        for profile, first, last in ledger.gaps():
+            missing = f"missing invoice numbers {first}-{last}" if first != last else f"missing invoice {first}"
+            logger.warning(f"{profile}: {missing}" if profile else missing)
+        for profile, number, count in ledger.duplicates():
+            duplicated = f"invoice number {number} recorded {count} times"
+            logger.warning(f"{profile}: {duplicated}" if profile else duplicated)
 
     return 0
 
@@ -152,15 +268,149 @@ def cmd_download(config: DownloadConfig) -> int:
         logger.info(f"creating output directory at {config.output_dir}")
         config.output_dir.mkdir(parents=True, exist_ok=True)
 
+    manifest = Manifest(config.output_dir)
+    if config.verify:
+        return _verify_downloads(config, manifest)
+
+    pipeline = None
+    if (post_process := config.post_process) is not None:
+        if post_process.quality is not None:
+            ensure_handbrake_is_installed()
+        else:
+            ensure_ffmpeg_is_installed()
+        threads = max(1, (os.cpu_count() or 1) // config.workers)
+        pipeline = Pipeline(lambda path: post_process.run(path, threads), workers=config.workers)
+        logger.info(f"post-processing downloads with {config.workers} workers")
+
+    downloaded = 0
+    with (
+        DownloadQueue(config.output_dir) as queue,
+        new_session(pool_size=config.pool_size) as session,
+        pipeline or contextlib.nullcontext(),
+    ):
+        if config.requeue_failed:
+            logger.info(f"{queue.requeue_failed()} failed downloads queued again")
+        if added := queue.add(config.urls, config.checksums):
+            logger.info(f"{added} new URLs queued")
+        if missing := queue.requeue_missing():
+            logger.info(f"{missing} downloaded files no longer exist, queued again")
+        if recovered := queue.recover():
+            logger.info(f"{recovered} downloads of interrupted workers queued again")
+
+        # other workers may be pulling from the same queue, each job is given to a single one
+        while (job := queue.claim()) is not None:
+            try:
+                with metrics.stage("download"):
+                    path = _download(session, job.url, job.checksum, config, manifest)
+            except (OSError, ValueError) as e:
+                logger.error(f"failed to download {job.url} (attempt {job.attempts}): {e}")
+                metrics.inc("autocana_downloads_total", result="failed")
+                queue.fail(job, str(e))
+                continue
+            queue.done(job, path)
+            metrics.inc("autocana_downloads_total", result="ok")
+            downloaded += 1
+
+            if pipeline is not None:
+                pipeline.submit(path)
+
+        counts = queue.counts()
+        failed = queue.failures()
+
+    logger.info(
+        f"Download completed ({downloaded} downloaded, {counts[DONE]} done, {len(failed)} failed, "
+        f"{counts[IN_PROGRESS]} in progress by other workers)"
+    )
+    for url, attempts, error in failed:
+        logger.error(f"\t- {url} ({attempts} attempts): {error}")
+    if failed:
+        logger.info("use --requeue-failed to retry the failed URLs")
+
+    if pipeline is not None:
+        logger.info(f"Post-processing completed ({len(pipeline.processed)} processed, {len(pipeline.failed)} failed)")
+        return 1 if failed or pipeline.failed else 0
+    return 1 if failed else 0
+
+
+def _download(
+    session: requests.Session, url: str, expected: str | None, config: DownloadConfig, manifest: Manifest
+) -> Path:
+    output = config.output_for(url)
+    logger.info(f"downloading from {url} to {output}\n")
+    hasher = StreamHasher(fast=config.fast_hash)
+    if "{}" in url:
+        path = chunk_download_url(
+            session, url, output, config.buffer_size, hasher=hasher, policy=config.retry, hedge=config.hedge
+        )
+    else:
+        path = download_url(session, url, output, config.buffer_size, hasher=hasher, policy=config.retry)
+
+    if expected and expected != hasher.digests[SHA256]:
+        path.unlink()
+        raise ValueError(f"checksum mismatch: expected {expected}, got {hasher.digests[SHA256]}")
+    manifest.record(path, url, hasher.size, hasher.digests)
+    return path
+
+
+def _verify_downloads(config: DownloadConfig, manifest: Manifest) -> int:
+    verified = failed = unverified = 0
     for url in config.urls:
-        logger.info(f"downloading from {url} to {config.output_path}\n")
-        if "{}" in url:
-            chunk_download_url(url, str(config.output_path))
+        path = output_file(url, config.output_for(url))
+        entry = manifest.get(path) or {}
+        expected = config.checksums.get(url, entry.get(SHA256))
+        if not path.is_file():
+            logger.error(f"missing file {path} for {url}")
+            failed += 1
+        elif expected is None:
+            logger.warning(f"no checksum known for {path}, unable to verify it")
+            unverified += 1
+        elif file_digest(path) != expected:
+            logger.error(f"checksum mismatch for {path}")
+            failed += 1
         else:
-            download_url(url, str(config.output_path))
+            logger.info(f"{path}: OK")
+            verified += 1
+
+    logger.info(f"Verification completed ({verified} OK, {failed} failed, {unverified} unverified)")
+    return 1 if failed else 0
+
+
+def cmd_vedit(config: VEditConfig) -> int:
+    ensure_ffmpeg_is_installed()
+
+    with tempfile.TemporaryDirectory(prefix="autocana-") as work_dir:
+        output = run_stages(config, Path(work_dir))
+
+    logger.info(f"Video edition completed successfully ({output})")
     return 0
 
 
+def cmd_reencode(config: ReencodeConfig) -> int:
+    ensure_handbrake_is_installed()
+
+    encoded, failed = reencode_all(config, ReencodeIndex())
+
+    logger.info(f"Re-encoding completed ({len(encoded)} encoded, {len(failed)} failed)")
+    for file, e in failed:
+        logger.error(f"\t- {file}: {e}")
+
+    return 1 if failed else 0
+
+
+def cmd_probe(config: ProbeConfig) -> int:
+    ensure_ffmpeg_is_installed()
+
+    if config.prune:
+        logger.info(f"forgot {probe_cache.prune()} probes of deleted files")
+
+    files = config.files
+    infos, failed = probe_cache.warm(files, config.jobs)
+
+    duration = sum(info.duration or 0.0 for info in infos.values())
+    logger.info(f"Probing completed ({len(infos)} files, {duration / 3600:.1f}h of media, {len(failed)} failed)")
+    return 1 if failed else 0
+
+
 def cmd_setup(config: SetupConfig) -> int:
     yaml_cfg = load_user_config()
 
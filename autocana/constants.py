@@ -7,5 +7,7 @@ VERSION = importlib.metadata.version(APP_NAME.lower())
 CONFIG_PATH = Path(os.getenv("XDG_CONFIG_HOME", Path.home() / ".config")) / APP_NAME.lower()
 CONFIG_FILE_PATH = CONFIG_PATH / "config.yaml"
 SIGNATURE_FILE_PATH = CONFIG_PATH / "signature.png"
+CACHE_PATH = Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache")) / APP_NAME.lower()
+CRASH_REPORTS_PATH = CACHE_PATH / "crash-reports"
 
 TEMPLATE_PATH = "autocana/templates/invoice.docx"
@@ -0,0 +1,103 @@
+import contextlib
+import hashlib
+import importlib.metadata
+import importlib.resources as resources
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Any
+
+import autocana.constants as C
+from autocana.data.integrity import file_digest
+from autocana.reporters.metrics import metrics
+
+logger = logging.getLogger("autocana")
+
+DEFAULT_MAX_ENTRIES = 100
+
+
+class BuildCache:
+    """
+    Previously generated documents, stored by the hash of everything that was used to build them (see 'build_key').
+
+    Each entry is a folder named after its key containing the built files. Only the 'max_entries' most recently used
+    entries are kept.
+    """
+
+    def __init__(self, path: Path = C.CACHE_PATH / "builds", max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.path = path
+        self.max_entries = max_entries
+
+    def restore(self, key: str, outputs: dict[str, Path]) -> bool:
+        """
+        Copy the cached files of 'key' into their 'outputs' destinations, returns False on a cache miss.
+        """
+        entry = self.path / key
+        hit = all((entry / name).is_file() for name in outputs)
+        metrics.cache("build", hit)
+        if not hit:
+            return False
+
+        for name, output in outputs.items():
+            shutil.copyfile(entry / name, output)
+        os.utime(entry)
+        return True
+
+    def store(self, key: str, files: dict[str, Path]) -> None:
+        entry = self.path / key
+        tmp = self.path / f".{key}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        for name, file in files.items():
+            shutil.copyfile(file, tmp / name)
+
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(tmp, entry)
+        self._prune()
+
+    def _prune(self) -> None:
+        entries: list[tuple[float, Path]] = []
+        for entry in self.path.iterdir():
+            if entry.is_dir() and not entry.name.startswith("."):
+                # other processes of a batch run may be pruning at the same time
+                with contextlib.suppress(FileNotFoundError):
+                    entries.append((entry.stat().st_mtime, entry))
+
+        for _, entry in sorted(entries, reverse=True)[self.max_entries :]:
+            logger.debug(f"removing old cached build {entry.name}")
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+def build_key(kind: str, payload: Any, template: str, files: list[Path] | None = None) -> str:
+    """
+    Hash the effective inputs of a document: the rendered 'payload', the 'template' bundled in 'autocana.templates',
+    any extra input 'files' (e.g. the signature) and the versions of the tools that build it.
+    """
+    with resources.as_file(resources.files("autocana.templates") / template) as template_path:
+        template_hash = file_digest(template_path)
+
+    inputs = {
+        "kind": kind,
+        "payload": payload,
+        "template": template_hash,
+        "files": {str(f): file_digest(f) if f.is_file() else None for f in files or []},
+        "tools": tool_versions(),
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def tool_versions() -> dict[str, str | None]:
+    versions: dict[str, str | None] = {"autocana": C.VERSION}
+    for package in ("docxtpl", "openpyxl"):
+        versions[package] = importlib.metadata.version(package)
+
+    # the binary identity changes on every upgrade and is much cheaper than starting libreoffice to ask its version
+    libreoffice = shutil.which("libreoffice")
+    if libreoffice is not None:
+        stat = Path(libreoffice).resolve().stat()
+        versions["libreoffice"] = f"{Path(libreoffice).resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+    else:
+        versions["libreoffice"] = None
+    return versions
@@ -0,0 +1,24 @@
+import argparse
+from dataclasses import dataclass
+
+from autocana.data.config import load_user_config
+from autocana.data.invoice import InvoiceConfig
+from autocana.data.tsh import TSHConfig
+
+
+@dataclass
+class CloseMonthConfig:
+    invoice: InvoiceConfig
+    tsh: TSHConfig
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "CloseMonthConfig":
+        yaml_cfg = load_user_config()
+        invoice = InvoiceConfig.load(yaml_cfg).with_params(args)
+        tsh = TSHConfig.load(yaml_cfg).with_params(args)
+        if args.days is None and not args.timesheet:
+            # a closed month bills its working days, not the default of a single invoice
+            invoice.billed_days = len(invoice.period.working_days(args.skip))
+        if invoice.period is not tsh.period:
+            raise ValueError("invoice and TSH must be generated for the same period")
+        return cls(invoice=invoice, tsh=tsh)
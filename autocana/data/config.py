@@ -1,8 +1,10 @@
 import argparse
 import importlib.resources as resources
 import logging
+import os
 import re
 import shutil
+import subprocess
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
@@ -11,10 +13,15 @@ import inquirer
 import yaml
 
 import autocana.constants as C
+from autocana.data.tools import run_tool
+from autocana.reporters.metrics import metrics
 from pyutils.validators import IBANValidator, is_valid_dni, is_valid_email
 
 logger = logging.getLogger("autocana")
 
+LIBREOFFICE_PROFILE_ENV = "AUTOCANA_LIBREOFFICE_PROFILE"
+CONVERTER_RESTARTS = 2
+
 
 @dataclass
 class SetupConfig:
@@ -40,6 +47,54 @@ def ensure_libreoffice_is_installed() -> None:
     logger.info("libreoffice found.")
 
 
+def convert_to_pdf(files: list[Path], output_dir: Path) -> list[Path]:
+    """
+    Convert all the 'files' to PDF with a single libreoffice call, paying its cold start only once.
+
+    Concurrent libreoffice instances sharing a user profile silently fail, processes converting in parallel point
+    'LIBREOFFICE_PROFILE_ENV' to a profile folder of their own. A crashed conversion, or one exiting without writing
+    some of the PDFs (as the first start of a fresh profile sometimes does), restarts libreoffice for the missing files.
+    """
+    options = []
+    if profile := os.environ.get(LIBREOFFICE_PROFILE_ENV):
+        options.append(f"-env:UserInstallation={Path(profile).absolute().as_uri()}")
+    outputs = {f: output_dir / f"{f.stem}.pdf" for f in files}
+    previous = {f: _mtime(pdf) for f, pdf in outputs.items()}
+
+    pending = files
+    for restart in range(CONVERTER_RESTARTS + 1):
+        if restart:
+            logger.warning(f"libreoffice did not convert {', '.join(f.name for f in pending)}, restarting it")
+            metrics.inc("autocana_converter_restarts_total")
+        cmd = ["libreoffice", *options, "--headless", "--convert-to", "pdf", "--outdir", str(output_dir)]
+        try:
+            run_tool([*cmd, *map(str, pending)])
+        except subprocess.CalledProcessError:
+            if restart == CONVERTER_RESTARTS:
+                raise
+        pending = [f for f in pending if _mtime(outputs[f]) in (None, previous[f])]
+        if not pending:
+            return list(outputs.values())
+
+    raise FileNotFoundError(f"libreoffice did not convert {', '.join(f.name for f in pending)}")
+
+
+def ensure_ffmpeg_is_installed() -> None:
+    logger.info("Checking for ffmpeg...")
+    if not shutil.which("ffmpeg") or not shutil.which("ffprobe"):
+        logger.info("ffmpeg not found.")
+        raise ValueError("No configured ffmpeg found")
+    logger.info("ffmpeg found.")
+
+
+def ensure_handbrake_is_installed() -> None:
+    logger.info("Checking for HandBrakeCLI...")
+    if not shutil.which("HandBrakeCLI"):
+        logger.info("HandBrakeCLI not found.")
+        raise ValueError("No configured HandBrakeCLI found")
+    logger.info("HandBrakeCLI found.")
+
+
 _REQUIRED_PRIVATE_FIELDS = ["address", "bank_account", "email", "full_name", "phone_number", "vat"]
 
 
@@ -53,38 +108,38 @@ def ensure_user_config_exists() -> Path:
     return C.CONFIG_FILE_PATH
 
 
-def load_user_config() -> dict[str, Any]:
-    with C.CONFIG_FILE_PATH.open() as config_file:
+def load_user_config(path: Path = C.CONFIG_FILE_PATH) -> dict[str, Any]:
+    with path.open() as config_file:
         yaml_cfg = yaml.load(config_file, Loader=yaml.SafeLoader)
 
-    if "private" not in yaml_cfg:
-        raise ValueError(f"Missing 'private' configuration in file: {C.CONFIG_FILE_PATH}")
+    if not isinstance(yaml_cfg, dict) or "private" not in yaml_cfg:
+        raise ValueError(f"Missing 'private' configuration in file: {path}")
     if any(k not in yaml_cfg["private"] for k in _REQUIRED_PRIVATE_FIELDS):
         missing = [k for k in _REQUIRED_PRIVATE_FIELDS if k not in yaml_cfg["private"]]
-        raise ValueError(f"Missing 'private' configurations: {missing}")
+        raise ValueError(f"Missing 'private' configurations in {path}: {missing}")
     if "invoicing" not in yaml_cfg:
         yaml_cfg["invoicing"] = {}
 
     return yaml_cfg
 
 
-def increment_last_invoice(last_invoice: int) -> None:
-    with open(C.CONFIG_FILE_PATH) as cfg_file:
+def increment_last_invoice(last_invoice: int, path: Path = C.CONFIG_FILE_PATH) -> None:
+    with open(path) as cfg_file:
         data = yaml.safe_load(cfg_file)
 
     logger.info(f"updating last generated invoice to {last_invoice + 1}")
     data["invoicing"]["last_invoice"] = last_invoice + 1
 
-    save_user_config(data)
+    save_user_config(data, path=path)
 
 
-def save_user_config(cfg: dict[str, Any], with_backup: bool = False) -> None:
+def save_user_config(cfg: dict[str, Any], with_backup: bool = False, path: Path = C.CONFIG_FILE_PATH) -> None:
     if with_backup:
         logger.info("backing up existing configuration")
-        shutil.copyfile(C.CONFIG_FILE_PATH, C.CONFIG_FILE_PATH.with_suffix(".bak"))
+        shutil.copyfile(path, path.with_suffix(".bak"))
 
     logger.info("saving updated configuration")
-    with open(C.CONFIG_FILE_PATH, "w") as file:
+    with open(path, "w") as file:
         yaml.safe_dump(cfg, file)
 
 
@@ -125,3 +180,10 @@ def run_iterative_setup() -> dict[str, Any]:
     new_config["invoicing"] = inquirer.prompt(_QUESTIONS["invoicing"])
 
     return new_config
+
+
+def _mtime(path: Path) -> int | None:
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
@@ -1,7 +1,11 @@
 import argparse
-from dataclasses import dataclass
+import re
+from dataclasses import dataclass, field
 from pathlib import Path
 
+from autocana.data.downloader import DEFAULT_BUFFER_SIZE, DEFAULT_POOL_SIZE, unique_file_names
+from autocana.data.pipeline import PostProcess
+from autocana.data.retry import RetryPolicy
 from pyutils.validators import is_valid_url
 
 
@@ -10,6 +14,26 @@ class DownloadConfig:
     urls: list[str]
     output_name: Path | None
     output_dir: Path
+    # names of the URLs that would otherwise be saved into the same file
+    file_names: dict[str, str] = field(default_factory=dict)
+
+    pool_size: int = DEFAULT_POOL_SIZE
+    buffer_size: int = DEFAULT_BUFFER_SIZE
+
+    retry: RetryPolicy = field(default_factory=RetryPolicy)
+    # percentile of the segment latency above which a segment is requested again
+    hedge: int | None = None
+
+    # expected SHA-256 of each URL, read from the 'url  sha256' lines of the URL list
+    checksums: dict[str, str] = field(default_factory=dict)
+    fast_hash: bool = False
+    verify: bool = False
+    # give the URLs that failed in a previous run another chance
+    requeue_failed: bool = False
+
+    # processing applied to each file as soon as it is downloaded
+    post_process: PostProcess | None = None
+    workers: int = 1
 
     @property
     def output_path(self) -> str:
@@ -17,26 +41,57 @@ class DownloadConfig:
             return str(self.output_dir / self.output_name)
         return str(self.output_dir)
 
+    def output_for(self, url: str) -> str:
+        if url in self.file_names:
+            return str(self.output_dir / self.file_names[url])
+        return self.output_path
+
     @classmethod
     def from_args(cls, args: argparse.Namespace) -> "DownloadConfig":
-        urls = cls._parse_urls(args)
+        checksums = cls._parse_urls(args)
+        urls = list(checksums.keys())
         if not urls:
             raise ValueError(f"no valid URLs found in '{args.url_or_path}'.")
         if args.output_dir and not Path(args.output_dir).is_dir():
             raise ValueError(f"output directory '{args.output_dir}' does not exist or is not a directory.")
         if args.output and len(urls) > 1:
             raise ValueError("output file name can only be specified when downloading a single URL.")
+        if args.pool_size < 1 or args.buffer_size < 1:
+            raise ValueError("pool and buffer sizes must be positive numbers.")
+        if args.workers is not None and args.workers < 1:
+            raise ValueError("the number of workers must be a positive number.")
+        if args.retries < 0 or args.connect_timeout <= 0 or args.read_timeout <= 0:
+            raise ValueError("retries can not be negative and timeouts must be positive numbers.")
+        if args.hedge is not None and not 50 <= args.hedge <= 99:
+            raise ValueError("the hedging percentile must be between 50 and 99.")
+
+        post_process = PostProcess.parse(args.then) if args.then else None
 
         return cls(
             urls=urls,
             output_name=Path(args.output) if args.output else None,
             output_dir=Path(args.output_dir) if args.output_dir else Path.cwd() / "downloads",
+            file_names=unique_file_names(urls),
+            pool_size=args.pool_size,
+            buffer_size=args.buffer_size * 1024,
+            retry=RetryPolicy(
+                retries=args.retries,
+                connect_timeout=args.connect_timeout,
+                read_timeout=args.read_timeout,
+            ),
+            hedge=args.hedge,
+            checksums={u: c for u, c in checksums.items() if c is not None},
+            fast_hash=args.fast_hash,
+            verify=args.verify,
+            requeue_failed=args.requeue_failed,
+            post_process=post_process,
+            workers=args.workers or (post_process.default_workers if post_process else 1),
         )
 
     @staticmethod
-    def _parse_urls(args: argparse.Namespace) -> list[str]:
+    def _parse_urls(args: argparse.Namespace) -> dict[str, str | None]:
         if is_valid_url(args.url_or_path):
-            return [args.url_or_path]
+            return {args.url_or_path: None}
 
         path = Path(args.url_or_path)
         if not path.is_file():
@@ -44,6 +99,18 @@ class DownloadConfig:
 
         try:
             lines = path.read_text(encoding="utf-8").splitlines()
-            return [u.strip() for u in lines if is_valid_url(u.strip())]
         except OSError as e:
             raise ValueError(f"failed to read file '{path}': {e}") from e
+
+        urls: dict[str, str | None] = {}
+        for line in lines:
+            url, *rest = line.split() or [""]
+            if not is_valid_url(url):
+                continue
+            if rest and not _SHA256_RE.fullmatch(rest[0]):
+                raise ValueError(f"invalid SHA-256 checksum '{rest[0]}' for '{url}'.")
+            urls[url] = rest[0].lower() if rest else None
+        return urls
+
+
+_SHA256_RE = re.compile(r"[0-9a-fA-F]{64}")
@@ -0,0 +1,437 @@
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+from collections import Counter, deque
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+from urllib.parse import unquote, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from autocana.data.integrity import StreamHasher
+from autocana.data.retry import RetryPolicy
+from autocana.reporters.metrics import metrics
+from autocana.reporters.progress import BYTES, Progress, progress_reporter
+
+logger = logging.getLogger("autocana")
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+# segments kept to compute the hedging threshold, and needed before hedging at all
+HEDGE_WINDOW = 100
+HEDGE_MIN_SAMPLES = 5
+
+_END_OF_SEGMENTS = {403, 404, 410}
+
+
+def new_session(pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """
+    Create a keep-alive session shared by all the downloads of a run.
+
+    'pool_size' is both the number of hosts kept in the pool and the number of connections kept alive per host, so
+    consecutive requests to the same host reuse the DNS lookup, TCP connection and TLS handshake.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def download_url(
+    session: requests.Session,
+    url: str,
+    output: str | Path,
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+    hasher: StreamHasher | None = None,
+    policy: RetryPolicy | None = None,
+) -> Path:
+    """
+    Download 'url' into a hidden '.<name>.part' file, renamed to its final name once complete.
+
+    A download interrupted after receiving some bytes keeps its partial file along with the ETag of the response, so
+    the next download of the same URL into the same folder continues it instead of starting over.
+    """
+    policy = policy or RetryPolicy()
+    path = output_file(url, output)
+    partial = path.with_name(f".{path.name}.part")
+    validator = _Validator.load(partial.with_name(f"{partial.name}.json"), url)
+    progress = progress_reporter.start(path.name, unit=BYTES)
+    try:
+        with partial.open("r+b" if validator.etag and partial.is_file() else "wb") as file:
+            _fetch_into(session, url, file, buffer_size, hasher, policy, progress=progress, validator=validator)
+    except BaseException:
+        progress_reporter.finish(progress, failed=True)
+        if not validator.etag or not partial.is_file() or not partial.stat().st_size:
+            partial.unlink(missing_ok=True)
+            validator.clear()
+        raise
+    os.replace(partial, path)
+    validator.clear()
+    progress_reporter.finish(progress)
+    return path
+
+
+def chunk_download_url(
+    session: requests.Session,
+    url: str,
+    output: str | Path,
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+    hasher: StreamHasher | None = None,
+    policy: RetryPolicy | None = None,
+    hedge: int | None = None,
+) -> Path:
+    """
+    Download a sequence of segments, replacing '{}' in the URL with the segment index, into a single file.
+
+    Indexes start at 0 (or 1 when there is no segment 0) and the download stops at the first missing segment. With
+    'hedge', segments slower than that percentile of the previous ones are requested a second time.
+    """
+    path = output_file(url, output)
+    progress = progress_reporter.start(path.name, unit=BYTES)
+    index, segments = 0, 0
+    try:
+        fetcher = _SegmentFetcher(session, buffer_size, policy or RetryPolicy(), hedge, progress)
+        with path.open("wb") as file:
+            while True:
+                if not fetcher.fetch(url.replace("{}", str(index)), file, hasher):
+                    if index == 0:
+                        index += 1
+                        continue
+                    break
+                index += 1
+                segments += 1
+    except BaseException:
+        progress_reporter.finish(progress, failed=True)
+        path.unlink(missing_ok=True)
+        raise
+
+    progress_reporter.finish(progress, failed=not segments)
+    if not segments:
+        path.unlink(missing_ok=True)
+        raise ValueError(f"no segments found for {url}")
+    logger.info(f"downloaded {segments} segments into {path}" + (f" ({fetcher.hedged} hedged)" if hedge else ""))
+    return path
+
+
+class _SegmentFetcher:
+    """
+    Fetch the segments of a chunked download.
+
+    When hedging, each segment is downloaded into memory by a thread of its own. If it takes longer than the 'hedge'
+    percentile of the latest segments an identical request is sent and the first one to complete wins, the connection
+    of the other one is shut down. This cuts the tail latency caused by the occasional stalled connection.
+
+    Requests do not share a fixed pool of threads: a loser still waiting for its response headers can not be cut off,
+    and it would otherwise hold a worker the next segments need until its read timeout.
+    """
+
+    def __init__(
+        self,
+        session: requests.Session,
+        buffer_size: int,
+        policy: RetryPolicy,
+        hedge: int | None = None,
+        progress: Progress | None = None,
+    ) -> None:
+        self.session = session
+        self.buffer_size = buffer_size
+        self.policy = policy
+        self.hedge = hedge
+        self.progress = progress
+        self.hedged = 0
+        self._latencies: deque[float] = deque(maxlen=HEDGE_WINDOW)
+
+    def fetch(self, url: str, file: BinaryIO, hasher: StreamHasher | None) -> bool:
+        """
+        Append the segment at 'url' to 'file', returns False when the segment does not exist.
+        """
+        if self.hedge is None:
+            return _fetch_into(
+                self.session, url, file, self.buffer_size, hasher, self.policy, missing_ok=True, progress=self.progress
+            )
+
+        data = self._hedged_fetch(url)
+        if data is None:
+            return False
+        file.write(data)
+        if hasher is not None:
+            hasher.update(data)
+        if self.progress is not None:
+            self.progress.done += len(data)
+            progress_reporter.update(self.progress)
+        return True
+
+    def threshold(self) -> float | None:
+        if self.hedge is None or len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return statistics.quantiles(self._latencies, n=100)[self.hedge - 1]
+
+    def _hedged_fetch(self, url: str) -> bytes | None:
+        race = _Race()
+        start = time.monotonic()
+        futures = {self._start(url, race)}
+        try:
+            threshold = self.threshold()
+            if threshold is not None and not wait(futures, timeout=threshold).done:
+                logger.debug(f"{url} slower than {threshold:.2f}s, sending a hedged request")
+                futures.add(self._start(url, race))
+                self.hedged += 1
+
+            error: BaseException | None = None
+            while futures:
+                finished, futures = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    if (e := future.exception()) is not None:
+                        error = error or e
+                        continue
+                    data = future.result()
+                    if data is not None:
+                        self._latencies.append(time.monotonic() - start)
+                    return data
+
+            assert error is not None
+            raise error
+        finally:
+            race.finish()
+
+    def _start(self, url: str, race: "_Race") -> "Future[bytes | None]":
+        future: Future[bytes | None] = Future()
+
+        def run() -> None:
+            try:
+                future.set_result(self._fetch_bytes(url, race))
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name=f"segment-{url}", daemon=True).start()
+        return future
+
+    def _fetch_bytes(self, url: str, race: "_Race") -> bytes | None:
+        def attempt() -> bytes | None:
+            # once the other request of a hedged pair wins this one is abandoned, neither continued nor retried
+            if race.done.is_set():
+                return None
+            buffer = io.BytesIO()
+            try:
+                with self.session.get(url, stream=True, timeout=self.policy.timeout) as response, race.track(response):
+                    if response.status_code in _END_OF_SEGMENTS:
+                        return None
+                    response.raise_for_status()
+                    for chunk in response.iter_content(chunk_size=self.buffer_size):
+                        if race.done.is_set():
+                            return None
+                        buffer.write(chunk)
+            except requests.RequestException:
+                if race.done.is_set():
+                    return None
+                raise
+            finally:
+                metrics.inc("autocana_downloaded_bytes_total", buffer.tell())
+            return buffer.getvalue()
+
+        return self.policy.call(attempt, url)
+
+
+class _Race:
+    """
+    Requests of a hedged segment, once it is fetched the responses still being read are shut down.
+    """
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self._responses: set[requests.Response] = set()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def track(self, response: requests.Response) -> Iterator[None]:
+        with self._lock:
+            if self.done.is_set():
+                _shutdown(response)
+            self._responses.add(response)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._responses.discard(response)
+
+    def finish(self) -> None:
+        with self._lock:
+            self.done.set()
+            for response in self._responses:
+                _shutdown(response)
+
+
+def _shutdown(response: requests.Response) -> None:
+    # shutting the socket down wakes up the thread blocked reading it, closing it from another thread would not
+    try:
+        response.raw.shutdown()
+    except (AttributeError, RuntimeError, ValueError, OSError):
+        response.close()
+
+
+def output_file(url: str, output: str | Path) -> Path:
+    """
+    Path where the download of 'url' is saved, 'output' can be either a file or a folder.
+    """
+    path = Path(output)
+    if not path.is_dir():
+        return path
+    return path / file_name(url)
+
+
+def file_name(url: str) -> str:
+    return Path(unquote(urlparse(url.replace("{}", "")).path)).name.strip("-_.") or "download"
+
+
+def unique_file_names(urls: list[str]) -> dict[str, str]:
+    """
+    File names of the 'urls' sharing their name with another URL of the list, made unique with a short hash of the URL
+    (e.g. 'video-1a2b3c4d.mp4'), so they do not overwrite each other. Other URLs keep their own name.
+    """
+    counts = Counter(file_name(url) for url in urls)
+    names = {}
+    for url in urls:
+        if counts[name := file_name(url)] > 1:
+            stem, suffix = Path(name).stem, Path(name).suffix
+            names[url] = f"{stem}-{hashlib.sha256(url.encode()).hexdigest()[:8]}{suffix}"
+    return names
+
+
+@dataclass
+class _Validator:
+    """
+    Strong ETag of the bytes received from 'url', saved into 'path' (when given) so another run can resume them.
+    """
+
+    url: str
+    etag: str | None = None
+    path: Path | None = None
+
+    @classmethod
+    def load(cls, path: Path, url: str) -> "_Validator":
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return cls(url=url, path=path)
+        return cls(url=url, etag=data.get("etag") if data.get("url") == url else None, path=path)
+
+    def update(self, etag: str | None) -> None:
+        # weak ETags can not be used to resume a download with 'If-Range'
+        etag = etag if etag and not etag.startswith("W/") else None
+        if etag == self.etag:
+            return
+        self.etag = etag
+        if self.path is not None:
+            self.path.write_text(json.dumps({"url": self.url, "etag": etag}), encoding="utf-8")
+
+    def clear(self) -> None:
+        self.etag = None
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+
+
+def _fetch_into(
+    session: requests.Session,
+    url: str,
+    file: BinaryIO,
+    buffer_size: int,
+    hasher: StreamHasher | None,
+    policy: RetryPolicy,
+    missing_ok: bool = False,
+    progress: Progress | None = None,
+    validator: _Validator | None = None,
+) -> bool:
+    """
+    Stream 'url' at the end of 'file' retrying with 'policy'. Returns False when 'missing_ok' and the server reports
+    the URL does not exist.
+
+    Bytes already after the current position of 'file' are a previous partial download of 'url', received with the
+    ETag in 'validator'. Both those and the bytes of failed attempts are continued with a range request, as long as
+    the server honors it and the ETag still matches. Otherwise the bytes written, hashed and counted are rolled back
+    and the download starts over.
+    """
+    validator = validator or _Validator(url)
+    position = file.tell()
+    checkpoint = hasher.checkpoint() if hasher is not None else None
+    counted = progress.done if progress is not None else 0.0
+
+    def rollback() -> None:
+        file.seek(position)
+        file.truncate()
+        if hasher is not None and checkpoint is not None:
+            hasher.rollback(checkpoint)
+        if progress is not None:
+            progress.done = counted
+
+    # hash and count the resumed bytes, as if they had just been downloaded
+    if validator.etag is None:
+        rollback()
+    else:
+        while chunk := file.read(buffer_size):
+            if hasher is not None:
+                hasher.update(chunk)
+            if progress is not None:
+                progress.done += len(chunk)
+
+    def attempt() -> bool:
+        received = file.seek(0, os.SEEK_END) - position
+        headers = {}
+        if received and validator.etag is not None:
+            headers = {"Range": f"bytes={received}-", "If-Range": validator.etag}
+        elif received:
+            rollback()
+            received = 0
+
+        with session.get(url, stream=True, timeout=policy.timeout, headers=headers) as response:
+            if missing_ok and response.status_code in _END_OF_SEGMENTS:
+                return False
+            response.raise_for_status()
+            if headers and not _continues(response, received):
+                logger.debug(f"{url} can not be resumed, downloading it again")
+                rollback()
+                received = 0
+            validator.update(response.headers.get("ETag"))
+            if progress is not None and not missing_ok and response.headers.get("Content-Length", "").isdigit():
+                progress.total = counted + received + int(response.headers["Content-Length"])
+            _stream_to(response, file, buffer_size, hasher, progress)
+        return True
+
+    return policy.call(attempt, url)
+
+
+def _continues(response: requests.Response, received: int) -> bool:
+    return response.status_code == 206 and response.headers.get("Content-Range", "").startswith(f"bytes {received}-")
+
+
+def _stream_to(
+    response: requests.Response,
+    file: BinaryIO,
+    buffer_size: int,
+    hasher: StreamHasher | None,
+    progress: Progress | None = None,
+) -> int:
+    written = 0
+    try:
+        for chunk in response.iter_content(chunk_size=buffer_size):
+            file.write(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
+            if progress is not None:
+                progress.done += len(chunk)
+                progress_reporter.update(progress)
+            written += len(chunk)
+    finally:
+        metrics.inc("autocana_downloaded_bytes_total", written)
+    return written
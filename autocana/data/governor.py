@@ -0,0 +1,215 @@
+import contextlib
+import fcntl
+import logging
+import os
+import subprocess
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any
+
+import autocana.constants as C
+
+logger = logging.getLogger("autocana")
+
+_MB = 1024**2
+_GB = 1024**3
+
+POLL_INTERVAL = 0.25
+
+
+@dataclass(frozen=True)
+class ToolBudget:
+    weight: int  # slots of the global job limit taken by a single process
+    memory: int  # approximated peak memory of a single process
+
+
+TOOL_BUDGETS = {
+    "libreoffice": ToolBudget(weight=1, memory=512 * _MB),
+    "git": ToolBudget(weight=1, memory=256 * _MB),
+    "virtualenv": ToolBudget(weight=1, memory=256 * _MB),
+    "ffmpeg": ToolBudget(weight=2, memory=1 * _GB),
+    "ffprobe": ToolBudget(weight=1, memory=128 * _MB),
+    "HandBrakeCLI": ToolBudget(weight=4, memory=2 * _GB),
+    "pdftotext": ToolBudget(weight=1, memory=128 * _MB),
+}
+DEFAULT_BUDGET = ToolBudget(weight=1, memory=256 * _MB)
+
+
+class Governor:
+    """
+    Scheduler every external tool goes through, shared by all the autocana processes of the machine.
+
+    The global limit is a set of 'jobs' lock files: a tool runs while holding as many of them as its weight, and the
+    memory reserved by the running tools must fit into the 'memory' budget. Slots are taken under a global lock so two
+    processes never hold half of the slots the other one needs, and as they are 'flock' locks they are released by
+    the OS even if the holder crashes.
+
+    A limit set with 'configure' is published in the governor folder for as long as the process runs, every process
+    enforces the lowest published limit (or its own default when there is none). Requests that have to wait take a
+    ticket, later requests only use the slots and memory the waiting ones leave, so a heavy tool waiting for several
+    slots at once is not starved by a stream of light ones.
+    """
+
+    def __init__(
+        self, path: Path = C.CACHE_PATH / "governor", jobs: int | None = None, memory: int | None = None
+    ) -> None:
+        self.path = path
+        self.jobs = jobs or os.cpu_count() or 1
+        self.memory = memory or _total_memory()
+        self._limit_file: IO[str] | None = None
+
+    def configure(self, jobs: int | None = None, memory: int | None = None) -> None:
+        if jobs is not None and jobs < 1:
+            raise ValueError("the number of jobs must be a positive number.")
+        self.jobs = jobs or self.jobs
+        self.memory = memory or self.memory
+        if jobs is not None:
+            with self._mutex():
+                self._publish_limit(jobs)
+
+    def run(
+        self, cmd: list[str], *, weight: int | None = None, memory: int | None = None, **kwargs: Any
+    ) -> subprocess.CompletedProcess[Any]:
+        """
+        'subprocess.run' waiting for the resources of the tool, 'weight' and 'memory' override its default budget.
+        """
+        with self.slot(Path(cmd[0]).name, weight=weight, memory=memory):
+            return subprocess.run(cmd, **kwargs)
+
+    @contextlib.contextmanager
+    def slot(self, tool: str, weight: int | None = None, memory: int | None = None) -> Iterator[None]:
+        budget = TOOL_BUDGETS.get(tool, DEFAULT_BUDGET)
+        weight = weight or budget.weight
+        memory = memory or budget.memory
+
+        waiting_since = None
+        ticket: IO[str] | None = None
+        try:
+            while True:
+                with self._mutex():
+                    held = self._try_acquire(weight, memory, ticket)
+                    if not held and ticket is None:
+                        ticket = self._take_ticket(weight, memory)
+                if held:
+                    break
+                if waiting_since is None:
+                    waiting_since = time.monotonic()
+                    logger.info(f"waiting for free resources to run {tool}")
+                time.sleep(POLL_INTERVAL)
+        finally:
+            if ticket is not None:
+                Path(ticket.name).unlink(missing_ok=True)
+                _release(ticket)
+
+        if waiting_since is not None:
+            logger.debug(f"{tool} waited {time.monotonic() - waiting_since:.1f}s for resources")
+        try:
+            yield
+        finally:
+            for slot in held:
+                _release(slot)
+
+    @contextlib.contextmanager
+    def _mutex(self) -> Iterator[None]:
+        self.path.mkdir(parents=True, exist_ok=True)
+        with (self.path / "governor.lock").open("a") as mutex:
+            fcntl.flock(mutex, fcntl.LOCK_EX)
+            yield
+
+    def _publish_limit(self, jobs: int) -> None:
+        if self._limit_file is None:
+            self._limit_file = (self.path / f"limit-{os.getpid()}-{id(self)}.lock").open("w")
+            # shared, so other processes checking whether the owner is alive can not take it while it runs
+            fcntl.flock(self._limit_file, fcntl.LOCK_SH)
+        self._limit_file.seek(0)
+        self._limit_file.truncate()
+        self._limit_file.write(str(jobs))
+        self._limit_file.flush()
+
+    def _limit(self) -> int:
+        limits = [int(values[0]) for values in _live_files(self.path.glob("limit-*.lock"))]
+        return min(limits) if limits else self.jobs
+
+    def _take_ticket(self, weight: int, memory: int) -> IO[str]:
+        # named after the time it was taken, so the tickets sort by age
+        ticket = (self.path / f"wait-{time.time_ns():020d}-{os.getpid()}-{threading.get_ident()}.lock").open("w")
+        fcntl.flock(ticket, fcntl.LOCK_EX)
+        ticket.write(f"{weight} {memory}")
+        ticket.flush()
+        return ticket
+
+    def _waiting_ahead(self, ticket: IO[str] | None, limit: int) -> tuple[int, int]:
+        """
+        Slots and memory needed by the requests waiting since before 'ticket' (all of them without a ticket).
+        """
+        older = [p for p in sorted(self.path.glob("wait-*.lock")) if ticket is None or p.name < Path(ticket.name).name]
+        waiting = list(_live_files(older))
+        return sum(min(limit, int(w)) for w, _ in waiting), sum(int(m) for _, m in waiting)
+
+    def _try_acquire(self, weight: int, memory: int, ticket: IO[str] | None = None) -> list[IO[str]]:
+        limit = self._limit()
+        weight = min(limit, weight)
+        free: list[IO[str]] = []
+        reserved = 0
+        for index in range(limit):
+            slot: IO[str] = (self.path / f"slot-{index}.lock").open("a+")
+            try:
+                fcntl.flock(slot, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # busy slot, its holder wrote the memory it reserved
+                slot.seek(0)
+                reserved += int(slot.read().strip() or 0)
+                slot.close()
+                continue
+            free.append(slot)
+
+        # a tool larger than the whole budget still runs, alone
+        ahead_weight, ahead_memory = self._waiting_ahead(ticket, limit)
+        alone = len(free) == limit and not ahead_weight
+        if len(free) - weight < ahead_weight or (not alone and reserved + ahead_memory + memory > self.memory):
+            for slot in free:
+                _release(slot)
+            return []
+
+        held, rest = free[:weight], free[weight:]
+        for slot in rest:
+            _release(slot)
+        for slot, value in zip(held, [memory] + [0] * (weight - 1)):
+            slot.seek(0)
+            slot.truncate()
+            slot.write(str(value))
+            slot.flush()
+        return held
+
+
+def _live_files(paths: Iterable[Path]) -> Iterator[list[str]]:
+    """
+    Values written in the lock files still held by a running process, the files of dead processes are removed.
+    """
+    for path in paths:
+        try:
+            file = path.open("r")
+        except FileNotFoundError:
+            continue
+        with file:
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield file.read().split()
+                continue
+            path.unlink(missing_ok=True)
+
+
+def _release(file: IO[str]) -> None:
+    fcntl.flock(file, fcntl.LOCK_UN)
+    file.close()
+
+
+def _total_memory() -> int:
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+
+
+governor = Governor()
@@ -0,0 +1,103 @@
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import threading
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+MANIFEST_NAME = "autocana-manifest.json"
+SHA256 = "sha256"
+CRC32 = "crc32"
+
+
+class StreamHasher:
+    """
+    Incrementally hash the bytes of a download while they are written, so no second read of the file is needed.
+
+    SHA-256 is always computed, CRC32 is a cheaper non-cryptographic checksum that can be enabled for quick checks.
+    """
+
+    def __init__(self, fast: bool = False) -> None:
+        self._sha256 = hashlib.sha256()
+        self._crc32: int | None = 0 if fast else None
+        self.size = 0
+
+    def update(self, chunk: bytes) -> None:
+        self._sha256.update(chunk)
+        if self._crc32 is not None:
+            self._crc32 = zlib.crc32(chunk, self._crc32)
+        self.size += len(chunk)
+
+    def checkpoint(self) -> "StreamHasher":
+        """
+        Copy of the current state, 'rollback' to it to discard the bytes of a failed attempt.
+        """
+        checkpoint = StreamHasher.__new__(StreamHasher)
+        checkpoint._sha256, checkpoint._crc32, checkpoint.size = self._sha256.copy(), self._crc32, self.size
+        return checkpoint
+
+    def rollback(self, checkpoint: "StreamHasher") -> None:
+        self._sha256, self._crc32, self.size = checkpoint._sha256.copy(), checkpoint._crc32, checkpoint.size
+
+    @property
+    def digests(self) -> dict[str, str]:
+        digests = {SHA256: self._sha256.hexdigest()}
+        if self._crc32 is not None:
+            digests[CRC32] = f"{self._crc32:08x}"
+        return digests
+
+
+def file_digest(path: Path, algorithm: str = SHA256) -> str:
+    """
+    Hash an existing file using a memory-mapped read, letting the OS page the file in instead of copying it through
+    Python buffers.
+    """
+    with path.open("rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            data: Any = b""
+        else:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if algorithm == CRC32:
+                return f"{zlib.crc32(data):08x}"
+            return hashlib.new(algorithm, data).hexdigest()
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+
+class Manifest:
+    """
+    Hashes of the downloaded files, stored as JSON next to them.
+
+    Several download processes can share the folder, each entry is merged into the manifest on disk under a 'flock', so
+    no process overwrites the entries recorded by the others since it started.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.path = directory / MANIFEST_NAME
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self) -> dict[str, dict[str, Any]]:
+        if not self.path.is_file():
+            return {}
+        entries: dict[str, dict[str, Any]] = json.loads(self.path.read_text(encoding="utf-8"))
+        return entries
+
+    def get(self, file: Path) -> dict[str, Any] | None:
+        with self._lock:
+            return self._entries.get(file.name)
+
+    def record(self, file: Path, url: str, size: int, digests: dict[str, str]) -> None:
+        entry = {"url": url, "size": size, "downloaded_at": datetime.now(timezone.utc).isoformat(), **digests}
+        with self._lock, (self.path.parent / f".{MANIFEST_NAME}.lock").open("a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._entries = {**self._load(), file.name: entry}
+            tmp = self.path.parent / f".{MANIFEST_NAME}.{os.getpid()}.tmp"
+            tmp.write_text(json.dumps(self._entries, indent=2, sort_keys=True), encoding="utf-8")
+            os.replace(tmp, self.path)
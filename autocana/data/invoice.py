@@ -1,12 +1,19 @@
 import argparse
-import calendar
+import importlib.resources as resources
 import textwrap
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Any
 
+from docxtpl import DocxTemplate
+
+import autocana.constants as C
+from autocana.data.buildcache import build_key
 from autocana.data.config import load_user_config
+from autocana.data.period import Period
 from autocana.data.private import PrivateConfig
+from autocana.data.timetracking import load_work_log
 from autocana.reporters.logs import logger
 from pyutils.strings import int_to_european
 
@@ -31,6 +38,7 @@ INVOICE_TEMPLATE_FIELDS = [
 ]
 
 DEFAULT_RATE = 500
+DEFAULT_BILLED_DAYS = 20
 DEFAULT_INVOICE_NUMBER = 1000
 
 
@@ -51,12 +59,21 @@ class InvoiceConfig:
     # only from params
     month: int
     billed_days: int = 0
+    force: bool = False  # build it again even if the build cache has it
     output_name: str = field(init=False)
 
+    # file keeping 'last_invoice' and its profile name, only set in batch mode
+    config_path: Path = C.CONFIG_FILE_PATH
+    profile: str = ""
+
     _output_dir: Path | None = None
 
+    @property
+    def period(self) -> Period:
+        return Period.of(self.month)
+
     def _default_name(self) -> str:
-        return f"{datetime.now(timezone.utc).replace(month=self.month).strftime('%B').lower()}_invoice.pdf"
+        return f"{self.period.first_day.strftime('%B').lower()}_invoice.pdf"
 
     @property
     def output_path(self) -> str:
@@ -65,8 +82,8 @@ class InvoiceConfig:
         return self.output_name
 
     @classmethod
-    def load(cls) -> "InvoiceConfig":
-        yaml_cfg = load_user_config()
+    def load(cls, yaml_cfg: dict[str, Any] | None = None) -> "InvoiceConfig":
+        yaml_cfg = yaml_cfg if yaml_cfg is not None else load_user_config()
         invoicing_cfg = yaml_cfg["invoicing"]
         return cls(
             private=PrivateConfig.load(yaml_cfg["private"]),
@@ -81,8 +98,16 @@ class InvoiceConfig:
 
     def with_params(self, params: argparse.Namespace) -> "InvoiceConfig":
         self.rate = params.rate if params.rate else self.rate
-        self.billed_days = params.days
         self.month = params.month if params.month is not None else self.month
+        self.force = params.force
+        if params.days is not None:
+            self.billed_days = params.days
+        elif getattr(params, "timesheet", None):
+            work_log = load_work_log(Path(params.timesheet), self.period)
+            logger.info(f"{work_log.total_hours}h logged in {work_log.billed_days} days of {params.timesheet}")
+            self.billed_days = work_log.billed_days
+        else:
+            self.billed_days = DEFAULT_BILLED_DAYS
         self.output_name = params.output if params.output else self._default_name()
         if params.output_dir:
             dir = Path(params.output_dir)
@@ -110,13 +135,9 @@ class InvoiceConfig:
         data["rate"] = f"{int_to_european(self.rate, grouping=True)} EUR"
         data["total"] = f"{int_to_european(self.rate * self.billed_days, grouping=True)} EUR"
 
-        today = datetime.now(timezone.utc).replace(month=self.month)
-        first_day = today.replace(day=1)
-        data["period_start"] = first_day.strftime("%d/%m/%Y")
-
-        last_day = today.replace(day=calendar.monthrange(today.year, today.month)[1])
-        data["invoice_date"] = last_day.strftime("%d/%m/%Y")
-        data["period_end"] = last_day.strftime("%d/%m/%Y")
+        data["period_start"] = self.period.first_day.strftime("%d/%m/%Y")
+        data["invoice_date"] = self.period.last_day.strftime("%d/%m/%Y")
+        data["period_end"] = self.period.last_day.strftime("%d/%m/%Y")
 
         if not all(f in data.keys() for f in INVOICE_TEMPLATE_FIELDS):
             raise ValueError(
@@ -125,3 +146,28 @@ class InvoiceConfig:
 
         logger.debug(data)
         return data
+
+
+def invoice_build_key(config: InvoiceConfig) -> str:
+    """
+    Key of the invoice built from 'config', leaving out its number: every run takes the next number, so a cache hit
+    means the invoice of these inputs was already issued and it is reused as it is, number included.
+    """
+    payload = {k: v for k, v in config.to_dict().items() if k != "invoice_number"}
+    return build_key("invoice", payload, "invoice.docx")
+
+
+def render_invoice(config: InvoiceConfig, docx_path: Path) -> Path:
+    INVOICE_TEMPLATE_PATH = resources.files("autocana.templates") / "invoice.docx"
+    if not INVOICE_TEMPLATE_PATH.is_file():
+        raise ValueError(f"{INVOICE_TEMPLATE_PATH} does not exist")
+
+    logger.info(f"loading {INVOICE_TEMPLATE_PATH}")
+    template = DocxTemplate(str(INVOICE_TEMPLATE_PATH))
+
+    logger.info("rendering new data into de template")
+    template.render(config.to_dict())
+
+    logger.info(f"saving new doc in '{docx_path}'")
+    template.save(str(docx_path))
+    return docx_path
@@ -0,0 +1,231 @@
+import contextlib
+import fcntl
+import logging
+import sqlite3
+import uuid
+from collections import Counter
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from types import TracebackType
+from typing import IO
+
+import autocana.constants as C
+
+logger = logging.getLogger("autocana")
+
+QUEUE_PATH = C.CACHE_PATH / "downloads.sqlite3"
+
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    queue TEXT NOT NULL,
+    url TEXT NOT NULL,
+    checksum TEXT,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    output TEXT,
+    error TEXT,
+    updated_at TEXT NOT NULL,
+    UNIQUE (queue, url)
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (queue, state, id);
+"""
+
+
+@dataclass(frozen=True)
+class Job:
+    id: int
+    url: str
+    checksum: str | None
+    attempts: int
+
+
+class DownloadQueue:
+    """
+    Durable queue of the URLs to download into a folder, each one 'pending', 'in_progress', 'done' or 'failed'.
+
+    The state is kept in an embedded SQLite database, so a killed run resumes with the URLs it did not finish and
+    several processes can pull from the same queue: jobs are claimed inside an immediate transaction, so no URL is
+    given to two workers. Every worker holds a 'flock' on a lock file of its own while it runs, as the OS releases it
+    when the process dies, the jobs of a crashed worker are given back to the queue by the next worker that opens it.
+    """
+
+    def __init__(self, output_dir: Path, path: Path = QUEUE_PATH) -> None:
+        self.name = str(output_dir.absolute())
+        self.worker = uuid.uuid4().hex
+        self._workers_dir = path.parent / "download-workers"
+        self._workers_dir.mkdir(parents=True, exist_ok=True)
+        # locked before it gets its name, other workers never see the lock file of a live worker unlocked
+        tmp = self._workers_dir / f".{self.worker}.tmp"
+        self._lock: IO[str] = tmp.open("w")
+        fcntl.flock(self._lock, fcntl.LOCK_EX)
+        tmp.rename(self._workers_dir / f"{self.worker}.lock")
+
+        # transactions are explicit, so claiming a job can take the write lock before reading
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def __enter__(self) -> "DownloadQueue":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def close(self) -> None:
+        # an interrupted run gives its unfinished jobs back right away
+        released = self._update(
+            f"state = '{PENDING}', worker = NULL", f"state = '{IN_PROGRESS}' AND worker = ?", self.worker
+        )
+        if released:
+            logger.info(f"{released} unfinished downloads returned to the queue")
+        self._conn.close()
+        (self._workers_dir / f"{self.worker}.lock").unlink(missing_ok=True)
+        self._lock.close()
+
+    def add(self, urls: list[str], checksums: dict[str, str] | None = None) -> int:
+        """
+        Queue the 'urls' not queued yet, returns the number of added URLs. Already queued URLs keep their state.
+        """
+        checksums = checksums or {}
+        with self._transaction():
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO jobs (queue, url, checksum, updated_at) VALUES (?, ?, ?, ?)",
+                [(self.name, url, checksums.get(url), _now()) for url in urls],
+            )
+            added = self._conn.total_changes - before
+            # a checksum added to an already queued URL is still enforced
+            self._conn.executemany(
+                "UPDATE jobs SET checksum = ? WHERE queue = ? AND url = ? AND checksum IS NOT ?",
+                [(checksum, self.name, url, checksum) for url, checksum in checksums.items()],
+            )
+        return added
+
+    def claim(self) -> Job | None:
+        """
+        Take the oldest pending job, or None when there is nothing left to do.
+        """
+        with self._transaction():
+            row = self._conn.execute(
+                "SELECT id, url, checksum, attempts FROM jobs WHERE queue = ? AND state = ? ORDER BY id LIMIT 1",
+                (self.name, PENDING),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, worker = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (IN_PROGRESS, self.worker, _now(), row[0]),
+            )
+        return Job(id=row[0], url=row[1], checksum=row[2], attempts=row[3] + 1)
+
+    def done(self, job: Job, output: Path) -> None:
+        self._finish(job, DONE, output=str(output.absolute()))
+
+    def fail(self, job: Job, error: str) -> None:
+        self._finish(job, FAILED, error=error)
+
+    def recover(self) -> int:
+        """
+        Give the jobs of dead workers back to the queue, returns the number of recovered jobs.
+        """
+        workers = [
+            row[0]
+            for row in self._conn.execute(
+                "SELECT DISTINCT worker FROM jobs WHERE queue = ? AND state = ? AND worker != ?",
+                (self.name, IN_PROGRESS, self.worker),
+            )
+        ]
+        recovered = 0
+        for worker in workers:
+            if self._is_alive(worker):
+                continue
+            recovered += self._update(
+                f"state = '{PENDING}', worker = NULL", f"state = '{IN_PROGRESS}' AND worker = ?", worker
+            )
+            (self._workers_dir / f"{worker}.lock").unlink(missing_ok=True)
+        return recovered
+
+    def requeue_failed(self) -> int:
+        return self._update(f"state = '{PENDING}', error = NULL", f"state = '{FAILED}'")
+
+    def requeue_missing(self) -> int:
+        """
+        Queue again the done jobs whose output file was removed since, returns the number of requeued jobs.
+        """
+        with self._transaction():
+            rows = self._conn.execute(
+                "SELECT id, output FROM jobs WHERE queue = ? AND state = ?", (self.name, DONE)
+            ).fetchall()
+            missing = [(_now(), job_id) for job_id, output in rows if output is None or not Path(output).exists()]
+            self._conn.executemany(
+                f"UPDATE jobs SET state = '{PENDING}', output = NULL, updated_at = ? WHERE id = ?", missing
+            )
+        return len(missing)
+
+    def counts(self) -> Counter[str]:
+        rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs WHERE queue = ? GROUP BY state", (self.name,))
+        return Counter(dict(rows.fetchall()))
+
+    def failures(self) -> list[tuple[str, int, str]]:
+        """
+        (url, attempts, error) of the failed jobs.
+        """
+        return self._conn.execute(
+            "SELECT url, attempts, error FROM jobs WHERE queue = ? AND state = ? ORDER BY id", (self.name, FAILED)
+        ).fetchall()
+
+    def _finish(self, job: Job, state: str, output: str | None = None, error: str | None = None) -> None:
+        with self._transaction():
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, worker = NULL, output = ?, error = ?, updated_at = ? WHERE id = ?",
+                (state, output, error, _now(), job.id),
+            )
+
+    def _update(self, assignments: str, condition: str, *params: str) -> int:
+        with self._transaction():
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? WHERE queue = ? AND {condition}",
+                (_now(), self.name, *params),
+            )
+            return cursor.rowcount
+
+    def _is_alive(self, worker: str) -> bool:
+        try:
+            lock = (self._workers_dir / f"{worker}.lock").open("r")
+        except FileNotFoundError:
+            return False
+        with lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(lock, fcntl.LOCK_UN)
+            return False
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[None]:
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
@@ -0,0 +1,228 @@
+import argparse
+import logging
+import re
+import shutil
+import sqlite3
+import subprocess
+from dataclasses import astuple, dataclass, fields
+from datetime import datetime, timezone
+from pathlib import Path
+from types import TracebackType
+
+import autocana.constants as C
+from autocana.data.governor import governor
+from autocana.data.integrity import file_digest
+from autocana.data.invoice import InvoiceConfig
+
+logger = logging.getLogger("autocana")
+
+LEDGER_PATH = C.CONFIG_PATH / "ledger.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    id INTEGER PRIMARY KEY,
+    number INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    days INTEGER NOT NULL,
+    rate REAL NOT NULL,
+    total REAL NOT NULL,
+    output_path TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    profile TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS invoices_period ON invoices (year, month);
+CREATE INDEX IF NOT EXISTS invoices_number ON invoices (profile, number);
+CREATE INDEX IF NOT EXISTS invoices_content_hash ON invoices (content_hash);
+"""
+
+
+@dataclass
+class LedgerEntry:
+    number: int
+    year: int
+    month: int
+    days: int
+    rate: float
+    total: float
+    output_path: str
+    content_hash: str
+    created_at: str
+    profile: str = ""
+
+    @classmethod
+    def for_invoice(cls, config: InvoiceConfig) -> "LedgerEntry":
+        return cls.for_file(
+            Path(config.output_path),
+            number=config.last_invoice + 1,
+            year=config.period.year,
+            month=config.month,
+            days=config.billed_days,
+            rate=config.rate,
+            profile=config.profile,
+        )
+
+    @classmethod
+    def for_file(
+        cls, file: Path, number: int, year: int, month: int, days: int, rate: float, profile: str = ""
+    ) -> "LedgerEntry":
+        return cls(
+            number=number,
+            year=year,
+            month=month,
+            days=days,
+            rate=rate,
+            total=rate * days,
+            output_path=str(file.absolute()),
+            content_hash=file_digest(file),
+            created_at=datetime.now(timezone.utc).isoformat(),
+            profile=profile,
+        )
+
+
+@dataclass
+class ReportConfig:
+    year: int | None
+    quarterly: bool
+    import_dir: Path | None
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "ReportConfig":
+        if args.import_dir and not Path(args.import_dir).is_dir():
+            raise ValueError(f"'{args.import_dir}' does not exist or is not a directory.")
+        return cls(
+            year=args.year,
+            quarterly=args.quarterly,
+            import_dir=Path(args.import_dir) if args.import_dir else None,
+        )
+
+
+class Ledger:
+    """
+    Embedded SQLite record of every generated invoice, indexed by period, number and content hash so aggregates and
+    consistency checks stay fast with thousands of rows.
+
+    Invoice numbers are checked per profile, each profile of a batch run keeps its own counter.
+    """
+
+    def __init__(self, path: Path = LEDGER_PATH) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def __enter__(self) -> "Ledger":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        self._conn.close()
+
+    def record(self, entry: LedgerEntry) -> None:
+        columns = [f.name for f in fields(LedgerEntry)]
+        with self._conn:
+            self._conn.execute(
+                f"INSERT INTO invoices ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                astuple(entry),
+            )
+
+    def contains(self, content_hash: str) -> bool:
+        query = "SELECT 1 FROM invoices WHERE content_hash = ? LIMIT 1"
+        return self._conn.execute(query, (content_hash,)).fetchone() is not None
+
+    def totals(self, year: int | None = None, quarterly: bool = False) -> list[tuple[int, int, int, int, float]]:
+        """
+        (year, quarter, invoices, days, total) rows, quarter is 0 when aggregating by year.
+        """
+        quarter = "(month - 1) / 3 + 1" if quarterly else "0"
+        query = f"""
+            SELECT year, {quarter} AS quarter, COUNT(*), SUM(days), SUM(total)
+            FROM invoices
+            WHERE ? IS NULL OR year = ?
+            GROUP BY year, quarter
+            ORDER BY year, quarter
+        """
+        return self._conn.execute(query, (year, year)).fetchall()
+
+    def gaps(self) -> list[tuple[str, int, int]]:
+        """
+        (profile, first, last) ranges of invoice numbers missing between the first and last recorded ones.
+        """
+        query = """
+            SELECT profile, previous + 1, number - 1
+            FROM (
+                SELECT profile, number, LAG(number) OVER (PARTITION BY profile ORDER BY number) AS previous
+                FROM (SELECT DISTINCT profile, number FROM invoices)
+            )
+            WHERE number - previous > 1
+            ORDER BY profile, number
+        """
+        return self._conn.execute(query).fetchall()
+
+    def duplicates(self) -> list[tuple[str, int, int]]:
+        query = """
+            SELECT profile, number, COUNT(*)
+            FROM invoices
+            GROUP BY profile, number
+            HAVING COUNT(*) > 1
+            ORDER BY profile, number
+        """
+        return self._conn.execute(query).fetchall()
+
+
+_NUMBER_RE = re.compile(r"NUMBER:\s*(\d+)")
+_PERIOD_RE = re.compile(r"\(\s*\d{2}/(\d{2})/(\d{4})\s*-\s*\d{2}/\d{2}/\d{4}\s*\)")
+_AMOUNT_RE = re.compile(r"(\d{1,3}(?:\.\d{3})*(?:,\d+)?)\s*EUR")
+
+
+def parse_invoice_pdf(file: Path) -> LedgerEntry:
+    """
+    Extract the ledger fields from a PDF generated from 'templates/invoice.docx' using 'pdftotext'.
+    """
+    result = governor.run(["pdftotext", str(file), "-"], check=True, capture_output=True, text=True)
+    return parse_invoice_text(file, result.stdout)
+
+
+def parse_invoice_text(file: Path, text: str) -> LedgerEntry:
+    number, period = _NUMBER_RE.search(text), _PERIOD_RE.search(text)
+    amounts = [float(a.replace(".", "").replace(",", ".")) for a in _AMOUNT_RE.findall(text)]
+    if number is None or period is None or len(amounts) < 2 or not amounts[0]:
+        raise ValueError(f"{file} does not look like a generated invoice")
+
+    rate, total = amounts[0], max(amounts)
+    return LedgerEntry.for_file(
+        file,
+        number=int(number.group(1)),
+        year=int(period.group(2)),
+        month=int(period.group(1)),
+        days=round(total / rate),
+        rate=rate,
+    )
+
+
+def import_invoices(ledger: Ledger, directory: Path) -> tuple[int, int]:
+    """
+    Record the invoices found in 'directory' that are not in the ledger yet, returns (imported, skipped).
+    """
+    if not shutil.which("pdftotext"):
+        raise ValueError("No configured pdftotext found, it is required to import existing invoices")
+
+    imported = skipped = 0
+    for file in sorted(directory.glob("*.pdf")):
+        if ledger.contains(file_digest(file)):
+            skipped += 1
+            continue
+        try:
+            entry = parse_invoice_pdf(file)
+        except (ValueError, subprocess.CalledProcessError) as e:
+            logger.warning(f"skipping {file}: {e}")
+            skipped += 1
+            continue
+        ledger.record(entry)
+        imported += 1
+    return imported, skipped
@@ -4,10 +4,11 @@ import logging
 import os
 import re
 import shutil
-import subprocess
 from dataclasses import dataclass
 from pathlib import Path
 
+from autocana.data.governor import governor
+
 logger = logging.getLogger("autocana")
 
 _FILES_TO_RENAME = [
@@ -62,7 +63,7 @@ def create_virtual_environment_if_available(path: Path) -> None:
     logger.info("creating new virtual environment")
     if not shutil.which("virtualenv"):
         return logger.error("no virtualenv found")
-    subprocess.run(["virtualenv", "--python", _find_latest_python_binary(), "venv"], cwd=path, check=True)
+    governor.run(["virtualenv", "--python", _find_latest_python_binary(), "venv"], cwd=path, check=True)
 
 
 def change_project_name(path: Path, name: str) -> None:
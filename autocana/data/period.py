@@ -0,0 +1,42 @@
+import calendar
+import functools
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+
+
+@dataclass(frozen=True)
+class Period:
+    year: int
+    month: int
+
+    @classmethod
+    @functools.cache
+    def of(cls, month: int, year: int | None = None) -> "Period":
+        """
+        Period for the given 'month' of 'year' (current year by default).
+
+        Instances are cached so the invoice and the TSH of the same month share the computed boundaries and working
+        days.
+        """
+        if not 1 <= month <= 12:
+            raise ValueError(f"invalid month {month}, use a value between 1 and 12")
+        return cls(year=year or datetime.now(timezone.utc).year, month=month)
+
+    @property
+    def first_day(self) -> date:
+        return date(self.year, self.month, 1)
+
+    @functools.cached_property
+    def last_day(self) -> date:
+        return date(self.year, self.month, calendar.monthrange(self.year, self.month)[1])
+
+    @functools.cached_property
+    def weekdays(self) -> tuple[int, ...]:
+        """
+        Days of the month from Monday to Friday.
+        """
+        first_weekday, days_in_month = calendar.monthrange(self.year, self.month)
+        return tuple(d for d in range(1, days_in_month + 1) if (first_weekday + d - 1) % 7 < 5)
+
+    def working_days(self, rest_days: list[int] | None = None) -> list[int]:
+        return [d for d in self.weekdays if d not in (rest_days or [])]
@@ -0,0 +1,98 @@
+import logging
+import os
+import queue
+import tempfile
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from types import TracebackType
+
+from autocana.data.reencode import QUALITIES, encode, plan_workers
+from autocana.data.vedit import VEditAction, VEditConfig, parse_actions, run_stages
+
+logger = logging.getLogger("autocana")
+
+
+@dataclass
+class PostProcess:
+    """
+    Processing applied to each downloaded file: either a chain of vedit actions or a 'reencode=<quality>' preset.
+    """
+
+    actions: list[VEditAction]
+    quality: str | None = None
+
+    @property
+    def default_workers(self) -> int:
+        if self.quality is not None:
+            return plan_workers(QUALITIES[self.quality])[0]
+        return max(1, (os.cpu_count() or 1) // 2)
+
+    @classmethod
+    def parse(cls, raw: list[str]) -> "PostProcess":
+        name, _, value = raw[0].partition("=")
+        if name != "reencode":
+            return cls(actions=parse_actions(raw))
+        if len(raw) > 1:
+            raise ValueError("'reencode' can not be combined with other post-processing actions.")
+        if value not in QUALITIES:
+            raise ValueError(f"unknown quality '{value}', use one of: {', '.join(QUALITIES)}")
+        return cls(actions=[], quality=value)
+
+    def run(self, file: Path, threads: int) -> Path:
+        if self.quality is not None:
+            return encode(file, file.with_name(f"{file.stem}_{self.quality}.mkv"), QUALITIES[self.quality], threads)
+
+        config = VEditConfig(input_path=file, actions=self.actions, output_name=None, output_dir=file.parent)
+        with tempfile.TemporaryDirectory(prefix="autocana-") as work_dir:
+            return run_stages(config, Path(work_dir))
+
+
+class Pipeline:
+    """
+    Run 'process' over the submitted files in a pool of worker threads while the producer keeps working.
+
+    Files travel through a bounded queue: once 'queue_size' files are waiting, 'submit' blocks so the producer can not
+    get arbitrarily ahead of the processing (e.g. filling the disk with downloads nobody has processed yet).
+    """
+
+    def __init__(self, process: Callable[[Path], Path], workers: int, queue_size: int | None = None) -> None:
+        self.process = process
+        self.processed: list[Path] = []
+        self.failed: list[tuple[Path, Exception]] = []
+        self._queue: queue.Queue[Path | None] = queue.Queue(maxsize=queue_size or workers * 2)
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+
+    def __enter__(self) -> "Pipeline":
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def submit(self, file: Path) -> None:
+        self._queue.put(file)
+
+    def _work(self) -> None:
+        while (file := self._queue.get()) is not None:
+            try:
+                output = self.process(file)
+            except Exception as e:
+                logger.error(f"failed to process {file}: {e}")
+                with self._lock:
+                    self.failed.append((file, e))
+            else:
+                logger.info(f"processed {file} into {output}")
+                with self._lock:
+                    self.processed.append(output)
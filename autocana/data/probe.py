@@ -0,0 +1,181 @@
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import subprocess
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import autocana.constants as C
+from autocana.data.governor import governor
+from autocana.reporters.metrics import metrics
+
+logger = logging.getLogger("autocana")
+
+PROBE_CACHE_PATH = C.CACHE_PATH / "probes.sqlite3"
+
+VIDEO_EXTENSIONS = {".avi", ".m4v", ".mkv", ".mov", ".mp4", ".mpg", ".ts", ".webm", ".wmv"}
+
+# stream fields kept in the cache, the raw ffprobe output is mostly codec internals nobody reads
+_STREAM_FIELDS = ["index", "codec_type", "codec_name", "avg_frame_rate", "width", "height", "channels", "tags"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS probes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    info TEXT NOT NULL,
+    probed_at TEXT NOT NULL
+);
+"""
+
+
+@dataclass
+class MediaInfo:
+    duration: float | None
+    streams: list[dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def codecs(self) -> list[str]:
+        return [s["codec_name"] for s in self.streams if "codec_name" in s]
+
+    @property
+    def frame_rate(self) -> float | None:
+        for stream in self.streams:
+            if stream.get("codec_type") == "video":
+                num, _, den = stream.get("avg_frame_rate", "0/0").partition("/")
+                if den and float(den):
+                    return float(num) / float(den)
+        return None
+
+    @classmethod
+    def from_ffprobe(cls, data: dict[str, Any]) -> "MediaInfo":
+        duration = data.get("format", {}).get("duration")
+        return cls(
+            duration=float(duration) if duration else None,
+            streams=[{k: s[k] for k in _STREAM_FIELDS if k in s} for s in data.get("streams", [])],
+        )
+
+
+@dataclass
+class ProbeConfig:
+    input_path: Path
+    recursive: bool
+    jobs: int | None
+    prune: bool
+
+    @property
+    def files(self) -> list[Path]:
+        return find_videos(self.input_path, self.recursive)
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "ProbeConfig":
+        path = Path(args.input)
+        if not path.exists():
+            raise ValueError(f"'{args.input}' does not exist.")
+        if args.jobs is not None and args.jobs < 1:
+            raise ValueError("the number of jobs must be a positive number.")
+        return cls(input_path=path, recursive=args.recursive, jobs=args.jobs, prune=args.prune)
+
+
+class ProbeCache:
+    """
+    Persistent ffprobe results, keyed by the file path and only valid while its size, modification time and inode
+    stay the same. A replaced or edited file misses the cache and is probed again.
+
+    The database is opened on first use, so importing the module costs nothing.
+    """
+
+    def __init__(self, path: Path = PROBE_CACHE_PATH, probe: Callable[[Path], dict[str, Any]] | None = None) -> None:
+        self.path = path
+        self.probe = probe or run_ffprobe
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def get(self, file: Path) -> MediaInfo:
+        file = file.absolute()
+        stat = file.stat()
+        key = (str(file), stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        query = "SELECT info FROM probes WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?"
+        with self._lock:
+            row = self._connection().execute(query, key).fetchone()
+        metrics.cache("probe", row is not None)
+        if row is not None:
+            return MediaInfo(**json.loads(row[0]))
+
+        logger.debug(f"probing {file}")
+        info = MediaInfo.from_ffprobe(self.probe(file))
+        with self._lock, self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, json.dumps(info.__dict__), datetime.now(timezone.utc).isoformat()),
+            )
+        return info
+
+    def streams(self, file: Path) -> list[dict[str, Any]]:
+        return self.get(file).streams
+
+    def warm(self, files: list[Path], workers: int | None = None) -> tuple[dict[Path, MediaInfo], list[Path]]:
+        """
+        Probe 'files' in parallel, returns the info of each file and the files that failed.
+
+        Cached files are a single indexed lookup, only new or changed files run ffprobe.
+        """
+        infos: dict[Path, MediaInfo] = {}
+        failed: list[Path] = []
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+            futures = {executor.submit(self.get, file): file for file in files}
+            for future in as_completed(futures):
+                file = futures[future]
+                try:
+                    infos[file] = future.result()
+                except (OSError, ValueError, subprocess.CalledProcessError) as e:
+                    logger.warning(f"unable to probe {file}: {e}")
+                    failed.append(file)
+        return infos, failed
+
+    def prune(self) -> int:
+        """
+        Remove the entries of files that no longer exist, returns the number of removed entries.
+        """
+        with self._lock:
+            paths = [row[0] for row in self._connection().execute("SELECT path FROM probes")]
+            missing = [(p,) for p in paths if not Path(p).exists()]
+            with self._connection() as conn:
+                conn.executemany("DELETE FROM probes WHERE path = ?", missing)
+        return len(missing)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+
+def find_videos(path: Path, recursive: bool) -> list[Path]:
+    if path.is_file():
+        return [path]
+    pattern = "**/*" if recursive else "*"
+    return sorted(p for p in path.glob(pattern) if p.is_file() and p.suffix.lower() in VIDEO_EXTENSIONS)
+
+
+def run_ffprobe(path: Path) -> dict[str, Any]:
+    result = governor.run(
+        ["ffprobe", "-v", "error", "-show_streams", "-show_format", "-of", "json", str(path)],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(result.stdout)
+
+
+probe_cache = ProbeCache()
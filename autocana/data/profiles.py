@@ -0,0 +1,148 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import tempfile
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from autocana.data.config import LIBREOFFICE_PROFILE_ENV, load_user_config
+from autocana.data.invoice import InvoiceConfig
+from autocana.data.tsh import TSHConfig
+
+logger = logging.getLogger("autocana")
+
+PROFILE_EXTENSIONS = {".yaml", ".yml"}
+SIGNATURE_EXTENSIONS = [".png", ".jpg", ".jpeg"]
+
+
+@dataclass
+class Profile:
+    """
+    A member of the team: a config file with the same 'private' and 'invoicing' sections as 'config.yaml' and an
+    optional signature image next to it sharing its name (e.g. 'jdoe.yaml' and 'jdoe.png').
+    """
+
+    name: str
+    config_path: Path
+    signature_path: Path
+
+    @classmethod
+    def discover(cls, directory: Path) -> list["Profile"]:
+        profiles = []
+        for path in sorted(p for p in directory.iterdir() if p.suffix in PROFILE_EXTENSIONS):
+            signatures = [path.with_suffix(ext) for ext in SIGNATURE_EXTENSIONS]
+            signature = next((s for s in signatures if s.is_file()), signatures[0])
+            profiles.append(cls(name=path.stem, config_path=path, signature_path=signature))
+        return profiles
+
+
+@dataclass
+class ProfileResult:
+    profile: str
+    output: str | None = None
+    error: str | None = None
+    generated: bool = False  # False when the documents were reused from the build cache
+
+
+@dataclass
+class BatchConfig:
+    command: str
+    profiles: list[Profile]
+    params: argparse.Namespace
+    jobs: int
+    output_dir: Path
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "BatchConfig":
+        directory = Path(args.profiles)
+        if not directory.is_dir():
+            raise ValueError(f"'{args.profiles}' does not exist or is not a directory.")
+        if args.output:
+            raise ValueError("'--output' can not be used with '--profiles', each profile uses its default file name.")
+
+        profiles = Profile.discover(directory)
+        if not profiles:
+            raise ValueError(f"no profile configs found in '{args.profiles}'")
+        if args.jobs is not None and args.jobs < 1:
+            raise ValueError("'--jobs' must be at least 1")
+
+        return cls(
+            command=args.command,
+            profiles=profiles,
+            params=args,
+            jobs=args.jobs or min(len(profiles), os.cpu_count() or 1),
+            output_dir=Path(args.output_dir) if args.output_dir else Path.cwd(),
+        )
+
+
+def load_profile(
+    command: str, profile: Profile, params: argparse.Namespace, output_dir: Path
+) -> InvoiceConfig | TSHConfig:
+    """
+    Build the 'command' config of 'profile', writing its documents into 'output_dir'.
+    """
+    yaml_cfg = load_user_config(profile.config_path)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    profile_params = argparse.Namespace(**{**vars(params), "output": None, "output_dir": str(output_dir)})
+
+    if command == "invoice":
+        invoice = InvoiceConfig.load(yaml_cfg).with_params(profile_params)
+        invoice.config_path, invoice.profile = profile.config_path, profile.name
+        return invoice
+
+    tsh = TSHConfig.load(yaml_cfg).with_params(profile_params)
+    tsh.signature_path = profile.signature_path
+    return tsh
+
+
+def run_batch(config: BatchConfig, run: Callable[[Any], bool]) -> list[ProfileResult]:
+    """
+    Run 'run' for every profile in a pool of processes, each profile writing into its own subfolder of the output
+    directory. 'run' returns whether it generated the documents or reused cached ones.
+
+    A failing profile does not stop the batch, its error is returned in its result.
+    """
+    results = []
+    with (
+        tempfile.TemporaryDirectory(prefix="autocana-") as work_dir,
+        ProcessPoolExecutor(
+            max_workers=config.jobs,
+            # forking a process with running threads can deadlock the workers
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(Path(work_dir),),
+        ) as executor,
+    ):
+        futures = {
+            executor.submit(_run_profile, run, config.command, p, config.params, config.output_dir / p.name): p
+            for p in config.profiles
+        }
+        for future in as_completed(futures):
+            profile = futures[future]
+            try:
+                output, generated = future.result()
+            except Exception as e:
+                logger.error(f"{profile.name}: {e}")
+                results.append(ProfileResult(profile=profile.name, error=str(e) or type(e).__name__))
+            else:
+                logger.info(f"{profile.name}: {output}")
+                results.append(ProfileResult(profile=profile.name, output=output, generated=generated))
+
+    return sorted(results, key=lambda r: r.profile)
+
+
+def _init_worker(work_dir: Path) -> None:
+    # workers only report through their results, the parent process logs the progress of the batch
+    logging.getLogger("autocana").setLevel(logging.WARNING)
+    os.environ[LIBREOFFICE_PROFILE_ENV] = str(work_dir / f"libreoffice-{os.getpid()}")
+
+
+def _run_profile(
+    run: Callable[[Any], bool], command: str, profile: Profile, params: argparse.Namespace, output_dir: Path
+) -> tuple[str, bool]:
+    config = load_profile(command, profile, params, output_dir)
+    return config.output_path, run(config)
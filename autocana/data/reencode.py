@@ -0,0 +1,252 @@
+import argparse
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import autocana.constants as C
+from autocana.data.probe import find_videos, probe_cache
+from autocana.data.tools import HandBrakeParser, run_tool
+
+logger = logging.getLogger("autocana")
+
+# encoders stop scaling well past a handful of threads, so it is cheaper to run more files in parallel instead
+MIN_THREADS_PER_JOB = 4
+_GB = 1024**3
+
+
+@dataclass(frozen=True)
+class Quality:
+    preset: str
+    memory: int  # approximated peak memory of a single HandBrakeCLI process
+    threads_option: str  # encoder option used to limit the number of threads
+
+
+QUALITIES = {
+    "2160p": Quality(preset="H.265 MKV 2160p60 4K", memory=4 * _GB, threads_option="pools"),
+    "1080p": Quality(preset="H.265 MKV 1080p30", memory=2 * _GB, threads_option="pools"),
+    "720p": Quality(preset="H.265 MKV 720p30", memory=1 * _GB, threads_option="pools"),
+    "AV1": Quality(preset="AV1 MKV 2160p60 4K", memory=6 * _GB, threads_option="lp"),
+}
+
+
+@dataclass
+class ReencodeConfig:
+    input_path: Path
+    quality: str
+    recursive: bool
+    jobs: int | None
+    output_name: str | None
+    output_dir: Path | None
+
+    @property
+    def files(self) -> list[Path]:
+        return find_videos(self.input_path, self.recursive)
+
+    def output_path(self, file: Path) -> Path:
+        if self.output_name:
+            return (self.output_dir or file.parent) / self.output_name
+        if self.output_dir is None:
+            return file.with_name(f"{file.stem}_{self.quality}.mkv")
+        relative = file.parent.relative_to(self.input_path) if self.input_path.is_dir() else Path()
+        return self.output_dir / relative / f"{file.stem}_{self.quality}.mkv"
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "ReencodeConfig":
+        path = Path(args.input)
+        if not path.exists():
+            raise ValueError(f"'{args.input}' does not exist.")
+        if args.quality not in QUALITIES:
+            raise ValueError(f"unknown quality '{args.quality}', use one of: {', '.join(QUALITIES)}")
+        if args.output_dir and not Path(args.output_dir).is_dir():
+            raise ValueError(f"output directory '{args.output_dir}' does not exist or is not a directory.")
+        if args.output and path.is_dir():
+            raise ValueError("output file name can only be specified when re-encoding a single file.")
+        if args.jobs is not None and args.jobs < 1:
+            raise ValueError("the number of jobs must be a positive number.")
+
+        return cls(
+            input_path=path,
+            quality=args.quality,
+            recursive=args.recursive,
+            jobs=args.jobs,
+            output_name=args.output,
+            output_dir=Path(args.output_dir) if args.output_dir else None,
+        )
+
+
+class ReencodeIndex:
+    """
+    Persistent index of already encoded files, keyed by the source fingerprint and the quality preset.
+
+    It is saved after every finished encode so interrupted runs keep their progress. Concurrent runs merge their
+    entries into the index on disk under a 'flock', and an unreadable index is started again from scratch.
+    """
+
+    def __init__(self, path: Path = C.CACHE_PATH / "reencode-index.json") -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self) -> dict[str, dict[str, Any]]:
+        if not self.path.is_file():
+            return {}
+        try:
+            entries: dict[str, dict[str, Any]] = json.loads(self.path.read_text(encoding="utf-8"))
+        except ValueError:
+            logger.warning(f"ignoring corrupt reencode index {self.path}")
+            return {}
+        return entries
+
+    @staticmethod
+    def key(fingerprint: str, quality: str) -> str:
+        return f"{fingerprint}:{quality}"
+
+    def output_for(self, fingerprint: str, quality: str) -> Path | None:
+        with self._lock:
+            entry = self._entries.get(self.key(fingerprint, quality))
+        if entry and Path(entry["output"]).is_file():
+            return Path(entry["output"])
+        return None
+
+    def outputs(self) -> set[Path]:
+        with self._lock:
+            return {Path(e["output"]).absolute() for e in self._entries.values()}
+
+    def add(self, fingerprint: str, quality: str, source: Path, output: Path) -> None:
+        entry = {
+            "source": str(source.absolute()),
+            "output": str(output.absolute()),
+            "encoded_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, self.path.with_suffix(".lock").open("a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._entries = {**self._load(), self.key(fingerprint, quality): entry}
+            tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(self._entries, indent=2), encoding="utf-8")
+            os.replace(tmp, self.path)
+
+
+def fingerprint(file: Path, sample_size: int = 1024 * 1024) -> str:
+    """
+    Identify a file by its size and its first and last 'sample_size' bytes.
+
+    Hashing full multi-GB videos would cost as much I/O as the encode itself, while the sampled hash is enough to
+    detect renamed, moved or replaced files.
+    """
+    size = file.stat().st_size
+    digest = hashlib.sha256(str(size).encode())
+    with file.open("rb") as f:
+        digest.update(f.read(sample_size))
+        if size > sample_size:
+            f.seek(max(sample_size, size - sample_size))
+            digest.update(f.read(sample_size))
+    return digest.hexdigest()
+
+
+def plan_workers(quality: Quality, jobs: int | None = None) -> tuple[int, int]:
+    """
+    Compute the number of parallel encodes and the threads given to each of them.
+
+    Without an explicit 'jobs' the pool is bounded both by the number of cores (leaving at least
+    'MIN_THREADS_PER_JOB' threads per encode) and by the available memory.
+    """
+    cpus = os.cpu_count() or 1
+    workers = jobs or max(1, min(cpus // MIN_THREADS_PER_JOB, _available_memory() // quality.memory))
+    return workers, max(1, cpus // workers)
+
+
+def encode(file: Path, output: Path, quality: Quality, threads: int) -> Path:
+    output.parent.mkdir(parents=True, exist_ok=True)
+    partial = output.with_name(f".{output.name}.part")
+    run_tool(
+        [
+            "HandBrakeCLI",
+            "--input",
+            str(file),
+            "--output",
+            str(partial),
+            "--preset",
+            quality.preset,
+            "--encopts",
+            f"{quality.threads_option}={threads}",
+        ],
+        HandBrakeParser(),
+        label=file.name,
+        weight=threads,
+        memory=quality.memory,
+    )
+    os.replace(partial, output)
+    return output
+
+
+def reencode_all(config: ReencodeConfig, index: ReencodeIndex) -> tuple[list[Path], list[tuple[Path, Exception]]]:
+    quality = QUALITIES[config.quality]
+    known_outputs = index.outputs()
+
+    pending: list[tuple[Path, str, Path]] = []
+    skipped = 0
+    for file in config.files:
+        if file.absolute() in known_outputs:
+            continue
+        file_fingerprint = fingerprint(file)
+        if done := index.output_for(file_fingerprint, config.quality):
+            logger.debug(f"skipping {file}, already encoded in {done}")
+            skipped += 1
+            continue
+        pending.append((file, file_fingerprint, config.output_path(file)))
+
+    if not pending:
+        logger.info(f"nothing to encode ({skipped} files already encoded)")
+        return [], []
+
+    if shutil.which("ffprobe"):
+        # longest videos first, so a long encode does not start last and leave the other workers idle
+        infos, _ = probe_cache.warm([file for file, _, _ in pending])
+        durations = {file: info.duration or 0.0 for file, info in infos.items()}
+        pending.sort(key=lambda p: durations.get(p[0], 0.0), reverse=True)
+
+    workers, threads = plan_workers(quality, config.jobs)
+    workers = min(workers, len(pending))
+    logger.info(f"encoding {len(pending)} files ({skipped} skipped) using {workers} workers x {threads} threads")
+
+    encoded: list[Path] = []
+    failed: list[tuple[Path, Exception]] = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(encode, file, output, quality, threads): (file, file_fingerprint)
+            for file, file_fingerprint, output in pending
+        }
+        for future in as_completed(futures):
+            file, file_fingerprint = futures[future]
+            try:
+                output = future.result()
+            except Exception as e:
+                logger.error(f"failed to encode {file}: {e}")
+                failed.append((file, e))
+                continue
+            index.add(file_fingerprint, config.quality, file, output)
+            encoded.append(output)
+            logger.info(f"[{len(encoded) + len(failed)}/{len(pending)}] encoded {file} into {output}")
+
+    return encoded, failed
+
+
+def _available_memory() -> int:
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
@@ -0,0 +1,92 @@
+import email.utils
+import logging
+import random
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import TypeVar
+
+import requests
+
+from autocana.reporters.metrics import metrics
+
+logger = logging.getLogger("autocana")
+
+T = TypeVar("T")
+
+DEFAULT_RETRIES = 5
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 60.0
+
+# statuses meaning the server may answer on a later attempt, any other error status is final
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+MAX_RETRY_AFTER = 300.0
+
+
+@dataclass
+class RetryPolicy:
+    """
+    How failed requests are retried: up to 'retries' extra attempts waiting an exponential backoff with full jitter
+    between them, unless the server asks for a specific wait through 'Retry-After'.
+    """
+
+    retries: int = DEFAULT_RETRIES
+    backoff: float = 0.5
+    max_backoff: float = 30.0
+
+    connect_timeout: float = DEFAULT_CONNECT_TIMEOUT
+    read_timeout: float = DEFAULT_READ_TIMEOUT
+
+    @property
+    def timeout(self) -> tuple[float, float]:
+        return self.connect_timeout, self.read_timeout
+
+    def delay(self, attempt: int, error: Exception) -> float:
+        if (wait := retry_after(error)) is not None:
+            return min(wait, MAX_RETRY_AFTER)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    def call(self, func: Callable[[], T], description: str) -> T:
+        attempt = 0
+        while True:
+            try:
+                return func()
+            except Exception as e:
+                if attempt >= self.retries or not is_retryable(e):
+                    raise
+                delay = self.delay(attempt, e)
+                attempt += 1
+                metrics.inc("autocana_retries_total")
+                logger.warning(f"{description} failed ({e}), retry {attempt}/{self.retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Transient network errors and server overload statuses are retried, client errors and TLS failures are not.
+    """
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in RETRYABLE_STATUSES
+    if isinstance(error, requests.exceptions.SSLError):
+        return False
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError))
+
+
+def retry_after(error: Exception) -> float | None:
+    """
+    Seconds requested by the 'Retry-After' header of the failed response, given either as seconds or as an HTTP date.
+    """
+    response = getattr(error, "response", None)
+    value = response.headers.get("Retry-After") if response is not None else None
+    if value is None:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:  # '-0000' dates are parsed as naive, they are still UTC
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,298 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import IO
+
+import autocana.constants as C
+from autocana.data.period import Period
+
+logger = logging.getLogger("autocana")
+
+# header names used by the usual time trackers (Toggl, Clockify, Harvest, spreadsheets), by priority
+DATE_COLUMNS = ["date", "start date", "start_date", "day", "fecha"]
+HOURS_COLUMNS = ["hours", "duration (decimal)", "duration", "duration (h)", "time", "horas"]
+ACTIVITY_COLUMNS = ["activity", "project", "task", "description", "actividad"]
+
+CSV_SUFFIXES = {".csv", ".tsv", ".txt"}
+ICAL_SUFFIXES = {".ics", ".ical"}
+
+_ISO_DURATION_RE = re.compile(r"^P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+
+# (day, activity, hours)
+_Record = tuple[date, str, float]
+# records of an export between two offsets, along with the offsets where each of them starts and ends
+_Reader = Callable[[IO[bytes], int, int | None], Iterator[tuple[int, int, _Record]]]
+
+
+@dataclass
+class WorkLog:
+    """
+    Hours of a month aggregated per day and activity.
+    """
+
+    period: Period
+    entries: dict[int, dict[str, float]] = field(default_factory=dict)
+
+    def add(self, day: date, activity: str, hours: float) -> None:
+        activities = self.entries.setdefault(day.day, {})
+        activities[activity] = activities.get(activity, 0.0) + hours
+
+    def hours(self, day: int) -> float:
+        return round(sum(self.entries.get(day, {}).values()), 2)
+
+    @property
+    def days(self) -> list[int]:
+        return sorted(d for d in self.entries if self.hours(d) > 0)
+
+    @property
+    def billed_days(self) -> int:
+        """
+        Days with any logged work, a partial day is billed as a full one.
+        """
+        return len(self.days)
+
+    @property
+    def total_hours(self) -> float:
+        return round(sum(self.hours(d) for d in self.entries), 2)
+
+    def activities(self) -> dict[str, float]:
+        totals: dict[str, float] = {}
+        for activities in self.entries.values():
+            for activity, hours in activities.items():
+                totals[activity] = totals.get(activity, 0.0) + hours
+        return totals
+
+
+class ExportIndex:
+    """
+    Byte ranges holding the records of each month of an export, saved next to the other caches.
+
+    Exports cover years of entries while a TSH needs a single month: the first read of an export streams it once to
+    build the index, later reads of any month only parse its ranges. The index is rebuilt when the export changes.
+    """
+
+    def __init__(self, export: Path, cache_dir: Path = C.CACHE_PATH / "timetracking") -> None:
+        export = export.absolute()
+        stat = export.stat()
+        self.path = cache_dir / f"{hashlib.sha256(str(export).encode()).hexdigest()[:32]}.json"
+        self.version = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        self.months: dict[str, list[list[int]]] | None = None
+        if self.path.is_file():
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("version") == self.version:
+                self.months = data["months"]
+
+    @staticmethod
+    def key(day: date) -> str:
+        return f"{day.year:04d}-{day.month:02d}"
+
+    def save(self, months: dict[str, list[list[int]]]) -> None:
+        self.months = months
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"version": self.version, "months": months}), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+def load_work_log(export: Path, period: Period, cache_dir: Path = C.CACHE_PATH / "timetracking") -> WorkLog:
+    """
+    Aggregate the hours logged during 'period' in a CSV or iCalendar 'export'.
+
+    The export is streamed record by record, so memory does not grow with its size, and only the ranges of the
+    month are parsed once the export is indexed (see 'ExportIndex').
+    """
+    if not export.is_file():
+        raise ValueError(f"time-tracking export '{export}' does not exist.")
+    suffix = export.suffix.lower()
+    if suffix not in CSV_SUFFIXES | ICAL_SUFFIXES:
+        raise ValueError(f"unsupported time-tracking export '{export}', use a CSV or an iCalendar (.ics) file.")
+
+    log = WorkLog(period)
+    index = ExportIndex(export, cache_dir)
+    wanted = ExportIndex.key(period.first_day)
+    with export.open("rb") as file:
+        reader: _Reader = _csv_reader(file) if suffix in CSV_SUFFIXES else _ical_records
+        if index.months is not None:
+            logger.debug(f"reading {wanted} from the indexed {export}")
+            for start, end in index.months.get(wanted, []):
+                for _, _, (day, activity, hours) in reader(file, start, end):
+                    log.add(day, activity, hours)
+            return log
+
+        logger.info(f"indexing {export}")
+        months: dict[str, list[list[int]]] = {}
+        for start, end, (day, activity, hours) in reader(file, 0, None):
+            ranges = months.setdefault(ExportIndex.key(day), [])
+            # sorted exports end up as a single range per month
+            if ranges and ranges[-1][1] == start:
+                ranges[-1][1] = end
+            else:
+                ranges.append([start, end])
+            if (day.year, day.month) == (period.year, period.month):
+                log.add(day, activity, hours)
+
+    index.save(months)
+    return log
+
+
+class _Lines:
+    """
+    Decoded lines of a binary file between two offsets, 'line_start' and 'position' are the offsets where the last line
+    read starts and ends.
+    """
+
+    def __init__(self, file: IO[bytes], start: int, end: int | None) -> None:
+        file.seek(start)
+        self.file = file
+        self.line_start = start
+        self.position = start
+        self.end = end
+
+    def __iter__(self) -> Iterator[str]:
+        while self.end is None or self.position < self.end:
+            line = self.file.readline()
+            if not line:
+                return
+            self.line_start, self.position = self.position, self.position + len(line)
+            yield line.decode("utf-8", errors="replace")
+
+
+def _csv_reader(file: IO[bytes]) -> _Reader:
+    lines = _Lines(file, 0, None)
+    header_line = next(iter(lines), "").lstrip("\ufeff")
+    # spreadsheets with a decimal comma export ';' separated files
+    delimiter = max(",;\t", key=header_line.count)
+    header = [h.strip().lower() for h in next(csv.reader([header_line], delimiter=delimiter), [])]
+    header_end = lines.position
+
+    date_col = _required_column(header, DATE_COLUMNS)
+    hours_col = _required_column(header, HOURS_COLUMNS)
+    activity_col = _column(header, ACTIVITY_COLUMNS)
+
+    def records(file: IO[bytes], start: int, end: int | None) -> Iterator[tuple[int, int, _Record]]:
+        lines = _Lines(file, max(start, header_end), end)
+        begin = lines.position
+        for row in csv.reader(lines, delimiter=delimiter):
+            if any(cell.strip() for cell in row):
+                try:
+                    record = (
+                        _parse_date(row[date_col]),
+                        row[activity_col].strip() if activity_col is not None else "",
+                        _parse_hours(row[hours_col]),
+                    )
+                except (IndexError, ValueError) as e:
+                    raise ValueError(f"{file.name}: invalid record at byte {begin}: {e}") from e
+                yield begin, lines.position, record
+            begin = lines.position
+
+    return records
+
+
+def _ical_records(file: IO[bytes], start: int, end: int | None) -> Iterator[tuple[int, int, _Record]]:
+    begin = start
+    event: dict[str, tuple[str, str]] | None = None
+    for line_start, line_end, line in _unfold(_Lines(file, start, end)):
+        if line == "BEGIN:VEVENT":
+            begin, event = line_start, {}
+        elif line == "END:VEVENT" and event is not None:
+            try:
+                record = _event_record(event)
+            except ValueError as e:
+                raise ValueError(f"{file.name}: invalid event at byte {begin}: {e}") from e
+            if record is not None:
+                yield begin, line_end, record
+            event = None
+        elif event is not None and ":" in line:
+            name, _, value = line.partition(":")
+            name, _, params = name.partition(";")
+            event[name.upper()] = (params.upper(), value)
+
+
+def _unfold(lines: _Lines) -> Iterator[tuple[int, int, str]]:
+    # long iCalendar lines continue on the next ones, indented by a single space or tab
+    pending, pending_start = None, lines.position
+    for line in lines:
+        line_start = lines.line_start
+        if pending is not None and line[:1] in (" ", "\t"):
+            pending += line[1:].rstrip("\r\n")
+            continue
+        if pending is not None:
+            yield pending_start, line_start, pending
+        pending, pending_start = line.rstrip("\r\n"), line_start
+    if pending is not None:
+        yield pending_start, lines.position, pending
+
+
+def _event_record(event: dict[str, tuple[str, str]]) -> _Record | None:
+    if "DTSTART" not in event:
+        return None
+    params, value = event["DTSTART"]
+    if "VALUE=DATE" in params and "VALUE=DATE-TIME" not in params:
+        return None  # all day events are days off or reminders, not tracked time
+    started = _parse_ical_datetime(value)
+
+    if "DTEND" in event:
+        hours = (_parse_ical_datetime(event["DTEND"][1]) - started).total_seconds() / 3600
+    elif "DURATION" in event:
+        hours = _parse_iso_duration(event["DURATION"][1]).total_seconds() / 3600
+    else:
+        return None
+
+    activity = event.get("CATEGORIES", event.get("SUMMARY", ("", "")))[1]
+    return started.date(), activity.split(",")[0].replace("\\", "").strip(), hours
+
+
+def _column(header: list[str], names: list[str]) -> int | None:
+    for name in names:
+        if name in header:
+            return header.index(name)
+    return None
+
+
+def _required_column(header: list[str], names: list[str]) -> int:
+    if (column := _column(header, names)) is None:
+        raise ValueError(f"no column for any of [{', '.join(names)}] in the export header")
+    return column
+
+
+def _parse_date(value: str) -> date:
+    value = value.strip()
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        return datetime.strptime(value.split()[0], "%d/%m/%Y").date()
+
+
+def _parse_hours(value: str) -> float:
+    """
+    Decimal hours ('7.5' or '7,5') or durations ('07:30' or '07:30:00').
+    """
+    value = value.strip()
+    if ":" in value:
+        hours, minutes, *seconds = value.split(":")
+        return int(hours) + int(minutes) / 60 + (float(seconds[0]) / 3600 if seconds else 0.0)
+    return float(value.replace(",", "."))
+
+
+def _parse_ical_datetime(value: str) -> datetime:
+    value = value.strip()
+    if not value.endswith("Z"):
+        return datetime.strptime(value, "%Y%m%dT%H%M%S")
+    # UTC times are bucketed by the local day they were worked in
+    utc = datetime.strptime(value[:-1], "%Y%m%dT%H%M%S").replace(tzinfo=timezone.utc)
+    return utc.astimezone().replace(tzinfo=None)
+
+
+def _parse_iso_duration(value: str) -> timedelta:
+    match = _ISO_DURATION_RE.match(value.strip())
+    if match is None:
+        raise ValueError(f"invalid duration '{value}'")
+    weeks, days, hours, minutes, seconds = (int(v or 0) for v in match.groups())
+    return timedelta(weeks=weeks, days=days, hours=hours, minutes=minutes, seconds=seconds)
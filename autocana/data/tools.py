@@ -0,0 +1,141 @@
+import abc
+import logging
+import re
+import subprocess
+import threading
+from collections import deque
+from pathlib import Path
+from typing import IO
+
+from autocana.data.governor import governor
+from autocana.reporters.progress import PERCENT, SECONDS, Progress, progress_reporter
+
+logger = logging.getLogger("autocana")
+
+STDERR_TAIL_LINES = 200
+
+_LINE_SPLIT_RE = re.compile(rb"[\r\n]+")
+
+
+class OutputParser(abc.ABC):
+    """
+    Turn the output lines of a tool into updates of its 'Progress', tools without a parser only keep their stderr.
+    """
+
+    unit = PERCENT
+    arguments: list[str] = []  # added right after the executable to make the tool report its progress
+
+    @abc.abstractmethod
+    def feed(self, line: str, progress: Progress) -> bool:
+        """
+        Update 'progress' from 'line', returns whether anything changed.
+        """
+
+
+class FFmpegParser(OutputParser):
+    """
+    Parse the 'key=value' blocks written by '-progress', the total comes from the duration of the first input.
+    """
+
+    unit = SECONDS
+    arguments = ["-progress", "pipe:1", "-nostats"]
+
+    _DURATION_RE = re.compile(r"^\s*Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+
+    def feed(self, line: str, progress: Progress) -> bool:
+        if progress.total is None and (match := self._DURATION_RE.match(line)):
+            hours, minutes, seconds = match.groups()
+            progress.total = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+            return False
+
+        key, _, value = line.partition("=")
+        if key == "out_time_us" and value.isdigit():
+            progress.done = int(value) / 1_000_000
+        elif key == "fps":
+            progress.fps = _float(value)
+        return key == "progress"
+
+
+class HandBrakeParser(OutputParser):
+    """
+    Parse 'Encoding: task 1 of 1, 45.23 % (87.12 fps, avg 90.00 fps, ETA 00h01m20s)' status lines.
+    """
+
+    _STATUS_RE = re.compile(r"Encoding: .*?([\d.]+) %(?: \(([\d.]+) fps)?")
+
+    def feed(self, line: str, progress: Progress) -> bool:
+        if (match := self._STATUS_RE.search(line)) is None:
+            return False
+        progress.total = 100.0
+        progress.done = float(match.group(1))
+        if match.group(2):
+            progress.fps = float(match.group(2))
+        return True
+
+
+def run_tool(
+    cmd: list[str],
+    parser: OutputParser | None = None,
+    label: str | None = None,
+    weight: int | None = None,
+    memory: int | None = None,
+) -> None:
+    """
+    Run an external tool through the 'governor', streaming its output in background threads instead of discarding it.
+
+    With a 'parser' the output feeds a progress rendered by 'progress_reporter'. The last 'STDERR_TAIL_LINES' lines of
+    stderr are attached to the 'CalledProcessError' raised when the tool fails, and logged, so they end up in the
+    crash reports.
+    """
+    tool = Path(cmd[0]).name
+    if parser is not None:
+        cmd = [cmd[0], *parser.arguments, *cmd[1:]]
+    logger.debug(" ".join(cmd))
+
+    stderr: deque[str] = deque(maxlen=STDERR_TAIL_LINES)
+    with governor.slot(tool, weight=weight, memory=memory):
+        progress = progress_reporter.start(label or tool, unit=parser.unit) if parser is not None else None
+        process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        assert process.stdout is not None and process.stderr is not None
+        readers = [
+            threading.Thread(target=_read, args=(process.stdout, None, parser, progress), daemon=True),
+            threading.Thread(target=_read, args=(process.stderr, stderr, parser, progress), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+        for reader in readers:
+            reader.join()
+        returncode = process.wait()
+
+    if progress is not None:
+        progress_reporter.finish(progress, failed=returncode != 0)
+    if returncode != 0:
+        tail = "\n".join(stderr)
+        logger.debug(f"{tool} exited with {returncode}, last output:\n{tail}")
+        raise subprocess.CalledProcessError(returncode, cmd, stderr=tail)
+
+
+def _read(stream: IO[bytes], tail: deque[str] | None, parser: OutputParser | None, progress: Progress | None) -> None:
+    # tools rewrite their status line with '\r', so lines are split on both line endings
+    pending = b""
+    while chunk := stream.read1(4096):  # type: ignore[attr-defined]
+        *lines, pending = _LINE_SPLIT_RE.split(pending + chunk)
+        for line in lines:
+            _handle(line.decode(errors="replace"), tail, parser, progress)
+    if pending:
+        _handle(pending.decode(errors="replace"), tail, parser, progress)
+    stream.close()
+
+
+def _handle(line: str, tail: deque[str] | None, parser: OutputParser | None, progress: Progress | None) -> None:
+    if tail is not None:
+        tail.append(line)
+    if parser is not None and progress is not None and parser.feed(line, progress):
+        progress_reporter.update(progress)
+
+
+def _float(value: str) -> float | None:
+    try:
+        return float(value)
+    except ValueError:
+        return None
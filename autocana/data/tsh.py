@@ -1,17 +1,22 @@
 import argparse
-import calendar
+import importlib.resources as resources
 import logging
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Any
 
+from openpyxl import load_workbook
 from openpyxl.drawing.image import Image
-from openpyxl.utils import column_index_from_string
+from openpyxl.utils import column_index_from_string, get_column_letter
 from openpyxl.worksheet.worksheet import Worksheet
 
 import autocana.constants as C
+from autocana.data.buildcache import build_key
 from autocana.data.config import load_user_config
+from autocana.data.period import Period
 from autocana.data.private import PrivateConfig
+from autocana.data.timetracking import WorkLog, load_work_log
 
 logger = logging.getLogger("autocana")
 
@@ -30,16 +35,20 @@ class TSHConfig:
     month: int
     output_name: str = field(init=False)
     rest_days: list[int] = field(default_factory=list)
+    signature_path: Path = C.SIGNATURE_FILE_PATH
+    work_log: WorkLog | None = None  # real hours from a time-tracking export, a flat 8h per weekday otherwise
+    force: bool = False  # build it again even if the build cache has it
 
     _output_dir: Path | None = None
 
-    def _default_name(self) -> str:
-        today = datetime.now(timezone.utc).replace(month=self.month)
-        month = today.replace(day=calendar.monthrange(today.year, today.month)[1])
+    @property
+    def period(self) -> Period:
+        return Period.of(self.month)
 
+    def _default_name(self) -> str:
         name_parts = self.private.full_name.split()
         name = f"{name_parts[1][:6]}{name_parts[0][:2]}".lower()
-        return f"TSH_{name}_{month.strftime('%Y%m%d').lower()}.xlsx"
+        return f"TSH_{name}_{self.period.last_day.strftime('%Y%m%d').lower()}.xlsx"
 
     @property
     def output_path(self) -> str:
@@ -48,8 +57,8 @@ class TSHConfig:
         return self.output_name
 
     @classmethod
-    def load(cls) -> "TSHConfig":
-        yaml_cfg = load_user_config()
+    def load(cls, yaml_cfg: dict[str, Any] | None = None) -> "TSHConfig":
+        yaml_cfg = yaml_cfg if yaml_cfg is not None else load_user_config()
         invoicing_cfg = yaml_cfg["invoicing"]
         return cls(
             private=PrivateConfig.load(yaml_cfg["private"]),
@@ -63,7 +72,12 @@ class TSHConfig:
     def with_params(self, params: argparse.Namespace) -> "TSHConfig":
         self.rest_days = params.skip
         self.month = params.month if params.month is not None else self.month
+        self.force = params.force
         self.output_name = params.output if params.output else self._default_name()
+        if getattr(params, "timesheet", None):
+            self.work_log = load_work_log(Path(params.timesheet), self.period)
+            for activity, hours in sorted(self.work_log.activities().items()):
+                logger.info(f"{hours:.2f}h logged in '{activity or 'no activity'}'")
         if params.output_dir:
             dir = Path(params.output_dir)
             if not dir.exists() and dir.is_dir():
@@ -72,43 +86,95 @@ class TSHConfig:
         return self
 
 
-def fill_worksheet(config: TSHConfig, ws: Worksheet) -> Worksheet:
+def worksheet_values(config: TSHConfig) -> dict[str, Any]:
     tsh_date = datetime.now(timezone.utc).replace(month=config.month)
-    ws["AD4"] = tsh_date.strftime("%B")
-    ws["AJ4"] = tsh_date.year
-    ws["A10"] = f"{config.activity_id}"
-    ws["B10"] = "Cronos INT"
-    ws["C10"] = "1"
-    ws["D10"] = f"TM - SC: {config.extension_number}"
-    ws["E10"] = "BI"
-    ws["M4"] = config.private.full_name
-    ws["R37"] = tsh_date.strftime("%d/%m/%Y")
+    return {
+        "AD4": config.period.first_day.strftime("%B"),
+        "AJ4": config.period.year,
+        "A10": f"{config.activity_id}",
+        "B10": "Cronos INT",
+        "C10": "1",
+        "D10": f"TM - SC: {config.extension_number}",
+        "E10": "BI",
+        "M4": config.private.full_name,
+        "R37": tsh_date.strftime("%d/%m/%Y"),
+    }
+
+
+def worked_days_values(config: TSHConfig) -> dict[str, Any]:
+    """
+    Hours of each day: worked hours go in the activity row (10) and rest days in the absence row (9).
+
+    With a 'work_log' the logged hours are used, weekend days included, and weekdays without logged hours are rest
+    days.
+    """
+    first_col = column_index_from_string("H")
+    days = set(config.period.weekdays)
+    if config.work_log is not None:
+        days.update(config.work_log.days)
+
+    values: dict[str, Any] = {}
+    for day_number in sorted(days):
+        column = get_column_letter(first_col + day_number)
+        hours = config.work_log.hours(day_number) if config.work_log is not None else 8
+        if day_number in config.rest_days or not hours:
+            values[f"{column}9"] = 8
+        else:
+            values[f"{column}10"] = hours
+    return values
+
+
+def fill_worksheet(config: TSHConfig, ws: Worksheet) -> Worksheet:
+    for cell, value in worksheet_values(config).items():
+        ws[cell] = value
     return ws
 
 
 def fill_worked_days(config: TSHConfig, ws: Worksheet) -> Worksheet:
-    tsh_date = datetime.now(timezone.utc).replace(month=config.month)
-    weekday, days_in_month = calendar.monthrange(tsh_date.year, tsh_date.month)
-    current_col = column_index_from_string("H")
-    for day_number in range(1, days_in_month + 1):
-        current_col += 1
-        if weekday in (5, 6):  # skip weekends
-            weekday = (weekday + 1) % 7
-            continue
-
-        row = 9 if day_number in config.rest_days else 10
-        ws.cell(row=row, column=current_col, value=8)
-        weekday = (weekday + 1) % 7
+    for cell, value in worked_days_values(config).items():
+        ws[cell] = value
     return ws
 
 
-def sign_worksheet_if_configured(ws: Worksheet) -> Worksheet:
-    if not C.SIGNATURE_FILE_PATH.is_file():
+def sign_worksheet_if_configured(ws: Worksheet, signature_path: Path = C.SIGNATURE_FILE_PATH) -> Worksheet:
+    if not signature_path.is_file():
         logger.error("no signature file found, skipping adding signature.")
         return ws
 
-    img = Image(str(C.SIGNATURE_FILE_PATH))
+    img = Image(str(signature_path))
     img.width = 200
     img.height = 95
     ws.add_image(img, "W33")
     return ws
+
+
+def tsh_build_key(config: TSHConfig) -> str:
+    """
+    Key of the TSH built from 'config'. The signing date (R37) is today's date, so cached TSHs are only reused during
+    the day they were built.
+    """
+    cells = {**worksheet_values(config), **worked_days_values(config)}
+    return build_key("tsh", cells, "tsh.xlsx", files=[config.signature_path])
+
+
+def render_tsh(config: TSHConfig, xlsx_path: Path) -> Path:
+    TSH_TEMPLATE_PATH = resources.files("autocana.templates") / "tsh.xlsx"
+    if not TSH_TEMPLATE_PATH.is_file():
+        raise ValueError(f"{TSH_TEMPLATE_PATH} does not exist")
+
+    logger.info(f"loading {TSH_TEMPLATE_PATH}")
+    wb = load_workbook(str(TSH_TEMPLATE_PATH))
+    ws = wb["template to use"]
+
+    logger.info("rendering new data into de template")
+    fill_worksheet(config, ws)
+
+    logger.info("filling worked days")
+    fill_worked_days(config, ws)
+
+    logger.info("signing worksheet")
+    sign_worksheet_if_configured(ws, config.signature_path)
+
+    logger.info(f"saving new generated TSH in {xlsx_path}")
+    wb.save(str(xlsx_path))
+    return xlsx_path
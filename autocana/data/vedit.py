@@ -0,0 +1,287 @@
+import argparse
+import logging
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from autocana.data.probe import probe_cache
+from autocana.data.tools import FFmpegParser, run_tool
+
+logger = logging.getLogger("autocana")
+
+NTSC_RATE = 23.976
+PAL_RATE = 25.0
+
+AUDIO_ENCODER = "flac"
+SUBTITLES_LANG = "spa"
+VIDEO_ENCODER = ["libx264", "-crf", "18", "-preset", "medium"]
+
+_SELECT_ACTIONS = {"extract"}
+_FILTER_ACTIONS = {"atempo", "atempo_with", "atempo_video", "delay", "hasten"}
+_MUX_ACTIONS = {"append", "append_subs"}
+ACTIONS = _SELECT_ACTIONS | _FILTER_ACTIONS | _MUX_ACTIONS
+
+Probe = Callable[[Path], list[dict[str, Any]]]
+
+
+@dataclass
+class VEditAction:
+    name: str
+    value: str | None = None
+
+    @classmethod
+    def parse(cls, raw: str) -> "VEditAction":
+        name, _, value = raw.partition("=")
+        if name not in ACTIONS:
+            raise ValueError(f"unknown action '{name}', use one of: {', '.join(sorted(ACTIONS))}")
+        if name in _MUX_ACTIONS and not value:
+            raise ValueError(f"action '{name}' requires a file, use '{name}=<path>'")
+        return cls(name=name, value=value or None)
+
+    def __str__(self) -> str:
+        return f"{self.name}={self.value}" if self.value is not None else self.name
+
+
+@dataclass
+class VEditConfig:
+    input_path: Path
+    actions: list[VEditAction]
+    output_name: str | None
+    output_dir: Path
+
+    @property
+    def output_path(self) -> Path:
+        if self.output_name:
+            return self.output_dir / self.output_name
+        suffix = ".mka" if _outputs_audio(self.actions) else ".mkv"
+        return self.output_dir / f"{self.input_path.stem}_vedit{suffix}"
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "VEditConfig":
+        path = Path(args.input)
+        if not path.is_file():
+            raise ValueError(f"'{args.input}' is not a valid file.")
+        if args.output_dir and not Path(args.output_dir).is_dir():
+            raise ValueError(f"output directory '{args.output_dir}' does not exist or is not a directory.")
+
+        return cls(
+            input_path=path,
+            actions=parse_actions(args.actions),
+            output_name=args.output,
+            output_dir=Path(args.output_dir) if args.output_dir else path.parent,
+        )
+
+
+def parse_actions(raw: list[str]) -> list[VEditAction]:
+    actions = [VEditAction.parse(r) for r in raw]
+    for action in actions:
+        if action.name in _MUX_ACTIONS and not Path(str(action.value)).is_file():
+            raise ValueError(f"'{action.value}' used by '{action.name}' is not a valid file.")
+    return actions
+
+
+def plan_stages(actions: list[VEditAction]) -> list[list[VEditAction]]:
+    """
+    Group a chain of actions into the minimum number of FFmpeg invocations.
+
+    A stage keeps fusing actions while they can be expressed in a single filtergraph over its input. A new stage is
+    started when:
+        - a second 'extract' is found, or any filter/extract comes after a mux ('append', 'append_subs').
+        - a mux comes after filters applied to a whole (not extracted) file, as those filters would also hit the
+          streams of the muxed file.
+    """
+    stages: list[list[VEditAction]] = [[]]
+    extracted = filtered = muxed = False
+
+    for action in actions:
+        if action.name in _SELECT_ACTIONS:
+            breaks = extracted or muxed
+        elif action.name in _FILTER_ACTIONS:
+            breaks = muxed
+        else:
+            breaks = filtered and not extracted
+
+        if breaks and stages[-1]:
+            stages.append([])
+            extracted = filtered = muxed = False
+
+        stages[-1].append(action)
+        extracted |= action.name in _SELECT_ACTIONS
+        filtered |= action.name in _FILTER_ACTIONS
+        muxed |= action.name in _MUX_ACTIONS
+
+    return [s for s in stages if s]
+
+
+def build_stage_command(
+    source: Path, actions: list[VEditAction], output: Path, probe: Probe | None = None
+) -> list[str]:
+    """
+    Compile the actions of a single stage (see 'plan_stages') into one FFmpeg command.
+
+    Consecutive tempo changes are merged into a single 'atempo' value, extracted audio is filtered through
+    '-filter_complex' so muxed inputs are left untouched, and every output stream gets an explicit codec so untouched
+    streams are copied instead of re-encoded.
+    """
+    probe = probe or probe_cache.streams
+    track: int | None = None
+    audio_filters: list[str] = []
+    video_filters: list[str] = []
+    video_shift = 0.0
+    video_encode = False
+    muxes: list[VEditAction] = []
+
+    for action in actions:
+        match action.name:
+            case "extract":
+                track = int(action.value or 0)
+            case "atempo":
+                src, dst = (PAL_RATE, NTSC_RATE)
+                if action.value:
+                    src, dst = (float(r) for r in action.value.split(":", maxsplit=1))
+                _add_tempo(audio_filters, dst / src)
+            case "atempo_with":
+                _add_tempo(audio_filters, float(action.value or 1.0))
+            case "atempo_video":
+                if track is not None:
+                    raise ValueError("'atempo_video' can not be applied to an extracted audio track")
+                rate = float(action.value or NTSC_RATE)
+                fps = _frame_rate(probe(source))
+                _add_tempo(audio_filters, rate / fps)
+                video_filters += [f"setpts={_num(fps / rate)}*PTS", f"fps={_num(rate)}"]
+                video_encode = True
+            case "delay":
+                value = float(action.value or 1.0)
+                audio_filters.append(f"adelay=delays={_num(value * 1000)}:all=1")
+                video_filters.append(f"tpad=start_duration={_num(value)}")
+                video_shift += value
+            case "hasten":
+                value = float(action.value or 1.0)
+                audio_filters += [f"atrim=start={_num(value)}", "asetpts=PTS-STARTPTS"]
+                video_filters += [f"trim=start={_num(value)}", "setpts=PTS-STARTPTS"]
+                video_shift -= value
+            case "append" | "append_subs":
+                muxes.append(action)
+
+    inputs = ["-i", str(source)]
+    filters: list[str] = []
+    maps: list[_StreamMap] = []
+
+    if track is not None:
+        if audio_filters:
+            filters += ["-filter_complex", f"[0:a:{track}]{','.join(audio_filters)}[a0]"]
+            maps.append(_StreamMap("[a0]", ["audio"], encode_audio=True))
+        else:
+            maps.append(_StreamMap(f"0:a:{track}", ["audio"]))
+    else:
+        kinds = [s["codec_type"] for s in probe(source)]
+        video_input = 0
+        if video_shift and not video_encode and "video" in kinds:
+            # reading the same file twice lets the video be shifted by timestamp while the audio goes through filters
+            inputs += ["-itsoffset", _num(video_shift), "-i", str(source)]
+            video_input = 1
+        if audio_filters:
+            filters += ["-filter:a", ",".join(audio_filters)]
+        if video_encode:
+            filters += ["-filter:v", ",".join(video_filters)]
+        if kinds.count("video"):
+            maps.append(_StreamMap(f"{video_input}:v", ["video"] * kinds.count("video"), encode_video=video_encode))
+        if kinds.count("audio"):
+            maps.append(_StreamMap("0:a", ["audio"] * kinds.count("audio"), encode_audio=bool(audio_filters)))
+        if kinds.count("subtitle"):
+            maps.append(_StreamMap("0:s", ["subtitle"] * kinds.count("subtitle")))
+
+    for action in muxes:
+        other = Path(str(action.value))
+        index = inputs.count("-i")
+        inputs += ["-i", str(other)]
+        kinds = [s["codec_type"] for s in probe(other)]
+        if action.name == "append":
+            maps.insert(0, _StreamMap(str(index), kinds))  # the working file is appended into the other one
+        else:
+            maps.append(_StreamMap(str(index), kinds, language=SUBTITLES_LANG))
+
+    cmd = ["ffmpeg", "-hide_banner", "-nostdin", "-y", *inputs, *filters]
+    for stream_map in maps:
+        cmd += ["-map", stream_map.spec]
+
+    index = 0
+    for stream_map in maps:
+        for kind in stream_map.kinds:
+            if kind == "audio" and stream_map.encode_audio:
+                cmd += [f"-c:{index}", AUDIO_ENCODER]
+            elif kind == "video" and stream_map.encode_video:
+                cmd += [f"-c:{index}", *VIDEO_ENCODER]
+            else:
+                cmd += [f"-c:{index}", "copy"]
+            if stream_map.language:
+                cmd += [f"-metadata:s:{index}", f"language={stream_map.language}"]
+            index += 1
+
+    cmd.append(str(output))
+    return cmd
+
+
+def run_stages(config: VEditConfig, work_dir: Path, probe: Probe | None = None) -> Path:
+    stages = plan_stages(config.actions)
+    logger.info(f"{len(config.actions)} actions compiled into {len(stages)} ffmpeg stage(s)")
+
+    source = config.input_path
+    for i, stage in enumerate(stages, start=1):
+        is_last = i == len(stages)
+        output = config.output_path if is_last else work_dir / f"stage_{i}.mkv"
+        logger.info(f"stage {i}/{len(stages)}: {' '.join(str(a) for a in stage)}")
+
+        cmd = build_stage_command(source, stage, output, probe=probe)
+        run_tool(cmd, FFmpegParser(), label=f"{config.input_path.name} stage {i}/{len(stages)}")
+        source = output
+
+    return source
+
+
+@dataclass
+class _StreamMap:
+    spec: str
+    kinds: list[str]
+    encode_audio: bool = False
+    encode_video: bool = False
+    language: str | None = None
+
+
+def _outputs_audio(actions: list[VEditAction]) -> bool:
+    # an extracted track stays audio only until it is appended into another file
+    audio = False
+    for action in actions:
+        if action.name == "extract":
+            audio = True
+        elif action.name == "append":
+            audio = False
+    return audio
+
+
+def _add_tempo(filters: list[str], factor: float) -> None:
+    # merge with a directly preceding tempo change so the chain only resamples once
+    while filters and filters[-1].startswith("atempo="):
+        factor *= float(filters.pop().removeprefix("atempo="))
+    if factor == 1.0:
+        return
+    # older FFmpeg builds only accept 'atempo' values between 0.5 and 2.0
+    while factor < 0.5 or factor > 2.0:
+        step = 0.5 if factor < 0.5 else 2.0
+        filters.append(f"atempo={_num(step)}")
+        factor /= step
+    filters.append(f"atempo={_num(factor)}")
+
+
+def _frame_rate(streams: list[dict[str, Any]]) -> float:
+    for stream in streams:
+        if stream.get("codec_type") == "video":
+            num, _, den = stream.get("avg_frame_rate", "0/0").partition("/")
+            if den and float(den):
+                return float(num) / float(den)
+    raise ValueError("unable to find the frame rate of the video stream")
+
+
+def _num(value: float) -> str:
+    return f"{value:.6f}".rstrip("0").rstrip(".")
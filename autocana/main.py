@@ -1,13 +1,23 @@
 import argparse
+import os
 
 import autocana.constants as C
 from autocana import cli as commands
+from autocana.data.closemonth import CloseMonthConfig
 from autocana.data.config import SetupConfig, ensure_user_config_exists
 from autocana.data.download import DownloadConfig
+from autocana.data.governor import governor
 from autocana.data.invoice import InvoiceConfig
+from autocana.data.ledger import ReportConfig
 from autocana.data.newproject import NewProjectConfig
+from autocana.data.probe import ProbeConfig
+from autocana.data.profiles import BatchConfig
+from autocana.data.reencode import QUALITIES, ReencodeConfig
+from autocana.data.retry import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, DEFAULT_RETRIES
 from autocana.data.tsh import TSHConfig
-from autocana.reporters import error_handler, logging_handler, print_logo
+from autocana.data.vedit import VEditConfig
+from autocana.reporters import error_handler, logging_handler, metrics, print_logo
+from autocana.reporters.metrics import METRICS_DIR_ENV
 
 
 def main() -> int:
@@ -20,6 +30,19 @@ def main() -> int:
         action="version",
         version=f"%(prog)s {C.VERSION}",
     )
+    parser.add_argument(
+        "--max-tools",
+        type=int,
+        help="Limit of parallel external tool slots, the lowest one set applies to all running instances. [cores]",
+        default=None,
+    )
+    parser.add_argument(
+        "--metrics",
+        dest="metrics_dir",
+        type=str,
+        help=f"Folder to write Prometheus textfile and JSON metrics of the run into. [${METRICS_DIR_ENV}]",
+        default=os.environ.get(METRICS_DIR_ENV),
+    )
 
     subparsers = parser.add_subparsers(dest="command")
 
@@ -32,7 +55,12 @@ def main() -> int:
     _cmd_new_library(_add_cmd("newlibrary", help=help_msg))
     _cmd_invoice(_add_cmd("invoice", help="Generate a new ARHS invoice."))
     _cmd_tsh(_add_cmd("tsh", help="Generate a new ARHS timesheet."))
+    _cmd_close_month(_add_cmd("close-month", help="Generate both the ARHS invoice and timesheet of a month."))
+    _cmd_report(_add_cmd("report", help="Report totals and inconsistencies of the generated invoices."))
     _cmd_download(_add_cmd("download", help="Downloads videos."))
+    _cmd_vedit(_add_cmd("vedit", help="Edit a video applying a chain of actions."))
+    _cmd_reencode(_add_cmd("reencode", help="Re-encode videos using HandBrakeCLI."))
+    _cmd_probe(_add_cmd("probe", help="Pre-warm the media probe cache of a video library."))
     args = parser.parse_args()
 
     print_logo()
@@ -43,18 +71,36 @@ def main() -> int:
             parser.print_help()
             return 1
 
-        if args.command == "newlibrary":
-            return commands.cmd_init_library(NewProjectConfig.from_params(args))
-        elif args.command == "invoice":
-            return commands.cmd_invoice(InvoiceConfig.load().with_params(args))
-        elif args.command == "tsh":
-            return commands.cmd_tsh(TSHConfig.load().with_params(args))
-        elif args.command == "download":
-            return commands.cmd_download(DownloadConfig.from_args(args))
-        elif args.command == "setup":
-            return commands.cmd_setup(SetupConfig.from_args(args))
-        else:
-            raise NotImplementedError(f"Command {args.command} not implemented.")
+        governor.configure(jobs=args.max_tools)
+        metrics.configure(args.metrics_dir)
+        return metrics.run_command(args.command, lambda: _run(args))
+
+
+def _run(args: argparse.Namespace) -> int:
+    if args.command == "newlibrary":
+        return commands.cmd_init_library(NewProjectConfig.from_params(args))
+    elif args.command in ("invoice", "tsh") and args.profiles:
+        return commands.cmd_batch(BatchConfig.from_args(args))
+    elif args.command == "invoice":
+        return commands.cmd_invoice(InvoiceConfig.load().with_params(args))
+    elif args.command == "tsh":
+        return commands.cmd_tsh(TSHConfig.load().with_params(args))
+    elif args.command == "close-month":
+        return commands.cmd_close_month(CloseMonthConfig.from_args(args))
+    elif args.command == "report":
+        return commands.cmd_report(ReportConfig.from_args(args))
+    elif args.command == "download":
+        return commands.cmd_download(DownloadConfig.from_args(args))
+    elif args.command == "vedit":
+        return commands.cmd_vedit(VEditConfig.from_args(args))
+    elif args.command == "reencode":
+        return commands.cmd_reencode(ReencodeConfig.from_args(args))
+    elif args.command == "probe":
+        return commands.cmd_probe(ProbeConfig.from_args(args))
+    elif args.command == "setup":
+        return commands.cmd_setup(SetupConfig.from_args(args))
+    else:
+        raise NotImplementedError(f"Command {args.command} not implemented.")
 
 
 def _cmd_setup(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
@@ -75,10 +121,15 @@ def _cmd_new_library(parser: argparse.ArgumentParser) -> argparse.ArgumentParser
 
 
 def _cmd_invoice(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
-    parser.add_argument("-d", "--days", type=int, help="Number of days to invoice. [20]", default=20)
+    parser.add_argument(
+        "-d", "--days", type=int, help="Number of days to invoice. [20, days in --timesheet]", default=None
+    )
     parser.add_argument("-m", "--month", type=int, help="Month to invoice (1-12).", default=None)
     parser.add_argument("-r", "--rate", type=float, help="Rate applied to the current invoice.", default=None)
+    _set_timesheet_args(parser)
+    _set_profiles_args(parser)
     _set_output_args(parser)
+    _set_build_args(parser)
     parser.set_defaults(func=commands.cmd_invoice)
     return parser
 
@@ -86,19 +137,127 @@ def _cmd_invoice(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
 def _cmd_tsh(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
     parser.add_argument("-m", "--month", type=int, help="Month to TSH (1-12).", default=None)
     parser.add_argument("-s", "--skip", type=int, nargs="*", help="Days to skip in the TSH.", default=[])
+    _set_timesheet_args(parser)
+    _set_profiles_args(parser)
     _set_output_args(parser)
+    _set_build_args(parser)
     parser.set_defaults(func=commands.cmd_tsh)
     return parser
 
 
+def _cmd_close_month(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    parser.add_argument("-d", "--days", type=int, help="Number of days to invoice. [working days]", default=None)
+    parser.add_argument("-m", "--month", type=int, help="Month to close (1-12).", default=None)
+    parser.add_argument("-r", "--rate", type=float, help="Rate applied to the invoice.", default=None)
+    parser.add_argument("-s", "--skip", type=int, nargs="*", help="Days to skip in the TSH.", default=[])
+    _set_timesheet_args(parser)
+    parser.add_argument("--output-dir", type=str, help="Output folder for the generated files.", default=None)
+    _set_build_args(parser)
+    parser.set_defaults(func=commands.cmd_close_month, output=None)
+    return parser
+
+
+def _cmd_report(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    parser.add_argument("-y", "--year", type=int, help="Only report the given year.", default=None)
+    parser.add_argument("-q", "--quarterly", action="store_true", help="Aggregate by quarter.", default=False)
+    parser.add_argument(
+        "--import", dest="import_dir", type=str, help="Import the invoice PDFs of a folder.", default=None
+    )
+    parser.set_defaults(func=commands.cmd_report)
+    return parser
+
+
 def _cmd_download(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
     parser.add_argument("url_or_path", type=str, help="Url to download or path containing a list of URLs.")
+    parser.add_argument("--pool-size", type=int, help="Connections kept alive per host. [10]", default=10)
+    parser.add_argument("--buffer-size", type=int, help="Read buffer size in KiB. [1024]", default=1024)
+    parser.add_argument("--retries", type=int, help="Retries of each failed request. [5]", default=DEFAULT_RETRIES)
+    parser.add_argument(
+        "--connect-timeout", type=float, help="Connect timeout in seconds. [10]", default=DEFAULT_CONNECT_TIMEOUT
+    )
+    parser.add_argument(
+        "--read-timeout", type=float, help="Read timeout in seconds. [60]", default=DEFAULT_READ_TIMEOUT
+    )
+    parser.add_argument(
+        "--hedge",
+        type=int,
+        help="Request again the segments slower than this latency percentile (50-99).",
+        default=None,
+    )
+    parser.add_argument("--fast-hash", action="store_true", help="Also record a CRC32 checksum.", default=False)
+    parser.add_argument("--verify", action="store_true", help="Verify already downloaded files.", default=False)
+    parser.add_argument(
+        "--requeue-failed", action="store_true", help="Retry the URLs that failed in previous runs.", default=False
+    )
+    parser.add_argument(
+        "--then",
+        type=str,
+        action="append",
+        help="Process each file once downloaded with a vedit action or 'reencode=<quality>', repeat to chain actions.",
+        default=None,
+    )
+    parser.add_argument("-w", "--workers", type=int, help="Parallel post-processing workers.", default=None)
     _set_output_args(parser)
     parser.set_defaults(func=commands.cmd_download)
     return parser
 
 
+def _cmd_vedit(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    parser.add_argument("input", type=str, help="Video or audio file to edit.")
+    parser.add_argument("actions", type=str, nargs="+", help="Actions to apply, as 'action' or 'action=value'.")
+    _set_output_args(parser)
+    parser.set_defaults(func=commands.cmd_vedit)
+    return parser
+
+
+def _cmd_reencode(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    parser.add_argument("input", type=str, help="Video file or folder containing the videos to re-encode.")
+    parser.add_argument("-q", "--quality", type=str, choices=list(QUALITIES), help="Quality preset.", default="1080p")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Search videos in subfolders.", default=False)
+    parser.add_argument("-j", "--jobs", type=int, help="Parallel encodes. [cores and memory based]", default=None)
+    _set_output_args(parser)
+    parser.set_defaults(func=commands.cmd_reencode)
+    return parser
+
+
+def _cmd_probe(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    parser.add_argument("input", type=str, help="Video file or folder containing the videos to probe.")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Search videos in subfolders.", default=False)
+    parser.add_argument("-j", "--jobs", type=int, help="Parallel probes. [cores]", default=None)
+    parser.add_argument("--prune", action="store_true", help="Forget the probes of deleted files.", default=False)
+    parser.set_defaults(func=commands.cmd_probe)
+    return parser
+
+
+def _set_timesheet_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    parser.add_argument(
+        "-t",
+        "--timesheet",
+        type=str,
+        help="Time-tracking export (CSV or iCalendar) with the worked hours.",
+        default=None,
+    )
+    return parser
+
+
+def _set_profiles_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    parser.add_argument("--profiles", type=str, help="Folder of profile configs to generate in batch.", default=None)
+    parser.add_argument("-j", "--jobs", type=int, help="Parallel profiles in batch mode. [cores]", default=None)
+    return parser
+
+
 def _set_output_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
     parser.add_argument("-o", "--output", type=str, help="Output file name.", default=None)
     parser.add_argument("--output-dir", type=str, help="Output folder for the generated file.", default=None)
     return parser
+
+
+def _set_build_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="Build again, even if the build cache has the document.",
+        default=False,
+    )
+    return parser
@@ -13,8 +13,14 @@ from .errors import (
     error_handler as error_handler,
 )
 from .logs import (
+    FlightRecorder as FlightRecorder,
+    flight_recorder as flight_recorder,
     logging_handler as logging_handler,
 )
+from .metrics import (
+    MetricsCollector as MetricsCollector,
+    metrics as metrics,
+)
 from .output import (
     STATUS_COLORS as STATUS_COLORS,
     write as write,
@@ -22,3 +28,8 @@ from .output import (
     write_line_b as write_line_b,
     print_logo as print_logo,
 )
+from .progress import (
+    Progress as Progress,
+    ProgressReporter as ProgressReporter,
+    progress_reporter as progress_reporter,
+)
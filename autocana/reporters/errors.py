@@ -1,16 +1,22 @@
 import contextlib
 import functools
+import gzip
 import os
+import subprocess
 import sys
 import traceback
 from collections.abc import Generator
-from typing import IO
+from datetime import datetime
+from typing import IO, cast
 
 import autocana.constants as C
 
 from ._utils import force_bytes
+from .logs import flight_recorder
 from .output import write_line, write_line_b
 
+MAX_CRASH_REPORTS_SIZE = 10 * 1024 * 1024
+
 
 class FatalError(RuntimeError):
     pass
@@ -39,13 +45,14 @@ def _log_and_exit(
     error_msg = f"{msg}: {type(exc).__name__}: ".encode() + force_bytes(exc)
     write_line_b(error_msg)
 
-    log_path = "autocana.log"
+    log_path = C.CRASH_REPORTS_PATH / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.log.gz"
     with contextlib.ExitStack() as ctx:
-        if os.access(log_path, os.W_OK):
-            write_line(f"Check the log at {log_path}")
-            log: IO[bytes] = ctx.enter_context(open(log_path, "wb"))
-        else:  # pragma: win32 no cover
-            write_line(f"Failed to write to log at {log_path}")
+        try:
+            log_path.parent.mkdir(parents=True, exist_ok=True)
+            log = cast(IO[bytes], ctx.enter_context(gzip.open(log_path, "wb")))
+            write_line(f"Check the crash report at {log_path}")
+        except OSError:  # pragma: win32 no cover
+            write_line(f"Failed to write the crash report at {log_path}")
             log = sys.stdout.buffer
 
         _log_line = functools.partial(write_line, stream=log)
@@ -73,4 +80,35 @@ def _log_and_exit(
         _log_line("```")
         _log_line(formatted.rstrip())
         _log_line("```")
+        _log_line()
+
+        if isinstance(exc, subprocess.CalledProcessError) and exc.stderr:
+            _log_line("### tool output")
+            _log_line()
+            _log_line("```")
+            _log_line_b(force_bytes(exc.stderr).rstrip())
+            _log_line("```")
+            _log_line()
+
+        _log_line("### log records")
+        _log_line()
+        _log_line("```")
+        for line in flight_recorder.dump():
+            _log_line(line)
+        _log_line("```")
+
+    _prune_crash_reports()
     raise SystemExit(ret_code)
+
+
+def _prune_crash_reports() -> None:
+    """
+    Remove the oldest crash reports until the folder fits in 'MAX_CRASH_REPORTS_SIZE'.
+    """
+    with contextlib.suppress(OSError):
+        reports = sorted(C.CRASH_REPORTS_PATH.glob("*.log.gz"), key=lambda p: p.stat().st_mtime, reverse=True)
+        total = 0
+        for report in reports:
+            total += report.stat().st_size
+            if total > MAX_CRASH_REPORTS_SIZE:
+                report.unlink()
@@ -1,9 +1,12 @@
 import contextlib
 import logging
+from collections import deque
 from collections.abc import Generator
+from datetime import datetime
 
 from ._utils import GREEN, RED, YELLOW, format_color
 from .output import write_line
+from .progress import progress_reporter
 
 logger = logging.getLogger("autocana")
 
@@ -14,10 +17,13 @@ LOG_LEVEL_COLORS = {
     "ERROR": RED,
 }
 
+FLIGHT_RECORDER_CAPACITY = 5000
+FLIGHT_RECORDER_MAX_MESSAGE = 4096
+
 
 class LoggingHandler(logging.Handler):
     def __init__(self, use_color: bool) -> None:
-        super().__init__()
+        super().__init__(level=logging.INFO)
         self.use_color = use_color
 
     def emit(self, record: logging.LogRecord) -> None:
@@ -26,15 +32,52 @@ class LoggingHandler(logging.Handler):
             LOG_LEVEL_COLORS[record.levelname],
             self.use_color,
         )
+        progress_reporter.clear()
         write_line(f"{level_msg} {record.getMessage()}")
 
 
+class FlightRecorder(logging.Handler):
+    """
+    Keep the last 'capacity' log records of any level in memory, so a crash report can include the DEBUG context
+    without printing it on every run.
+
+    Records are only formatted when 'dump' is called, recording one is a single append into a bounded deque.
+    """
+
+    def __init__(self, capacity: int = FLIGHT_RECORDER_CAPACITY) -> None:
+        super().__init__(level=logging.DEBUG)
+        self.records: deque[logging.LogRecord] = deque(maxlen=capacity)
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        # deque.append is thread-safe, skip the handler lock and filters used by 'logging.Handler.handle'
+        self.records.append(record)
+        return True
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append(record)
+
+    def dump(self) -> list[str]:
+        lines = []
+        for record in list(self.records):
+            timestamp = datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds")
+            message = record.getMessage()
+            if len(message) > FLIGHT_RECORDER_MAX_MESSAGE:
+                message = f"{message[:FLIGHT_RECORDER_MAX_MESSAGE]}... ({len(message)} chars)"
+            lines.append(f"{timestamp} [{record.levelname}] {record.threadName}: {message}")
+        return lines
+
+
+flight_recorder = FlightRecorder()
+
+
 @contextlib.contextmanager
 def logging_handler(use_color: bool) -> Generator[None]:
     handler = LoggingHandler(use_color)
     logger.addHandler(handler)
-    logger.setLevel(logging.INFO)
+    logger.addHandler(flight_recorder)
+    logger.setLevel(logging.DEBUG)
     try:
         yield
     finally:
         logger.removeHandler(handler)
+        logger.removeHandler(flight_recorder)
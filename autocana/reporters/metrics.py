@@ -0,0 +1,173 @@
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable, Iterator
+from datetime import datetime, timezone
+from pathlib import Path
+
+logger = logging.getLogger("autocana")
+
+METRICS_DIR_ENV = "AUTOCANA_METRICS_DIR"
+
+COUNTER = "counter"
+GAUGE = "gauge"
+
+# name: (type, help), every series also gets the 'command' label so the files of all the commands can be merged
+METRICS = {
+    "autocana_run_success": (GAUGE, "Whether the last run of the command succeeded."),
+    "autocana_run_exit_code": (GAUGE, "Exit code of the last run of the command."),
+    "autocana_run_duration_seconds": (GAUGE, "Duration of the last run of the command."),
+    "autocana_run_timestamp_seconds": (GAUGE, "Unix time the last run of the command finished."),
+    "autocana_stage_duration_seconds": (GAUGE, "Time spent in each stage of the last run."),
+    "autocana_documents_generated_total": (COUNTER, "Documents generated by the last run."),
+    "autocana_downloads_total": (COUNTER, "URLs downloaded by the last run, by result."),
+    "autocana_downloaded_bytes_total": (COUNTER, "Bytes received by the last run, retried bytes included."),
+    "autocana_retries_total": (COUNTER, "Requests retried by the last run."),
+    "autocana_cache_requests_total": (COUNTER, "Cache lookups of the last run, by cache and result."),
+    "autocana_converter_restarts_total": (COUNTER, "Document converter restarts during the last run."),
+}
+
+_Labels = tuple[tuple[str, str], ...]
+
+
+class MetricsCollector:
+    """
+    Opt-in metrics of a single command run, written at the end of the run as a Prometheus textfile-collector file
+    ('autocana_<command>.prom') and a JSON summary ('autocana_<command>.json').
+
+    Recording is a no-op until a metrics folder is configured, so instrumented code does not need to check for it.
+    Files are replaced atomically, a collector never reads a half written file.
+    """
+
+    def __init__(self) -> None:
+        self.path: Path | None = None
+        self.command = ""
+        self._values: dict[tuple[str, _Labels], float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def configure(self, path: Path | str | None) -> None:
+        self.path = Path(path) if path else None
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        if self.path is None:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        if self.path is None:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Time a stage of the command, stages entered several times add up.
+        """
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.inc("autocana_stage_duration_seconds", time.monotonic() - started, stage=name)
+
+    def cache(self, name: str, hit: bool) -> None:
+        self.inc("autocana_cache_requests_total", cache=name, result="hit" if hit else "miss")
+
+    def run_command(self, command: str, run: Callable[[], int]) -> int:
+        """
+        Run a command writing its metrics once it finishes, failed or not.
+        """
+        self.command = command
+        started, exit_code = time.monotonic(), 1
+        try:
+            exit_code = run()
+            return exit_code
+        finally:
+            if self.path is not None:
+                self.set("autocana_run_success", float(exit_code == 0))
+                self.set("autocana_run_exit_code", exit_code)
+                self.set("autocana_run_duration_seconds", time.monotonic() - started)
+                self.set("autocana_run_timestamp_seconds", time.time())
+                try:
+                    self.write()
+                except OSError as e:
+                    logger.warning(f"unable to write the metrics into {self.path}: {e}")
+
+    def write(self) -> None:
+        if self.path is None:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        name = f"autocana_{self.command.replace('-', '_')}"
+        _write_atomic(self.path / f"{name}.prom", self.to_prometheus())
+        _write_atomic(self.path / f"{name}.json", json.dumps(self.summary(), indent=2))
+
+    def to_prometheus(self) -> str:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines: list[str] = []
+        last = None
+        for (name, labels), value in values:
+            if name != last:
+                kind, description = METRICS[name]
+                lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+                last = name
+            rendered = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            lines.append(f"{name}{{{rendered}}} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict[str, object]:
+        with self._lock:
+            values = dict(self._values)
+
+        summary: dict[str, object] = {
+            "command": self.command,
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+        }
+        metrics: dict[str, list[dict[str, object]]] = {}
+        for (name, labels), value in sorted(values.items()):
+            series = {k: v for k, v in labels if k != "command"}
+            metrics.setdefault(name.removeprefix("autocana_"), []).append({**series, "value": value})
+        summary["metrics"] = metrics
+
+        lookups: dict[str, dict[str, float]] = {}
+        for (name, labels), value in values.items():
+            if name == "autocana_cache_requests_total":
+                label = dict(labels)
+                lookups.setdefault(label["cache"], {})[label["result"]] = value
+        summary["cache_hit_rate"] = {
+            cache: counts.get("hit", 0.0) / sum(counts.values()) for cache, counts in sorted(lookups.items())
+        }
+        return summary
+
+    def _key(self, name: str, labels: dict[str, str]) -> tuple[str, _Labels]:
+        if name not in METRICS:
+            raise ValueError(f"unknown metric '{name}'")
+        return name, tuple(sorted({"command": self.command, **labels}.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    # 'repr' keeps every digit of timestamps and byte counts, where 'g' would round them
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _write_atomic(path: Path, content: str) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(content, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+metrics = MetricsCollector()
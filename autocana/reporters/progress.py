@@ -0,0 +1,166 @@
+import logging
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import IO
+
+from .output import write
+
+logger = logging.getLogger("autocana")
+
+SECONDS = "s"
+PERCENT = "%"
+BYTES = "B"
+
+LOG_INTERVAL = 10.0
+REFRESH_INTERVAL = 0.5
+
+
+@dataclass
+class Progress:
+    """
+    Common progress of a running job, 'done' and 'total' are measured in 'unit': seconds of media for FFmpeg, percent
+    for HandBrake and bytes for downloads.
+    """
+
+    label: str
+    unit: str = PERCENT
+    total: float | None = None
+    done: float = 0.0
+    fps: float | None = None
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def fraction(self) -> float | None:
+        if not self.total:
+            return None
+        return min(1.0, self.done / self.total)
+
+    @property
+    def rate(self) -> float:
+        """
+        'unit' per second: bytes/s for downloads, the speed factor for media.
+        """
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> float | None:
+        if self.total is None or self.rate <= 0:
+            return None
+        return max(0.0, (self.total - self.done) / self.rate)
+
+    def format(self) -> str:
+        parts = [self.label]
+        if (fraction := self.fraction) is not None:
+            parts.append(f"{fraction:6.1%}")
+        if self.unit == BYTES:
+            total = f"/{_size(self.total)}" if self.total else ""
+            parts.append(f"{_size(self.done)}{total} {_size(self.rate)}/s")
+        elif self.unit == SECONDS:
+            parts.append(f"{_duration(self.done)} {self.rate:.1f}x")
+        if self.fps is not None:
+            parts.append(f"{self.fps:.1f} fps")
+        if (eta := self.eta) is not None:
+            parts.append(f"ETA {_duration(eta)}")
+        return " ".join(parts)
+
+    def summary(self) -> str:
+        parts = [f"{self.label} finished in {_duration(self.elapsed)}"]
+        if self.unit == BYTES:
+            parts.append(f"({_size(self.done)}, {_size(self.rate)}/s)")
+        elif self.unit == SECONDS:
+            parts.append(f"({_duration(self.done)} of media, {self.rate:.1f}x)")
+        return " ".join(parts)
+
+
+class ProgressReporter:
+    """
+    Render the progress of the running jobs: a status line rewritten in place when the output is a terminal, a log line
+    every 'log_interval' seconds per job otherwise. Finished jobs log their duration and throughput, so slow stages
+    stand out in the logs of unattended runs.
+    """
+
+    def __init__(self, stream: IO[bytes] = sys.stdout.buffer, log_interval: float = LOG_INTERVAL) -> None:
+        self.stream = stream
+        self.log_interval = log_interval
+        self._active: list[Progress] = []
+        self._logged: dict[int, float] = {}
+        self._rendered = 0.0
+        self._status = False
+        self._lock = threading.Lock()
+
+    @property
+    def interactive(self) -> bool:
+        return self.stream.isatty()
+
+    def start(self, label: str, unit: str = PERCENT, total: float | None = None) -> Progress:
+        progress = Progress(label=label, unit=unit, total=total)
+        with self._lock:
+            self._active.append(progress)
+            self._logged[id(progress)] = progress.started
+        return progress
+
+    def update(self, progress: Progress) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self.interactive:
+                if now - self._rendered >= REFRESH_INTERVAL:
+                    self._rendered = now
+                    self._render()
+                return
+            if now - self._logged.get(id(progress), now) < self.log_interval:
+                return
+            self._logged[id(progress)] = now
+        # outside the lock, the log handler clears the status line
+        logger.info(progress.format())
+
+    def finish(self, progress: Progress, failed: bool = False) -> None:
+        with self._lock:
+            if progress in self._active:
+                self._active.remove(progress)
+            self._logged.pop(id(progress), None)
+            self._clear()
+        if failed:
+            logger.debug(f"{progress.label} failed after {_duration(progress.elapsed)}")
+        else:
+            logger.info(progress.summary())
+
+    def clear(self) -> None:
+        """
+        Remove the status line so other output does not get mixed with it, it is drawn again on the next update.
+        """
+        with self._lock:
+            self._clear()
+
+    def _render(self) -> None:
+        if self._active:
+            write("\r\033[K" + " | ".join(p.format() for p in self._active), stream=self.stream)
+            self._status = True
+
+    def _clear(self) -> None:
+        if self._status:
+            write("\r\033[K", stream=self.stream)
+            self._status = False
+
+
+def _duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def _size(size: float | None) -> str:
+    size = size or 0.0
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+progress_reporter = ProgressReporter()
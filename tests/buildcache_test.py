@@ -0,0 +1,92 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from autocana.data.buildcache import BuildCache, build_key
+
+_PAYLOAD = {"days": "20", "rate": "500,00 EUR", "period_start": "01/09/2026"}
+
+_KEY_SCRIPT = """
+import json, sys
+from pathlib import Path
+from autocana.data.buildcache import build_key
+print(build_key("invoice", json.loads(sys.argv[1]), "invoice.docx", files=[Path(sys.argv[2])]))
+"""
+
+
+class BuildCacheTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.cache = BuildCache(self.dir / "builds", max_entries=2)
+
+    def _file(self, name: str, content: str) -> Path:
+        path = self.dir / name
+        path.write_text(content)
+        return path
+
+    def test_store_and_restore(self) -> None:
+        self.cache.store(
+            "key", {"tsh.xlsx": self._file("built.xlsx", "xlsx"), "tsh.pdf": self._file("built.pdf", "pdf")}
+        )
+
+        outputs = {"tsh.xlsx": self.dir / "out.xlsx", "tsh.pdf": self.dir / "out.pdf"}
+        self.assertTrue(self.cache.restore("key", outputs))
+        self.assertEqual(outputs["tsh.xlsx"].read_text(), "xlsx")
+        self.assertEqual(outputs["tsh.pdf"].read_text(), "pdf")
+
+    def test_restore_misses(self) -> None:
+        self.assertFalse(self.cache.restore("key", {"invoice.pdf": self.dir / "out.pdf"}))
+
+        # an entry missing any of the outputs is a miss, and nothing is copied
+        self.cache.store("key", {"tsh.xlsx": self._file("built.xlsx", "xlsx")})
+        outputs = {"tsh.xlsx": self.dir / "out.xlsx", "tsh.pdf": self.dir / "out.pdf"}
+        self.assertFalse(self.cache.restore("key", outputs))
+        self.assertFalse(outputs["tsh.xlsx"].exists())
+
+    def test_store_replaces_entries(self) -> None:
+        self.cache.store("key", {"invoice.pdf": self._file("first.pdf", "first")})
+        self.cache.store("key", {"invoice.pdf": self._file("second.pdf", "second")})
+
+        output = self.dir / "out.pdf"
+        self.assertTrue(self.cache.restore("key", {"invoice.pdf": output}))
+        self.assertEqual(output.read_text(), "second")
+
+    def test_prunes_least_recently_used_entries(self) -> None:
+        pdf = self._file("built.pdf", "pdf")
+        for i, key in enumerate(["a", "b"]):
+            self.cache.store(key, {"invoice.pdf": pdf})
+            os.utime(self.cache.path / key, (1000 + i, 1000 + i))
+
+        # restoring 'a' makes it the most recently used, 'b' is the one pruned
+        self.assertTrue(self.cache.restore("a", {"invoice.pdf": self.dir / "out.pdf"}))
+        self.cache.store("c", {"invoice.pdf": pdf})
+
+        self.assertEqual(sorted(p.name for p in self.cache.path.iterdir()), ["a", "c"])
+
+    def test_key_is_stable_across_runs(self) -> None:
+        signature = self._file("signature.png", "signature")
+        key = build_key("invoice", _PAYLOAD, "invoice.docx", files=[signature])
+
+        # a separate interpreter, as the next run would be, gets the same key
+        result = subprocess.run(
+            [sys.executable, "-c", _KEY_SCRIPT, json.dumps(_PAYLOAD), str(signature)],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(result.stdout.strip(), key)
+        self.assertEqual(build_key("invoice", dict(reversed(_PAYLOAD.items())), "invoice.docx", [signature]), key)
+
+    def test_key_changes_with_the_inputs(self) -> None:
+        signature = self._file("signature.png", "signature")
+        key = build_key("invoice", _PAYLOAD, "invoice.docx", files=[signature])
+
+        self.assertNotEqual(build_key("invoice", {**_PAYLOAD, "days": "19"}, "invoice.docx", [signature]), key)
+        self.assertNotEqual(build_key("tsh", _PAYLOAD, "invoice.docx", [signature]), key)
+        self.assertNotEqual(build_key("invoice", _PAYLOAD, "tsh.xlsx", [signature]), key)
+        signature.write_text("another signature")
+        self.assertNotEqual(build_key("invoice", _PAYLOAD, "invoice.docx", [signature]), key)
@@ -0,0 +1,141 @@
+import argparse
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+from autocana import cli
+from autocana.data import closemonth
+from autocana.data.buildcache import BuildCache
+from autocana.data.closemonth import CloseMonthConfig
+from autocana.data.invoice import DEFAULT_BILLED_DAYS, InvoiceConfig
+from autocana.data.period import Period
+
+_CONFIG = {
+    "private": {
+        "address": "Rúa do Vilar 1, Santiago",
+        "bank_account": "ES9121000418450200051332",
+        "email": "alice@example.com",
+        "full_name": "Alice Liddell",
+        "phone_number": "600000000",
+        "vat": "12345678Z",
+    },
+    "invoicing": {
+        "activity_id": "A1",
+        "contract_number": "2024-0042",
+        "customer_contract": 4711,
+        "extension_number": 3,
+        "last_invoice": 1000,
+    },
+}
+
+
+def _args(**kwargs: Any) -> argparse.Namespace:
+    defaults = {"days": None, "month": 9, "rate": None, "skip": [], "timesheet": None, "output": None, "force": False}
+    return argparse.Namespace(**{**defaults, "output_dir": None, **kwargs})
+
+
+class PeriodTestCase(unittest.TestCase):
+    def test_instances_are_shared(self) -> None:
+        self.assertIs(Period.of(9, 2026), Period.of(9, 2026))
+        self.assertIsNot(Period.of(9, 2026), Period.of(10, 2026))
+
+    def test_working_days(self) -> None:
+        period = Period.of(9, 2026)  # starts on a Tuesday
+
+        self.assertEqual((period.first_day.day, period.last_day.day), (1, 30))
+        self.assertEqual(len(period.weekdays), 22)
+        self.assertNotIn(5, period.weekdays)  # saturday
+        self.assertEqual(len(period.working_days([1, 2, 5])), 20)
+
+    def test_invalid_month(self) -> None:
+        with self.assertRaises(ValueError):
+            Period.of(13)
+
+
+class CloseMonthConfigTestCase(unittest.TestCase):
+    def _from_args(self, args: argparse.Namespace) -> tuple[CloseMonthConfig, mock.MagicMock]:
+        with mock.patch.object(closemonth, "load_user_config", return_value=_CONFIG) as load:
+            return CloseMonthConfig.from_args(args), load
+
+    def test_shares_the_config_and_the_period(self) -> None:
+        config, load = self._from_args(_args(skip=[1, 2]))
+
+        load.assert_called_once_with()
+        self.assertIs(config.invoice.period, config.tsh.period)
+        # the invoice bills the working days left in the TSH
+        self.assertEqual(config.tsh.rest_days, [1, 2])
+        self.assertEqual(config.invoice.billed_days, len(config.tsh.period.working_days([1, 2])))
+
+    def test_billed_days_override(self) -> None:
+        config, _ = self._from_args(_args(days=15, rate=550))
+
+        self.assertEqual((config.invoice.billed_days, config.invoice.rate), (15, 550))
+
+    def test_plain_invoice_bills_the_default_days(self) -> None:
+        invoice = InvoiceConfig.load(_CONFIG).with_params(_args(skip=[1, 2]))
+
+        self.assertEqual(invoice.billed_days, DEFAULT_BILLED_DAYS)
+
+
+class CmdCloseMonthTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        with mock.patch.object(closemonth, "load_user_config", return_value=_CONFIG):
+            self.config = CloseMonthConfig.from_args(_args(output_dir=str(self.dir)))
+        self.conversions: list[list[Path]] = []
+
+    def _render_invoice(self, config: Any, docx_path: Path) -> Path:
+        docx_path.write_text("invoice")
+        return docx_path
+
+    def _render_tsh(self, config: Any, xlsx_path: Path) -> Path:
+        xlsx_path.write_text("tsh")
+        return xlsx_path
+
+    def _convert_to_pdf(self, files: list[Path], output_dir: Path) -> list[Path]:
+        self.conversions.append(files)
+        pdfs = [output_dir / f"{f.stem}.pdf" for f in files]
+        for pdf in pdfs:
+            pdf.write_text("pdf")
+        return pdfs
+
+    def _close_month(self) -> int:
+        with (
+            mock.patch.object(cli, "ensure_libreoffice_is_installed"),
+            mock.patch.object(cli, "render_invoice", self._render_invoice),
+            mock.patch.object(cli, "render_tsh", self._render_tsh),
+            mock.patch.object(cli, "convert_to_pdf", self._convert_to_pdf),
+            mock.patch.object(cli, "BuildCache", lambda: BuildCache(self.dir / "builds")),
+            mock.patch.object(cli, "_issue_invoice") as issue_invoice,
+        ):
+            result = cli.cmd_close_month(self.config)
+        self.issued = issue_invoice.call_count
+        return result
+
+    def test_converts_both_documents_at_once(self) -> None:
+        self.assertEqual(self._close_month(), 0)
+
+        [sources] = self.conversions
+        self.assertEqual(sorted(f.suffix for f in sources), [".docx", ".xlsx"])
+        self.assertTrue(Path(self.config.invoice.output_path).is_file())
+        self.assertTrue(Path(self.config.tsh.output_path).with_suffix(".pdf").is_file())
+        self.assertEqual(self.issued, 1)
+
+    def test_reuses_cached_documents(self) -> None:
+        self._close_month()
+        self.conversions.clear()
+
+        self.assertEqual(self._close_month(), 0)
+        self.assertEqual(self.conversions, [])
+        self.assertEqual(self.issued, 0)
+
+    def test_force_builds_again(self) -> None:
+        self._close_month()
+        self.conversions.clear()
+        self.config.invoice.force = self.config.tsh.force = True
+
+        self.assertEqual(self._close_month(), 0)
+        self.assertEqual(len(self.conversions[0]), 2)
+        self.assertEqual(self.issued, 1)
@@ -0,0 +1,84 @@
+import os
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from autocana.data import config
+from autocana.data.config import CONVERTER_RESTARTS, LIBREOFFICE_PROFILE_ENV, convert_to_pdf
+
+
+class ConvertToPdfTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.sources = [self.dir / "invoice.docx", self.dir / "tsh.xlsx"]
+        for source in self.sources:
+            source.write_text(source.name)
+        self.calls: list[list[str]] = []
+
+    def _convert(self, *outcomes: tuple[list[str], bool]) -> list[Path]:
+        """
+        Convert the sources with a fake libreoffice, every call writes the PDFs of the named files then exits, with an
+        error when told to. Calls past the given outcomes write nothing.
+        """
+
+        def run_tool(cmd: list[str]) -> None:
+            self.calls.append(cmd)
+            written, crash = outcomes[len(self.calls) - 1] if len(self.calls) <= len(outcomes) else ([], False)
+            files = cmd[cmd.index("--outdir") + 2 :]
+            for name in written:
+                self.assertIn(str(self.dir / name), files)
+                (self.dir / f"{Path(name).stem}.pdf").write_text("pdf")
+            if crash:
+                raise subprocess.CalledProcessError(1, cmd)
+
+        with mock.patch.object(config, "run_tool", run_tool):
+            return convert_to_pdf(self.sources, self.dir)
+
+    def _converted(self, call: int) -> list[str]:
+        cmd = self.calls[call]
+        return [Path(f).name for f in cmd[cmd.index("--outdir") + 2 :]]
+
+    def test_single_call(self) -> None:
+        pdfs = self._convert((["invoice.docx", "tsh.xlsx"], False))
+
+        self.assertEqual(pdfs, [self.dir / "invoice.pdf", self.dir / "tsh.pdf"])
+        self.assertEqual(len(self.calls), 1)
+
+    def test_restarts_for_missing_outputs(self) -> None:
+        pdfs = self._convert((["invoice.docx"], False), (["tsh.xlsx"], False))
+
+        self.assertEqual(pdfs, [self.dir / "invoice.pdf", self.dir / "tsh.pdf"])
+        # the restart only converts what is missing
+        self.assertEqual([self._converted(0), self._converted(1)], [["invoice.docx", "tsh.xlsx"], ["tsh.xlsx"]])
+
+    def test_restarts_after_a_crash(self) -> None:
+        pdfs = self._convert((["invoice.docx"], True), (["tsh.xlsx"], False))
+
+        self.assertEqual(pdfs, [self.dir / "invoice.pdf", self.dir / "tsh.pdf"])
+        self.assertEqual(self._converted(1), ["tsh.xlsx"])
+
+    def test_gives_up_after_the_restarts(self) -> None:
+        with self.assertRaises(subprocess.CalledProcessError):
+            self._convert(*[([], True)] * (CONVERTER_RESTARTS + 1))
+        self.assertEqual(len(self.calls), CONVERTER_RESTARTS + 1)
+
+        self.calls.clear()
+        with self.assertRaisesRegex(FileNotFoundError, "tsh.xlsx"):
+            self._convert((["invoice.docx"], False))
+        self.assertEqual(len(self.calls), CONVERTER_RESTARTS + 1)
+
+    def test_stale_outputs_are_not_converted(self) -> None:
+        # a PDF left by a previous run is not taken for a new one
+        (self.dir / "tsh.pdf").write_text("old pdf")
+
+        with self.assertRaisesRegex(FileNotFoundError, "tsh.xlsx"):
+            self._convert((["invoice.docx"], False))
+
+    def test_own_libreoffice_profile(self) -> None:
+        profile = self.dir / "profile"
+        with mock.patch.dict(os.environ, {LIBREOFFICE_PROFILE_ENV: str(profile)}):
+            self._convert((["invoice.docx", "tsh.xlsx"], False))
+
+        self.assertIn(f"-env:UserInstallation={profile.as_uri()}", self.calls[0])
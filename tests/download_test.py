@@ -0,0 +1,309 @@
+import argparse
+import hashlib
+import json
+import random
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import requests
+
+from autocana import cli
+from autocana.data import downloader
+from autocana.data.download import DownloadConfig
+from autocana.data.downloader import (
+    DEFAULT_POOL_SIZE,
+    chunk_download_url,
+    download_url,
+    new_session,
+    output_file,
+    unique_file_names,
+)
+from autocana.data.integrity import MANIFEST_NAME, SHA256, StreamHasher
+from autocana.data.jobqueue import DownloadQueue
+from autocana.data.pipeline import PostProcess
+from autocana.data.retry import RetryPolicy
+from autocana.main import _cmd_download
+from tests.fixtures.http_server import Faults, FaultyServer
+
+# no waits between attempts, the faults of the server are what is being tested
+_POLICY = RetryPolicy(retries=10, backoff=0.0, read_timeout=5.0)
+
+
+def _payload(seed: int, size: int = 64 * 1024) -> bytes:
+    return random.Random(seed).randbytes(size)
+
+
+class DownloadTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.output = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.session = self.enterContext(new_session())
+
+    def test_download_file(self) -> None:
+        data = _payload(0)
+        with FaultyServer() as server:
+            hasher = StreamHasher()
+            path = download_url(self.session, server.add_file("video.mp4", data), self.output, hasher=hasher)
+
+        self.assertEqual(path, self.output / "video.mp4")
+        self.assertEqual(path.read_bytes(), data)
+        self.assertEqual(hasher.digests[SHA256], hashlib.sha256(data).hexdigest())
+
+    def test_output_file(self) -> None:
+        self.assertEqual(
+            output_file("https://example.com/a/video%201.mp4?t=1", self.output), self.output / "video 1.mp4"
+        )
+        self.assertEqual(output_file("https://example.com/seg{}.ts", self.output), self.output / "seg.ts")
+        self.assertEqual(output_file("https://example.com/", self.output), self.output / "download")
+        self.assertEqual(output_file("https://example.com/video.mp4", self.output / "x.mp4"), self.output / "x.mp4")
+
+    def test_unique_file_names(self) -> None:
+        urls = ["https://a.com/video.mp4", "https://b.com/video.mp4", "https://a.com/other.mp4"]
+        names = unique_file_names(urls)
+
+        self.assertEqual(set(names), set(urls[:2]))
+        self.assertEqual(len(set(names.values())), 2)
+        for name in names.values():
+            self.assertRegex(name, r"^video-[0-9a-f]{8}\.mp4$")
+        # stable across runs, so a later run finds the same files
+        self.assertEqual(unique_file_names(list(reversed(urls))), names)
+
+    def test_download_urls_sharing_a_name(self) -> None:
+        with FaultyServer() as server:
+            urls = [server.add_file(f"{i}/video.mp4", _payload(i)) for i in range(2)]
+            names = unique_file_names(urls)
+            paths = [download_url(self.session, url, self.output / names[url]) for url in urls]
+
+        self.assertEqual([p.read_bytes() for p in paths], [_payload(0), _payload(1)])
+
+    def test_retries_transient_failures(self) -> None:
+        files = {f"file{i}.bin": _payload(i) for i in range(20)}
+        with FaultyServer(Faults(error_rate=0.3, reset_rate=0.2, seed=1)) as server:
+            for name, data in files.items():
+                hasher = StreamHasher()
+                path = download_url(
+                    self.session, server.add_file(name, data), self.output, hasher=hasher, policy=_POLICY
+                )
+                self.assertEqual(path.read_bytes(), data)
+                self.assertEqual(hasher.digests[SHA256], hashlib.sha256(data).hexdigest())
+
+        self.assertGreater(sum(server.requests.values()), len(files))
+
+    def test_client_errors_fail_fast(self) -> None:
+        with FaultyServer() as server:
+            url = server.add_file("private.bin", _payload(0))
+            server.fail("private.bin", 403)
+            with self.assertRaises(requests.HTTPError):
+                download_url(self.session, url, self.output, policy=_POLICY)
+
+        self.assertEqual(server.requests["/private.bin"], 1)
+        self.assertFalse((self.output / "private.bin").exists())
+
+    def test_honors_retry_after(self) -> None:
+        with FaultyServer(Faults(retry_after=1)) as server:
+            url = server.add_file("busy.bin", _payload(0))
+            server.fail("busy.bin", 503)
+            start = time.monotonic()
+            download_url(self.session, url, self.output, policy=_POLICY)
+
+        self.assertGreaterEqual(time.monotonic() - start, 1)
+        self.assertEqual(server.requests["/busy.bin"], 2)
+
+    def test_resumes_interrupted_download(self) -> None:
+        data, statuses = _payload(0, size=256 * 1024), []
+        self.session.hooks["response"].append(lambda r, *args, **kwargs: statuses.append(r.status_code))
+        with FaultyServer(Faults(reset_rate=1.0)) as server:
+            url = server.add_file("video.mp4", data)
+            with self.assertRaises(requests.RequestException):
+                download_url(self.session, url, self.output, 16 * 1024, policy=RetryPolicy(retries=0))
+
+            partial = self.output / ".video.mp4.part"
+            self.assertLess(0, partial.stat().st_size)
+            self.assertLess(partial.stat().st_size, len(data))
+            self.assertFalse((self.output / "video.mp4").exists())
+
+            server.faults.reset_rate = 0.0
+            hasher = StreamHasher()
+            path = download_url(self.session, url, self.output, hasher=hasher, policy=_POLICY)
+
+        self.assertEqual(statuses, [200, 206])
+        self.assertEqual(path.read_bytes(), data)
+        self.assertEqual(hasher.digests[SHA256], hashlib.sha256(data).hexdigest())
+        self.assertEqual([p.name for p in self.output.iterdir()], ["video.mp4"])
+
+    def test_retries_without_etag_from_the_start(self) -> None:
+        data = _payload(0, size=256 * 1024)
+        # the seed resets the first response halfway through and lets the second one finish
+        with (
+            FaultyServer(Faults(reset_rate=0.5, etags=False, seed=9)) as server,
+            mock.patch.object(downloader.progress_reporter, "finish") as finish,
+        ):
+            url = server.add_file("video.mp4", data)
+            path = download_url(self.session, url, self.output, 16 * 1024, policy=_POLICY)
+
+        self.assertEqual(server.requests["/video.mp4"], 2)
+        self.assertEqual(path.read_bytes(), data)
+        # the discarded bytes of the first attempt are not counted twice
+        progress = finish.call_args.args[0]
+        self.assertEqual((progress.done, progress.total), (len(data), len(data)))
+
+    def test_restarts_replaced_download(self) -> None:
+        with FaultyServer(Faults(reset_rate=1.0)) as server:
+            url = server.add_file("video.mp4", _payload(0))
+            with self.assertRaises(requests.RequestException):
+                download_url(self.session, url, self.output, 16 * 1024, policy=RetryPolicy(retries=0))
+
+            # the ETag changes with the content, the partial bytes are discarded
+            data = _payload(1)
+            server.faults.reset_rate = 0.0
+            server.add_file("video.mp4", data)
+            path = download_url(self.session, url, self.output, policy=_POLICY)
+
+        self.assertEqual(path.read_bytes(), data)
+
+    def test_chunk_download(self) -> None:
+        segments = [_payload(i, size=16 * 1024) for i in range(40)]
+        with FaultyServer(Faults(error_rate=0.1, reset_rate=0.1, seed=2)) as server:
+            # no segment 0, the download has to start at 1
+            url = server.add_segments("stream/seg{}.ts", segments, start=1)
+            hasher = StreamHasher()
+            path = chunk_download_url(self.session, url, self.output, hasher=hasher, policy=_POLICY)
+
+        self.assertEqual(path.read_bytes(), b"".join(segments))
+        self.assertEqual(hasher.digests[SHA256], hashlib.sha256(b"".join(segments)).hexdigest())
+
+    def test_hedges_stragglers(self) -> None:
+        segments = [_payload(i, size=16 * 1024) for i in range(20)]
+        with FaultyServer(Faults(latency=0.01)) as server:
+            url = server.add_segments("stream/seg{}.ts", segments)
+            server.stall("stream/seg15.ts", 30)
+            path = chunk_download_url(self.session, url, self.output, policy=_POLICY, hedge=90)
+            answered = server.responses["/stream/seg15.ts"]
+
+        # the hedged request won while the original one was still stalled
+        self.assertEqual(server.requests["/stream/seg15.ts"], 2)
+        self.assertEqual(answered, 1)
+        self.assertEqual(path.read_bytes(), b"".join(segments))
+
+    def test_stalled_losers_do_not_hold_back_later_segments(self) -> None:
+        segments = [_payload(i, size=16 * 1024) for i in range(30)]
+        stalled = [f"/stream/seg{i}.ts" for i in range(10, 20)]
+        with FaultyServer(Faults(latency=0.01)) as server:
+            url = server.add_segments("stream/seg{}.ts", segments)
+            for segment in stalled:
+                server.stall(segment, 30)
+            # losers waiting for their headers can only give up on a read timeout, longer than the stalls here
+            policy = RetryPolicy(retries=0, backoff=0.0, read_timeout=60.0)
+            path = chunk_download_url(self.session, url, self.output, policy=policy, hedge=90)
+            answered = [server.responses[segment] for segment in stalled]
+
+        # every stalled segment was fetched by its hedged request while the original one was still stalled, none of
+        # them waited for a thread held by a loser
+        self.assertEqual([server.requests[segment] for segment in stalled], [2] * len(stalled))
+        self.assertEqual(answered, [1] * len(stalled))
+        self.assertEqual(path.read_bytes(), b"".join(segments))
+
+    def test_load_large_url_list(self) -> None:
+        files = {f"videos/{i}.mkv": _payload(i, size=256 * 1024) for i in range(300)}
+        with FaultyServer(Faults(latency=0.001, error_rate=0.02, seed=3)) as server:
+            urls = {name: server.add_file(name, data) for name, data in files.items()}
+            for name, url in urls.items():
+                hasher = StreamHasher()
+                download_url(self.session, url, self.output, hasher=hasher, policy=_POLICY)
+                self.assertEqual(hasher.digests[SHA256], hashlib.sha256(files[name]).hexdigest())
+
+        # every file was requested, the few injected 503s were retried and nothing else was
+        self.assertEqual(set(server.requests), {f"/{name}" for name in files})
+        self.assertGreater(sum(server.requests.values()), len(files))
+        self.assertLess(sum(server.requests.values()), len(files) * 1.1)
+        # keep-alive: the whole list goes through a handful of connections
+        self.assertLessEqual(len(server.connections), DEFAULT_POOL_SIZE)
+
+
+class CmdDownloadTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.output = self.dir / "downloads"
+        self.output.mkdir()
+        self.processed: list[tuple[Path, int]] = []
+        self.server = FaultyServer()
+        queue = self.dir / "downloads.sqlite3"
+        self.enterContext(mock.patch.object(cli, "DownloadQueue", lambda output: DownloadQueue(output, queue)))
+        self.enterContext(mock.patch.object(cli, "ensure_ffmpeg_is_installed"))
+        self.enterContext(mock.patch.object(PostProcess, "run", self._post_process))
+
+    def _post_process(self, file: Path, threads: int) -> Path:
+        """
+        Stub post-processing, records the file and how many downloads the server had finished by then.
+        """
+        self.processed.append((file, sum(self.server.responses.values())))
+        return file.with_suffix(".mp3")
+
+    def _download(self, files: dict[str, bytes], *args: str, retries: int = 10, wrong: tuple[str, ...] = ()) -> int:
+        """
+        Run 'autocana download' over a list with the URLs of 'files' and their checksums ('wrong' ones for the names
+        in 'wrong').
+        """
+        lines = []
+        for name, data in files.items():
+            checksum = "0" * 64 if name in wrong else hashlib.sha256(data).hexdigest()
+            lines.append(f"{self.server.add_file(name, data)}  {checksum}")
+        urls = self.dir / "urls.txt"
+        urls.write_text("\n".join(lines))
+
+        parsed = _cmd_download(argparse.ArgumentParser()).parse_args(
+            [str(urls), "--output-dir", str(self.output), *args]
+        )
+        config = DownloadConfig.from_args(parsed)
+        config.retry = RetryPolicy(retries=retries, backoff=0.0, read_timeout=5.0)
+        return cli.cmd_download(config)
+
+    def test_queue_checksums_and_post_processing(self) -> None:
+        files = {f"video{i}.mp4": _payload(i) for i in range(20)}
+        self.server.faults = Faults(error_rate=0.1, reset_rate=0.1, seed=4)
+        with self.server:
+            self.assertEqual(self._download(files, "--then", "extract", "-w", "2", wrong=("video7.mp4",)), 1)
+            requests_made = self.server.requests.copy()
+
+            # the failed URL is retried with its right checksum, the finished ones are not downloaded again
+            self.assertEqual(self._download(files, "--then", "extract", "-w", "2", "--requeue-failed"), 0)
+            again = self.server.requests - requests_made
+
+        self.assertEqual(set(again), {"/video7.mp4"})
+        for name, data in files.items():
+            self.assertEqual((self.output / name).read_bytes(), data)
+        manifest = json.loads((self.output / MANIFEST_NAME).read_text())
+        self.assertEqual(
+            {name: entry[SHA256] for name, entry in manifest.items()},
+            {name: hashlib.sha256(data).hexdigest() for name, data in files.items()},
+        )
+        self.assertEqual(sorted(file.name for file, _ in self.processed), sorted(files))
+
+    def test_restarts_downloads_that_can_not_be_resumed(self) -> None:
+        data = _payload(0, size=256 * 1024)
+        for faults in (Faults(ranges=False), Faults(stable_etags=False)):
+            with self.subTest(faults=faults), FaultyServer(faults) as self.server:
+                self.output = Path(self.enterContext(tempfile.TemporaryDirectory(dir=self.dir)))
+                self.server.faults.reset_rate = 1.0
+                self.assertEqual(self._download({"video.mp4": data}, "--buffer-size", "16", retries=0), 1)
+                self.assertTrue((self.output / ".video.mp4.part").is_file())
+
+                # the partial bytes are discarded, the checksum of the new download still matches
+                self.server.faults.reset_rate = 0.0
+                self.assertEqual(self._download({"video.mp4": data}, "--requeue-failed"), 0)
+
+                self.assertEqual(self.server.requests["/video.mp4"], 2)
+                self.assertEqual((self.output / "video.mp4").read_bytes(), data)
+
+    def test_post_processing_overlaps_the_downloads(self) -> None:
+        files = {f"video{i}.mp4": _payload(i) for i in range(4)}
+        # each file takes 1/4s to download
+        self.server.faults = Faults(bandwidth=256 * 1024)
+        with self.server:
+            self.assertEqual(self._download(files, "--then", "extract", "-w", "1"), 0)
+
+        # the first file was processed while the others were still downloading
+        self.assertEqual(len(self.processed), len(files))
+        self.assertLess(min(finished for _, finished in self.processed), len(files))
@@ -0,0 +1,89 @@
+import gzip
+import logging
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import autocana.constants as C
+from autocana.reporters import errors, logs
+from autocana.reporters.errors import MAX_CRASH_REPORTS_SIZE, error_handler
+from autocana.reporters.logs import FLIGHT_RECORDER_MAX_MESSAGE, FlightRecorder, flight_recorder, logging_handler
+
+_MB = 1024**2
+
+
+def _record(message: str, level: int = logging.DEBUG) -> logging.LogRecord:
+    return logging.makeLogRecord({"msg": message, "levelno": level, "levelname": logging.getLevelName(level)})
+
+
+class FlightRecorderTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        flight_recorder.records.clear()
+        self.addCleanup(flight_recorder.records.clear)
+
+    def test_keeps_debug_records_while_the_console_shows_info(self) -> None:
+        logger = logging.getLogger("autocana")
+        with mock.patch.object(logs, "write_line") as console, logging_handler(use_color=False):
+            logger.debug("probing lecture.mkv")
+            logger.info("encoding lecture.mkv")
+
+        self.assertEqual([c.args[0] for c in console.call_args_list], ["[INFO] encoding lecture.mkv"])
+        self.assertEqual(
+            [r.getMessage() for r in flight_recorder.records], ["probing lecture.mkv", "encoding lecture.mkv"]
+        )
+
+    def test_drops_the_oldest_records(self) -> None:
+        recorder = FlightRecorder(capacity=3)
+        for i in range(5):
+            recorder.handle(_record(f"record {i}"))
+
+        lines = recorder.dump()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].endswith("[DEBUG] MainThread: record 2"), lines[0])
+        self.assertTrue(lines[-1].endswith("record 4"))
+
+    def test_truncates_long_messages(self) -> None:
+        recorder = FlightRecorder()
+        recorder.handle(_record("x" * (FLIGHT_RECORDER_MAX_MESSAGE + 10)))
+
+        [line] = recorder.dump()
+        self.assertTrue(line.endswith(f"... ({FLIGHT_RECORDER_MAX_MESSAGE + 10} chars)"))
+
+
+class CrashReportTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = Path(self.enterContext(tempfile.TemporaryDirectory())) / "crash-reports"
+        self.enterContext(mock.patch.object(C, "CRASH_REPORTS_PATH", self.dir))
+        flight_recorder.records.clear()
+        self.addCleanup(flight_recorder.records.clear)
+
+    def test_report_holds_the_log_records_and_the_traceback(self) -> None:
+        with self.assertRaises(SystemExit) as raised, logging_handler(use_color=False), error_handler():
+            logging.getLogger("autocana").debug("ffprobe returned 3 streams")
+            raise ValueError("unsupported codec")
+
+        self.assertEqual(raised.exception.code, 3)
+        [report] = self.dir.glob("*.log.gz")
+        with gzip.open(report, "rt") as file:
+            content = file.read()
+        self.assertIn("ValueError: unsupported codec", content)
+        self.assertIn("Traceback (most recent call last)", content)
+        self.assertIn("[DEBUG] MainThread: ffprobe returned 3 streams", content)
+
+    def test_prunes_the_oldest_reports(self) -> None:
+        self.dir.mkdir(parents=True)
+        for i in range(5):
+            report = self.dir / f"2026010{i}-120000-1.log.gz"
+            with report.open("wb") as file:
+                file.truncate(3 * _MB)
+            os.utime(report, (1000 + i, 1000 + i))
+        (self.dir / "notes.txt").write_text("not a report")
+
+        errors._prune_crash_reports()
+
+        reports = sorted(p.name for p in self.dir.glob("*.log.gz"))
+        self.assertEqual(reports, [f"2026010{i}-120000-1.log.gz" for i in (2, 3, 4)])
+        self.assertLessEqual(sum(p.stat().st_size for p in self.dir.glob("*.log.gz")), MAX_CRASH_REPORTS_SIZE)
+        self.assertTrue((self.dir / "notes.txt").is_file())
@@ -0,0 +1,182 @@
+import random
+import re
+import socket
+import struct
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import TracebackType
+from typing import Any
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+@dataclass
+class Faults:
+    """
+    Misbehaviours applied to every response of a 'FaultyServer', random ones are drawn from a seeded generator so a
+    test always sees the same sequence of failures.
+    """
+
+    latency: float = 0.0  # seconds waited before answering
+    bandwidth: int | None = None  # bytes per second of each response body
+    error_rate: float = 0.0  # probability of answering 503
+    reset_rate: float = 0.0  # probability of resetting the connection halfway through the body
+    retry_after: int | None = None  # 'Retry-After' seconds sent with the 503 answers
+    ranges: bool = True  # whether 'Range' requests are honored
+    etags: bool = True  # whether an 'ETag' is sent, downloads without one can not be resumed
+    stable_etags: bool = True  # changing ETags look like the file was replaced between requests
+    seed: int = 0
+
+
+class FaultyServer:
+    """
+    Local HTTP/1.1 stand-in for the download sources: serves in-memory files and '{}' segment sequences, injecting the
+    configured 'faults' and recording the requests and connections it receives.
+
+    Besides the random faults, specific requests can be scripted: 'fail' queues error statuses for the next requests to
+    a path and 'stall' delays them.
+    """
+
+    def __init__(self, faults: Faults | None = None) -> None:
+        self.faults = faults or Faults()
+        self.files: dict[str, bytes] = {}
+        self.requests: Counter[str] = Counter()
+        self.responses: Counter[str] = Counter()  # requests answered in full
+        self.connections: set[tuple[str, int]] = set()
+        self._failures: defaultdict[str, list[int]] = defaultdict(list)
+        self._stalls: defaultdict[str, list[float]] = defaultdict(list)
+        self._random = random.Random(self.faults.seed)
+        self._lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(self))
+        self._server.daemon_threads = True
+        self._server.block_on_close = False
+        self._server.handle_error = lambda request, client_address: None  # type: ignore[method-assign]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self) -> "FaultyServer":
+        self._thread.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def url(self, path: str) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host!s}:{port}/{path.lstrip('/')}"
+
+    def add_file(self, path: str, data: bytes) -> str:
+        self.files[f"/{path.lstrip('/')}"] = data
+        return self.url(path)
+
+    def add_segments(self, pattern: str, segments: list[bytes], start: int = 0) -> str:
+        """
+        Serve 'segments' replacing '{}' in 'pattern' with their index, returns the URL template.
+        """
+        for index, data in enumerate(segments, start=start):
+            self.add_file(pattern.replace("{}", str(index)), data)
+        return self.url(pattern)
+
+    def fail(self, path: str, *statuses: int) -> None:
+        with self._lock:
+            self._failures[f"/{path.lstrip('/')}"].extend(statuses)
+
+    def stall(self, path: str, *seconds: float) -> None:
+        with self._lock:
+            self._stalls[f"/{path.lstrip('/')}"].extend(seconds)
+
+    def _next(self, path: str, client: tuple[str, int]) -> tuple[int | None, float, bool]:
+        """
+        (forced status, delay, reset) of the current request.
+        """
+        with self._lock:
+            self.requests[path] += 1
+            self.connections.add(client)
+            status = self._failures[path].pop(0) if self._failures[path] else None
+            delay = self._stalls[path].pop(0) if self._stalls[path] else self.faults.latency
+            if status is None and self._random.random() < self.faults.error_rate:
+                status = 503
+            reset = status is None and self._random.random() < self.faults.reset_rate
+            return status, delay, reset
+
+
+def _handler(server: FaultyServer) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # headers and body are separate writes, Nagle would hold the body back until the client's delayed ACK
+        disable_nagle_algorithm = True
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            self._respond()
+            with server._lock:
+                server.responses[self.path] += 1
+
+        def _respond(self) -> None:
+            status, delay, reset = server._next(self.path, self.client_address)
+            time.sleep(delay)
+
+            data = server.files.get(self.path)
+            if status is None and data is None:
+                status = 404
+            if status is not None or data is None:
+                self.send_response(status or 404)
+                if status == 503 and server.faults.retry_after is not None:
+                    self.send_header("Retry-After", str(server.faults.retry_after))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            etag = f'"{zlib.crc32(data):08x}"'
+            if not server.faults.stable_etags:
+                etag = f'"{zlib.crc32(data):08x}-{server.requests[self.path]}"'
+
+            body, status = data, 200
+            match = _RANGE_RE.fullmatch(self.headers.get("Range", ""))
+            if_range = self.headers.get("If-Range")
+            if server.faults.ranges and match and (if_range is None or if_range == etag):
+                first = int(match.group(1)) if match.group(1) else max(0, len(data) - int(match.group(2)))
+                last = int(match.group(2)) if match.group(1) and match.group(2) else len(data) - 1
+                body, status = data[first : last + 1], 206
+
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            if server.faults.etags:
+                self.send_header("ETag", etag)
+            if server.faults.ranges:
+                self.send_header("Accept-Ranges", "bytes")
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {first}-{last}/{len(data)}")
+            self.end_headers()
+            self._write(body, reset)
+
+        def _write(self, body: bytes, reset: bool) -> None:
+            if reset:
+                self.wfile.write(body[: len(body) // 2])
+                self.wfile.flush()
+                # SO_LINGER with a zero timeout makes close() send a RST instead of a FIN
+                self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+                self.connection.close()
+                self.close_connection = True
+                return
+
+            bandwidth = server.faults.bandwidth
+            block = max(1, bandwidth // 20) if bandwidth else len(body) or 1
+            for offset in range(0, len(body), block):
+                self.wfile.write(body[offset : offset + block])
+                if bandwidth:
+                    time.sleep(block / bandwidth)
+
+    return Handler
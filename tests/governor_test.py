@@ -0,0 +1,93 @@
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import ExitStack
+from pathlib import Path
+
+from autocana.data.governor import POLL_INTERVAL, Governor
+
+_GB = 1024**3
+
+_CONFIGURE_SCRIPT = """
+import sys
+from pathlib import Path
+from autocana.data.governor import Governor
+Governor(Path(sys.argv[1])).configure(jobs=1)
+"""
+
+
+class GovernorTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.path = Path(self.enterContext(tempfile.TemporaryDirectory())) / "governor"
+
+    def _governor(self, jobs: int) -> Governor:
+        return Governor(self.path, jobs=jobs, memory=64 * _GB)
+
+    def _start(self, governor: Governor, weight: int = 1) -> tuple[threading.Event, threading.Event]:
+        """
+        Waits for a slot in a thread, returns the events set once it is held and to release it.
+        """
+        acquired, release = threading.Event(), threading.Event()
+
+        def hold() -> None:
+            with governor.slot("ffprobe", weight=weight):
+                acquired.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(release.set)
+        return acquired, release
+
+    def _wait_for_ticket(self) -> None:
+        for _ in range(100):
+            if list(self.path.glob("wait-*.lock")):
+                return
+            time.sleep(POLL_INTERVAL / 5)
+        self.fail("the request never started waiting")
+
+    def test_limit_is_shared_by_all_instances(self) -> None:
+        first, second = self._governor(jobs=4), self._governor(jobs=8)
+        first.configure(jobs=2)
+
+        with ExitStack() as slots:
+            slots.enter_context(first.slot("ffprobe"))
+            slots.enter_context(first.slot("ffprobe"))
+
+            # the second instance, with a default of 8 slots, follows the published limit
+            acquired, _ = self._start(second)
+            self.assertFalse(acquired.wait(POLL_INTERVAL * 4))
+
+        self.assertTrue(acquired.wait(10))
+
+    def test_limits_of_finished_processes_are_ignored(self) -> None:
+        subprocess.run([sys.executable, "-c", _CONFIGURE_SCRIPT, str(self.path)], check=True)
+        governor = self._governor(jobs=2)
+
+        with governor.slot("ffprobe"):
+            acquired, _ = self._start(governor)
+            self.assertTrue(acquired.wait(10))
+        self.assertEqual(list(self.path.glob("limit-*.lock")), [])
+
+    def test_weighted_requests_are_not_starved(self) -> None:
+        first, second, third = self._governor(jobs=2), self._governor(jobs=2), self._governor(jobs=2)
+
+        light, release_light = self._start(first)
+        self.assertTrue(light.wait(10))
+        heavy, release_heavy = self._start(second, weight=2)
+        self._wait_for_ticket()
+
+        # a slot is free, but it is kept for the request waiting for both
+        later, _ = self._start(third)
+        self.assertFalse(later.wait(POLL_INTERVAL * 4))
+
+        release_light.set()
+        self.assertTrue(heavy.wait(10))
+        self.assertFalse(later.is_set())
+
+        release_heavy.set()
+        self.assertTrue(later.wait(10))
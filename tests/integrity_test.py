@@ -0,0 +1,57 @@
+import json
+import multiprocessing
+import tempfile
+import unittest
+from pathlib import Path
+
+from autocana.data.integrity import MANIFEST_NAME, SHA256, Manifest, StreamHasher
+
+# workers are separate interpreters, as several 'autocana download' runs would be
+_CONTEXT = multiprocessing.get_context("spawn")
+
+
+def _record(directory: str, worker: int, files: int) -> None:
+    manifest = Manifest(Path(directory))
+    for i in range(files):
+        hasher = StreamHasher()
+        hasher.update(f"{worker}-{i}".encode())
+        manifest.record(
+            Path(directory) / f"video{worker}-{i}.mp4", f"https://example.com/{worker}/{i}", 3, hasher.digests
+        )
+
+
+class ManifestTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+
+    def test_record_and_get(self) -> None:
+        hasher = StreamHasher(fast=True)
+        hasher.update(b"video")
+        Manifest(self.dir).record(self.dir / "video.mp4", "https://example.com/video.mp4", 5, hasher.digests)
+
+        entry = Manifest(self.dir).get(self.dir / "video.mp4")
+        assert entry is not None
+        self.assertEqual((entry["url"], entry["size"]), ("https://example.com/video.mp4", 5))
+        self.assertEqual({entry[SHA256], entry["crc32"]}, set(hasher.digests.values()))
+        self.assertIsNone(Manifest(self.dir).get(self.dir / "other.mp4"))
+
+    def test_instances_keep_the_entries_of_each_other(self) -> None:
+        # both loaded before any entry is recorded, as two downloads started at once
+        first, second = Manifest(self.dir), Manifest(self.dir)
+        first.record(self.dir / "a.mp4", "https://example.com/a.mp4", 1, {SHA256: "a"})
+        second.record(self.dir / "b.mp4", "https://example.com/b.mp4", 1, {SHA256: "b"})
+
+        self.assertEqual(sorted(json.loads((self.dir / MANIFEST_NAME).read_text())), ["a.mp4", "b.mp4"])
+
+    def test_concurrent_workers(self) -> None:
+        workers = [_CONTEXT.Process(target=_record, args=(str(self.dir), worker, 25)) for worker in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual([worker.exitcode for worker in workers], [0] * 4)
+        entries = json.loads((self.dir / MANIFEST_NAME).read_text())
+        self.assertEqual(len(entries), 4 * 25)
+        # no temporary file left behind
+        self.assertEqual(sorted(p.name for p in self.dir.iterdir() if p.suffix == ".tmp"), [])
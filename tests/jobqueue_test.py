@@ -0,0 +1,133 @@
+import multiprocessing
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from autocana.data.jobqueue import DONE, FAILED, IN_PROGRESS, PENDING, DownloadQueue
+
+# workers are separate interpreters, as several 'autocana download' runs would be
+_CONTEXT = multiprocessing.get_context("spawn")
+
+_URLS = [f"https://example.com/video{i}.mp4" for i in range(5)]
+
+
+def _claim_all(output: str, path: str, claimed: "multiprocessing.Queue[str]") -> None:
+    with DownloadQueue(Path(output), Path(path)) as queue:
+        while (job := queue.claim()) is not None:
+            claimed.put(job.url)
+            queue.done(job, Path(output) / "file")
+
+
+def _claim_and_crash(output: str, path: str) -> None:
+    queue = DownloadQueue(Path(output), Path(path))
+    queue.claim()
+    os._exit(1)
+
+
+class DownloadQueueTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.output = tmp / "downloads"
+        self.path = tmp / "downloads.sqlite3"
+
+    def _queue(self) -> DownloadQueue:
+        return self.enterContext(DownloadQueue(self.output, self.path))
+
+    def test_tracks_the_state_of_each_url(self) -> None:
+        queue = self._queue()
+        self.assertEqual(queue.add(_URLS[:2], {_URLS[0]: "a" * 64}), 2)
+        self.assertEqual(queue.add(_URLS[:2]), 0)
+
+        first = queue.claim()
+        second = queue.claim()
+        assert first is not None and second is not None
+        self.assertEqual((first.url, first.checksum, first.attempts), (_URLS[0], "a" * 64, 1))
+        self.assertIsNone(queue.claim())
+        self.assertEqual(queue.counts()[IN_PROGRESS], 2)
+
+        queue.done(first, self.output / "video0.mp4")
+        queue.fail(second, "HTTP 404")
+        self.assertEqual(queue.counts(), {DONE: 1, FAILED: 1})
+        self.assertEqual(queue.failures(), [(_URLS[1], 1, "HTTP 404")])
+
+        self.assertEqual(queue.requeue_failed(), 1)
+        retried = queue.claim()
+        assert retried is not None
+        self.assertEqual((retried.url, retried.attempts), (_URLS[1], 2))
+
+    def test_resumes_where_it_left_off(self) -> None:
+        with DownloadQueue(self.output, self.path) as queue:
+            queue.add(_URLS)
+            for _ in range(2):
+                job = queue.claim()
+                assert job is not None
+                queue.done(job, self.output / "file")
+            queue.claim()  # interrupted before finishing
+
+        queue = self._queue()
+        queue.add(_URLS)
+        self.assertEqual(queue.counts(), {DONE: 2, PENDING: 3})
+        job = queue.claim()
+        assert job is not None
+        self.assertEqual(job.url, _URLS[2])
+
+    def test_requeues_done_jobs_with_missing_outputs(self) -> None:
+        queue = self._queue()
+        queue.add(_URLS[:2])
+        self.output.mkdir()
+        for job in (queue.claim(), queue.claim()):
+            assert job is not None
+            output = self.output / Path(job.url).name
+            output.write_bytes(b"video")
+            queue.done(job, output)
+
+        self.assertEqual(queue.requeue_missing(), 0)
+        (self.output / "video1.mp4").unlink()
+        self.assertEqual(queue.requeue_missing(), 1)
+
+        self.assertEqual(queue.counts(), {DONE: 1, PENDING: 1})
+        job = queue.claim()
+        assert job is not None
+        self.assertEqual((job.url, job.attempts), (_URLS[1], 2))
+
+    def test_queues_are_kept_per_output_folder(self) -> None:
+        self._queue().add(_URLS)
+        other = self.enterContext(DownloadQueue(self.output.with_name("other"), self.path))
+        self.assertIsNone(other.claim())
+
+    def test_recovers_the_jobs_of_crashed_workers(self) -> None:
+        queue = self._queue()
+        queue.add(_URLS[:1])
+        crashed = _CONTEXT.Process(target=_claim_and_crash, args=(str(self.output), str(self.path)))
+        crashed.start()
+        crashed.join()
+        self.assertEqual(queue.counts(), {IN_PROGRESS: 1})
+
+        self.assertEqual(queue.recover(), 1)
+        job = queue.claim()
+        assert job is not None
+        self.assertEqual(job.attempts, 2)
+
+    def test_does_not_recover_the_jobs_of_live_workers(self) -> None:
+        self._queue().add(_URLS[:1])
+        worker = self._queue()
+        self.assertIsNotNone(worker.claim())
+        self.assertEqual(self._queue().recover(), 0)
+
+    def test_workers_claim_each_job_once(self) -> None:
+        urls = [f"https://example.com/video{i}.mp4" for i in range(200)]
+        self._queue().add(urls)
+
+        claimed: multiprocessing.Queue[str] = _CONTEXT.Queue()
+        workers = [
+            _CONTEXT.Process(target=_claim_all, args=(str(self.output), str(self.path), claimed)) for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        results = [claimed.get(timeout=30) for _ in urls]
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(sorted(results), sorted(urls))
+        self.assertEqual(self._queue().counts(), {DONE: len(urls)})
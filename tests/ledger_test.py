@@ -0,0 +1,99 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from autocana.data.ledger import Ledger, LedgerEntry, parse_invoice_text
+
+_FIXTURES = Path(__file__).parent / "fixtures" / "invoices"
+
+
+def _entry(number: int, year: int, month: int, days: int = 20, rate: float = 500.0, profile: str = "") -> LedgerEntry:
+    return LedgerEntry(
+        number=number,
+        year=year,
+        month=month,
+        days=days,
+        rate=rate,
+        total=rate * days,
+        output_path=f"/invoices/{number}.pdf",
+        content_hash=f"{profile}{number}",
+        created_at="2026-01-01T00:00:00+00:00",
+        profile=profile,
+    )
+
+
+class LedgerTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.path = self.dir / "ledger.sqlite3"
+
+    def _ledger(self, *entries: LedgerEntry) -> Ledger:
+        ledger = self.enterContext(Ledger(self.path))
+        for entry in entries:
+            ledger.record(entry)
+        return ledger
+
+    def test_totals(self) -> None:
+        ledger = self._ledger(
+            _entry(1, 2025, 11, days=18),
+            _entry(2, 2026, 2, days=20),
+            _entry(3, 2026, 3, days=21, rate=550.0),
+            _entry(4, 2026, 4, days=19),
+        )
+
+        self.assertEqual(ledger.totals(), [(2025, 0, 1, 18, 9000.0), (2026, 0, 3, 60, 31050.0)])
+        self.assertEqual(ledger.totals(year=2026), [(2026, 0, 3, 60, 31050.0)])
+        self.assertEqual(
+            ledger.totals(year=2026, quarterly=True), [(2026, 1, 2, 41, 21550.0), (2026, 2, 1, 19, 9500.0)]
+        )
+        self.assertEqual(ledger.totals(year=2024), [])
+
+    def test_gaps_per_profile(self) -> None:
+        ledger = self._ledger(
+            *(_entry(n, 2026, 1) for n in (1000, 1001, 1004, 1006)),
+            *(_entry(n, 2026, 1, profile="alice") for n in (1, 2, 3)),
+            *(_entry(n, 2026, 1, profile="bob") for n in (7, 7, 9)),
+        )
+
+        self.assertEqual(ledger.gaps(), [("", 1002, 1003), ("", 1005, 1005), ("bob", 8, 8)])
+
+    def test_duplicates_per_profile(self) -> None:
+        ledger = self._ledger(
+            _entry(1, 2026, 1),
+            _entry(1, 2026, 2),
+            _entry(1, 2026, 1, profile="alice"),
+            *(_entry(5, 2026, 3, profile="bob") for _ in range(3)),
+        )
+
+        self.assertEqual(ledger.duplicates(), [("", 1, 2), ("bob", 5, 3)])
+
+    def test_contains(self) -> None:
+        ledger = self._ledger(_entry(1, 2026, 1))
+
+        self.assertTrue(ledger.contains("1"))
+        self.assertFalse(ledger.contains("2"))
+
+
+class ParseInvoiceTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pdf = Path(self.enterContext(tempfile.NamedTemporaryFile(suffix=".pdf")).name)
+
+    def _parse(self, fixture: str) -> LedgerEntry:
+        return parse_invoice_text(self.pdf, (_FIXTURES / fixture).read_text(encoding="utf-8"))
+
+    def test_parse_invoice(self) -> None:
+        entry = self._parse("september_invoice.txt")
+
+        self.assertEqual((entry.number, entry.year, entry.month), (1014, 2026, 9))
+        self.assertEqual((entry.days, entry.rate, entry.total), (21, 525.0, 11025.0))
+        self.assertEqual(entry.output_path, str(self.pdf.absolute()))
+
+    def test_parse_invoice_without_decimals(self) -> None:
+        entry = self._parse("february_invoice.txt")
+
+        self.assertEqual((entry.number, entry.year, entry.month), (1019, 2027, 2))
+        self.assertEqual((entry.days, entry.rate, entry.total), (4, 500.0, 2000.0))
+
+    def test_rejects_other_documents(self) -> None:
+        with self.assertRaises(ValueError):
+            self._parse("not_an_invoice.txt")
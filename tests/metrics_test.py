@@ -0,0 +1,78 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from autocana.reporters.metrics import MetricsCollector
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.metrics = MetricsCollector()
+
+    def test_disabled_by_default(self) -> None:
+        self.metrics.inc("autocana_retries_total")
+        with self.metrics.stage("render"):
+            pass
+
+        self.assertEqual(self.metrics.run_command("invoice", lambda: 0), 0)
+        self.assertEqual(self.metrics.to_prometheus(), "\n")
+        self.assertEqual(list(self.dir.iterdir()), [])
+
+    def test_write_run_metrics(self) -> None:
+        self.metrics.configure(self.dir)
+
+        def run() -> int:
+            self.metrics.inc("autocana_documents_generated_total", kind="invoice")
+            self.metrics.inc("autocana_downloaded_bytes_total", 1024)
+            self.metrics.inc("autocana_downloaded_bytes_total", 1024)
+            for hit in (True, False, True, True):
+                self.metrics.cache("build", hit)
+            with self.metrics.stage("convert"):
+                pass
+            return 0
+
+        self.assertEqual(self.metrics.run_command("close-month", run), 0)
+
+        prom = (self.dir / "autocana_close_month.prom").read_text()
+        self.assertIn("# TYPE autocana_documents_generated_total counter", prom)
+        self.assertIn('autocana_documents_generated_total{command="close-month",kind="invoice"} 1', prom)
+        self.assertIn('autocana_downloaded_bytes_total{command="close-month"} 2048', prom)
+        self.assertIn('autocana_cache_requests_total{cache="build",command="close-month",result="hit"} 3', prom)
+        self.assertIn('autocana_run_success{command="close-month"} 1', prom)
+        self.assertIn('autocana_stage_duration_seconds{command="close-month",stage="convert"}', prom)
+        self.assertEqual(prom.count("# HELP autocana_cache_requests_total"), 1)
+
+        summary = json.loads((self.dir / "autocana_close_month.json").read_text())
+        self.assertEqual(summary["command"], "close-month")
+        self.assertEqual(summary["cache_hit_rate"], {"build": 0.75})
+        self.assertEqual(summary["metrics"]["documents_generated_total"], [{"kind": "invoice", "value": 1.0}])
+        # no temporary files left behind
+        self.assertEqual(
+            sorted(p.name for p in self.dir.iterdir()), ["autocana_close_month.json", "autocana_close_month.prom"]
+        )
+
+    def test_failed_runs_are_written(self) -> None:
+        self.metrics.configure(self.dir)
+
+        def run() -> int:
+            raise ValueError("broken config")
+
+        with self.assertRaises(ValueError):
+            self.metrics.run_command("tsh", run)
+
+        prom = (self.dir / "autocana_tsh.prom").read_text()
+        self.assertIn('autocana_run_success{command="tsh"} 0', prom)
+        self.assertIn('autocana_run_exit_code{command="tsh"} 1', prom)
+
+    def test_unknown_metric(self) -> None:
+        self.metrics.configure(self.dir)
+        with self.assertRaises(ValueError):
+            self.metrics.inc("autocana_typo_total")
+
+    def test_escapes_labels(self) -> None:
+        self.metrics.configure(self.dir)
+        self.metrics.inc("autocana_documents_generated_total", kind='a "quoted"\nvalue')
+
+        self.assertIn('kind="a \\"quoted\\"\\nvalue"', self.metrics.to_prometheus())
@@ -0,0 +1,105 @@
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from autocana.data.pipeline import Pipeline, PostProcess
+from autocana.data.vedit import VEditAction
+
+
+class PostProcessTestCase(unittest.TestCase):
+    def test_parse_actions(self) -> None:
+        with tempfile.NamedTemporaryFile(suffix=".srt") as subs:
+            post_process = PostProcess.parse(["extract", f"append_subs={subs.name}"])
+
+        self.assertEqual(post_process.actions, [VEditAction("extract"), VEditAction("append_subs", subs.name)])
+        self.assertIsNone(post_process.quality)
+
+    def test_parse_reencode(self) -> None:
+        self.assertEqual(PostProcess.parse(["reencode=720p"]), PostProcess(actions=[], quality="720p"))
+        with self.assertRaises(ValueError):
+            PostProcess.parse(["reencode=8K"])
+        with self.assertRaises(ValueError):
+            PostProcess.parse(["reencode=720p", "extract"])
+
+    def test_missing_mux_inputs_fail_when_parsing(self) -> None:
+        missing = Path(tempfile.gettempdir()) / "autocana-missing.srt"
+        with self.assertRaisesRegex(ValueError, "is not a valid file"):
+            PostProcess.parse(["extract", f"append_subs={missing}"])
+
+
+class PipelineTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.gate = threading.Event()
+        self.started: list[Path] = []
+        self._lock = threading.Lock()
+
+    def _process(self, file: Path) -> Path:
+        """
+        Stub action, waits for 'gate' before finishing and fails for the files named 'broken'.
+        """
+        with self._lock:
+            self.started.append(file)
+        self.assertTrue(self.gate.wait(10))
+        if file.stem == "broken":
+            raise ValueError("unsupported codec")
+        return file.with_suffix(".mp3")
+
+    def _wait_started(self, count: int) -> None:
+        for _ in range(200):
+            with self._lock:
+                if len(self.started) >= count:
+                    return
+            time.sleep(0.01)
+        self.fail(f"{count} files never started processing")
+
+    def test_processes_while_the_producer_keeps_working(self) -> None:
+        with Pipeline(self._process, workers=2) as pipeline:
+            pipeline.submit(Path("a.mp4"))
+            pipeline.submit(Path("b.mp4"))
+
+            # both are being processed at once and the producer was not held back
+            self._wait_started(2)
+            self.assertEqual(pipeline.processed, [])
+            self.gate.set()
+
+        self.assertEqual(sorted(pipeline.processed), [Path("a.mp3"), Path("b.mp3")])
+
+    def test_submit_blocks_once_the_queue_is_full(self) -> None:
+        with Pipeline(self._process, workers=1, queue_size=1) as pipeline:
+            pipeline.submit(Path("a.mp4"))
+            self._wait_started(1)
+            pipeline.submit(Path("b.mp4"))  # waits in the queue
+
+            submitted = threading.Event()
+            producer = threading.Thread(target=lambda: (pipeline.submit(Path("c.mp4")), submitted.set()), daemon=True)
+            producer.start()
+            self.assertFalse(submitted.wait(0.5))
+
+            self.gate.set()
+            self.assertTrue(submitted.wait(10))
+            producer.join()
+
+        self.assertEqual(len(pipeline.processed), 3)
+
+    def test_collects_failures(self) -> None:
+        self.gate.set()
+        with Pipeline(self._process, workers=2) as pipeline:
+            for name in ("a.mp4", "broken.mp4", "b.mp4"):
+                pipeline.submit(Path(name))
+
+        self.assertEqual(sorted(pipeline.processed), [Path("a.mp3"), Path("b.mp3")])
+        [(file, error)] = pipeline.failed
+        self.assertEqual((file, str(error)), (Path("broken.mp4"), "unsupported codec"))
+
+    def test_exit_drains_the_queue(self) -> None:
+        files = [Path(f"video{i}.mp4") for i in range(10)]
+        with Pipeline(self._process, workers=2, queue_size=len(files)) as pipeline:
+            for file in files:
+                pipeline.submit(file)
+            self.gate.set()
+
+        # every submitted file is processed before leaving the context
+        self.assertEqual(sorted(self.started), sorted(files))
+        self.assertEqual(len(pipeline.processed), len(files))
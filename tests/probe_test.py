@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any
+
+from autocana.data.probe import MediaInfo, ProbeCache
+
+
+class ProbeCacheTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.probed: list[Path] = []
+        self.cache = ProbeCache(self.dir / "probes.sqlite3", probe=self._probe)
+
+    def _probe(self, path: Path) -> dict[str, Any]:
+        self.probed.append(path)
+        if path.suffix == ".txt":
+            raise ValueError("not a media file")
+        return {
+            "format": {"duration": str(path.stat().st_size)},
+            "streams": [
+                {"index": 0, "codec_type": "video", "codec_name": "h264", "avg_frame_rate": "30000/1001", "level": 40},
+                {"index": 1, "codec_type": "audio", "codec_name": "aac", "channels": 2},
+            ],
+        }
+
+    def _video(self, name: str, size: int) -> Path:
+        path = self.dir / name
+        path.write_bytes(b"\0" * size)
+        return path
+
+    def test_media_info(self) -> None:
+        info = self.cache.get(self._video("video.mkv", 10))
+
+        self.assertEqual(info.duration, 10.0)
+        self.assertEqual(info.codecs, ["h264", "aac"])
+        self.assertAlmostEqual(info.frame_rate or 0, 29.97, places=2)
+        self.assertNotIn("level", info.streams[0])
+        self.assertIsNone(MediaInfo(duration=None).frame_rate)
+
+    def test_reuses_probes_of_unchanged_files(self) -> None:
+        video = self._video("video.mkv", 10)
+        first = self.cache.get(video)
+
+        # a new cache instance reads the same database, as a later run would
+        again = ProbeCache(self.cache.path, probe=self._probe).get(video)
+        self.assertEqual(again, first)
+        self.assertEqual(len(self.probed), 1)
+
+    def test_invalidates_changed_files(self) -> None:
+        video = self._video("video.mkv", 10)
+        self.cache.get(video)
+
+        self._video("video.mkv", 20)
+        self.assertEqual(self.cache.get(video).duration, 20.0)
+
+        # same size, newer modification time
+        os.utime(video, ns=(0, video.stat().st_mtime_ns + 1_000_000_000))
+        self.cache.get(video)
+
+        # replaced by another file, same name and size
+        replacement = self._video("other.mkv", 20)
+        os.utime(replacement, ns=(0, video.stat().st_mtime_ns))
+        os.replace(replacement, video)
+        self.cache.get(video)
+
+        self.assertEqual(len(self.probed), 4)
+
+    def test_warm(self) -> None:
+        videos = [self._video(f"{i}.mkv", i + 1) for i in range(20)]
+        broken = self._video("notes.txt", 1)
+        self.cache.get(videos[0])
+
+        infos, failed = self.cache.warm([*videos, broken], workers=4)
+
+        self.assertEqual(set(infos), set(videos))
+        self.assertEqual(failed, [broken])
+        self.assertEqual(len(self.probed), len(videos) + 1)
+
+    def test_prune(self) -> None:
+        videos = [self._video(f"{i}.mkv", 1) for i in range(3)]
+        self.cache.warm(videos)
+        videos[0].unlink()
+
+        self.assertEqual(self.cache.prune(), 1)
+        self.assertEqual(self.cache.prune(), 0)
@@ -0,0 +1,171 @@
+import argparse
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+import yaml
+
+from autocana import cli
+from autocana.data.config import LIBREOFFICE_PROFILE_ENV, increment_last_invoice, load_user_config, save_user_config
+from autocana.data.invoice import InvoiceConfig
+from autocana.data.profiles import BatchConfig, Profile, ProfileResult, load_profile, run_batch
+
+
+def _config(name: str, last_invoice: int) -> dict[str, Any]:
+    return {
+        "private": {
+            "address": "Rúa do Vilar 1, Santiago",
+            "bank_account": "ES9121000418450200051332",
+            "email": f"{name}@example.com",
+            "full_name": name.title(),
+            "phone_number": "600000000",
+            "vat": "12345678Z",
+        },
+        "invoicing": {
+            "activity_id": "A1",
+            "contract_number": "2024-0042",
+            "customer_contract": 4711,
+            "extension_number": 3,
+            "last_invoice": last_invoice,
+        },
+    }
+
+
+def _args(profiles: Path, **kwargs: Any) -> argparse.Namespace:
+    defaults = {
+        "command": "invoice",
+        "profiles": str(profiles),
+        "jobs": None,
+        "output": None,
+        "output_dir": None,
+        "month": 9,
+        "rate": None,
+        "days": 20,
+        "force": False,
+    }
+    return argparse.Namespace(**{**defaults, **kwargs})
+
+
+def _generate(config: InvoiceConfig) -> bool:
+    """
+    Stand-in for the generation run in the batch workers (picklable, so the pool can run it), writing the LibreOffice
+    profile of the worker as the output. Alice's documents are reused from the cache.
+    """
+    output = Path(config.output_path)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(os.environ[LIBREOFFICE_PROFILE_ENV])
+    return config.profile != "alice"
+
+
+def _generate_failing(config: InvoiceConfig) -> bool:
+    if config.profile == "bob":
+        raise ValueError("template not found")
+    return _generate(config)
+
+
+class ProfilesTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.profiles = self.dir / "team"
+        self.profiles.mkdir()
+        for name, last_invoice in (("alice", 100), ("bob", 2000)):
+            save_user_config(_config(name, last_invoice), path=self.profiles / f"{name}.yaml")
+
+    def test_discover(self) -> None:
+        (self.profiles / "carol.yml").write_text(yaml.safe_dump(_config("carol", 1)))
+        (self.profiles / "bob.jpg").write_bytes(b"signature")
+        (self.profiles / "notes.txt").write_text("not a profile")
+
+        profiles = Profile.discover(self.profiles)
+
+        self.assertEqual([p.name for p in profiles], ["alice", "bob", "carol"])
+        self.assertEqual(profiles[1].config_path, self.profiles / "bob.yaml")
+        self.assertEqual(profiles[1].signature_path, self.profiles / "bob.jpg")
+        # profiles without a signature point to the default one, which is skipped when signing
+        self.assertEqual(profiles[0].signature_path, self.profiles / "alice.png")
+
+    def test_batch_config(self) -> None:
+        config = BatchConfig.from_args(_args(self.profiles, jobs=8, output_dir=str(self.dir / "out")))
+
+        self.assertEqual([p.name for p in config.profiles], ["alice", "bob"])
+        self.assertEqual((config.jobs, config.output_dir), (8, self.dir / "out"))
+        self.assertLessEqual(BatchConfig.from_args(_args(self.profiles)).jobs, 2)
+
+    def test_batch_config_errors(self) -> None:
+        with self.assertRaises(ValueError):
+            BatchConfig.from_args(_args(self.dir / "missing"))
+        with self.assertRaises(ValueError):
+            BatchConfig.from_args(_args(self.profiles, output="invoice.pdf"))
+        with self.assertRaises(ValueError):
+            BatchConfig.from_args(_args(self.profiles, jobs=0))
+        with self.assertRaises(ValueError):
+            BatchConfig.from_args(_args(self.dir))  # no profile configs
+
+    def test_load_profile(self) -> None:
+        [alice, _] = Profile.discover(self.profiles)
+        config = load_profile("invoice", alice, _args(self.profiles), self.dir / "out" / "alice")
+
+        assert isinstance(config, InvoiceConfig)
+        self.assertEqual((config.profile, config.config_path, config.last_invoice), ("alice", alice.config_path, 100))
+        self.assertEqual(config.private.email, "alice@example.com")
+        self.assertEqual(Path(config.output_path).parent, self.dir / "out" / "alice")
+
+    def test_counters_are_kept_per_profile(self) -> None:
+        alice, bob = self.profiles / "alice.yaml", self.profiles / "bob.yaml"
+        increment_last_invoice(last_invoice=100, path=alice)
+        increment_last_invoice(last_invoice=101, path=alice)
+        increment_last_invoice(last_invoice=2000, path=bob)
+
+        self.assertEqual(load_user_config(alice)["invoicing"]["last_invoice"], 102)
+        self.assertEqual(load_user_config(bob)["invoicing"]["last_invoice"], 2001)
+        self.assertEqual(load_user_config(bob)["private"]["email"], "bob@example.com")
+
+    def test_save_user_config_backup(self) -> None:
+        alice = self.profiles / "alice.yaml"
+        save_user_config(_config("alice", 500), with_backup=True, path=alice)
+
+        self.assertEqual(yaml.safe_load(alice.with_suffix(".bak").read_text())["invoicing"]["last_invoice"], 100)
+        self.assertEqual(load_user_config(alice)["invoicing"]["last_invoice"], 500)
+
+    def test_load_user_config_requires_private_fields(self) -> None:
+        config = _config("alice", 1)
+        del config["private"]["vat"]
+        save_user_config(config, path=self.profiles / "alice.yaml")
+
+        with self.assertRaisesRegex(ValueError, "vat"):
+            load_user_config(self.profiles / "alice.yaml")
+
+    def test_run_batch(self) -> None:
+        config = BatchConfig.from_args(_args(self.profiles, jobs=2, output_dir=str(self.dir / "out")))
+
+        results = run_batch(config, _generate)
+
+        alice, bob = self.dir / "out" / "alice", self.dir / "out" / "bob"
+        self.assertEqual(
+            results,
+            [
+                ProfileResult(profile="alice", output=str(alice / "september_invoice.pdf"), generated=False),
+                ProfileResult(profile="bob", output=str(bob / "september_invoice.pdf"), generated=True),
+            ],
+        )
+        # every worker converts with a LibreOffice profile of its own, inside a folder removed after the batch
+        profiles = {Path((d / "september_invoice.pdf").read_text()) for d in (alice, bob)}
+        for profile in profiles:
+            self.assertRegex(profile.name, r"^libreoffice-\d+$")
+            self.assertFalse(profile.parent.exists())
+
+    def test_batch_reports_failed_profiles(self) -> None:
+        config = BatchConfig.from_args(_args(self.profiles, jobs=2, output_dir=str(self.dir / "out")))
+
+        with (
+            mock.patch.object(cli, "ensure_libreoffice_is_installed"),
+            mock.patch.object(cli, "_generate_invoice", _generate_failing),
+            self.assertLogs("autocana", "ERROR") as logs,
+        ):
+            self.assertEqual(cli.cmd_batch(config), 1)
+
+        self.assertIn("ERROR:autocana:\t- bob: template not found", logs.output)
+        self.assertTrue((self.dir / "out" / "alice" / "september_invoice.pdf").is_file())
@@ -0,0 +1,53 @@
+import unittest
+from contextlib import AbstractContextManager
+from typing import Any
+from unittest import mock
+
+from autocana.reporters import progress as progress_module
+from autocana.reporters.progress import BYTES, PERCENT, SECONDS, Progress
+
+_MB = 1024**2
+
+
+class ProgressTestCase(unittest.TestCase):
+    def _at(self, now: float) -> AbstractContextManager[Any]:
+        return mock.patch.object(progress_module.time, "monotonic", return_value=now)
+
+    def test_media_progress(self) -> None:
+        progress = Progress("lecture.mkv", unit=SECONDS, total=90.0, done=30.0, fps=75.0, started=100.0)
+
+        with self._at(110.0):
+            self.assertEqual(progress.rate, 3.0)
+            self.assertEqual(progress.eta, 20.0)
+            self.assertEqual(progress.format(), "lecture.mkv  33.3% 00:00:30 3.0x 75.0 fps ETA 00:00:20")
+            self.assertEqual(progress.summary(), "lecture.mkv finished in 00:00:10 (00:00:30 of media, 3.0x)")
+
+    def test_download_progress(self) -> None:
+        progress = Progress("video.mp4", unit=BYTES, total=10 * _MB, done=3 * _MB, started=100.0)
+
+        with self._at(102.0):
+            self.assertEqual(progress.format(), "video.mp4  30.0% 3.0 MiB/10.0 MiB 1.5 MiB/s ETA 00:00:04")
+
+        # downloads without a known size have no fraction nor ETA
+        progress.total = None
+        with self._at(102.0):
+            self.assertIsNone(progress.eta)
+            self.assertEqual(progress.format(), "video.mp4 3.0 MiB 1.5 MiB/s")
+
+    def test_long_eta(self) -> None:
+        progress = Progress("movie.mkv", unit=PERCENT, total=100.0, done=1.0, started=100.0)
+
+        with self._at(137.25):
+            self.assertEqual(progress.format(), "movie.mkv   1.0% ETA 01:01:27")
+
+    def test_eta_without_progress(self) -> None:
+        progress = Progress("movie.mkv", unit=PERCENT, total=100.0, started=100.0)
+
+        with self._at(100.0):
+            self.assertIsNone(progress.eta)
+            self.assertEqual(progress.format(), "movie.mkv   0.0%")
+
+        # tools overshooting their total are done, not early
+        progress.done = 101.0
+        with self._at(110.0):
+            self.assertEqual((progress.fraction, progress.eta), (1.0, 0.0))
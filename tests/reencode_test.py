@@ -0,0 +1,116 @@
+import multiprocessing
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from autocana.data import reencode
+from autocana.data.reencode import QUALITIES, ReencodeIndex, fingerprint, plan_workers
+
+_GB = 1024**3
+
+# workers are separate interpreters, as several 'autocana reencode' runs would be
+_CONTEXT = multiprocessing.get_context("spawn")
+
+
+def _add_entries(path: str, worker: int, entries: int) -> None:
+    index = ReencodeIndex(Path(path))
+    for i in range(entries):
+        index.add(f"{worker}-{i}", "1080p", Path(f"video{worker}-{i}.mkv"), Path(f"video{worker}-{i}_1080p.mkv"))
+
+
+class ReencodeTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+
+    def _plan(self, cpus: int, memory: int, quality: str = "1080p", jobs: int | None = None) -> tuple[int, int]:
+        with (
+            mock.patch.object(reencode.os, "cpu_count", return_value=cpus),
+            mock.patch.object(reencode, "_available_memory", return_value=memory),
+        ):
+            return plan_workers(QUALITIES[quality], jobs)
+
+    def test_plan_workers(self) -> None:
+        # bounded by the cores, leaving 4 threads per encode
+        self.assertEqual(self._plan(cpus=16, memory=64 * _GB), (4, 4))
+        # bounded by the memory, every 1080p encode takes 2GB
+        self.assertEqual(self._plan(cpus=16, memory=5 * _GB), (2, 8))
+        # always at least one encode
+        self.assertEqual(self._plan(cpus=2, memory=1 * _GB, quality="AV1"), (1, 2))
+        # explicit jobs win
+        self.assertEqual(self._plan(cpus=16, memory=1 * _GB, jobs=8), (8, 2))
+        self.assertEqual(self._plan(cpus=4, memory=64 * _GB, jobs=8), (8, 1))
+
+    def test_fingerprint_samples_both_ends(self) -> None:
+        size, sample = 10_000, 1_000
+        data = bytearray(size)
+        video = self.dir / "video.mkv"
+        video.write_bytes(data)
+        original = fingerprint(video, sample)
+
+        # renamed files keep their fingerprint
+        self.assertEqual(fingerprint(video.rename(self.dir / "renamed.mkv"), sample), original)
+        video = self.dir / "renamed.mkv"
+
+        # the middle of the file is not sampled
+        data[size // 2] = 1
+        video.write_bytes(data)
+        self.assertEqual(fingerprint(video, sample), original)
+
+        data[-1] = 1
+        video.write_bytes(data)
+        self.assertNotEqual(fingerprint(video, sample), original)
+        video.write_bytes(bytes(size + 1))
+        self.assertNotEqual(fingerprint(video, sample), original)
+
+    def test_index_round_trip(self) -> None:
+        path = self.dir / "index.json"
+        output = self.dir / "video_1080p.mkv"
+        output.write_bytes(b"encoded")
+        ReencodeIndex(path).add("abc", "1080p", self.dir / "video.mkv", output)
+
+        # a new instance reads the saved index, as a later run would
+        index = ReencodeIndex(path)
+        self.assertEqual(index.output_for("abc", "1080p"), output)
+        self.assertEqual(index.outputs(), {output.absolute()})
+        self.assertIsNone(index.output_for("abc", "720p"))
+        self.assertIsNone(index.output_for("def", "1080p"))
+
+    def test_index_ignores_removed_outputs(self) -> None:
+        index = ReencodeIndex(self.dir / "index.json")
+        output = self.dir / "video_1080p.mkv"
+        output.write_bytes(b"encoded")
+        index.add("abc", "1080p", self.dir / "video.mkv", output)
+
+        output.unlink()
+        self.assertIsNone(index.output_for("abc", "1080p"))
+
+    def test_index_instances_keep_the_entries_of_each_other(self) -> None:
+        path = self.dir / "index.json"
+        # both loaded before any entry is added, as two runs started at once
+        first, second = ReencodeIndex(path), ReencodeIndex(path)
+        first.add("abc", "1080p", self.dir / "a.mkv", self.dir / "a_1080p.mkv")
+        second.add("def", "1080p", self.dir / "b.mkv", self.dir / "b_1080p.mkv")
+
+        self.assertEqual(len(ReencodeIndex(path).outputs()), 2)
+
+    def test_concurrent_runs(self) -> None:
+        path = self.dir / "index.json"
+        workers = [_CONTEXT.Process(target=_add_entries, args=(str(path), worker, 25)) for worker in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual([worker.exitcode for worker in workers], [0] * 4)
+        self.assertEqual(len(ReencodeIndex(path).outputs()), 4 * 25)
+        self.assertEqual([p.name for p in self.dir.iterdir() if p.suffix == ".tmp"], [])
+
+    def test_corrupt_index_is_ignored(self) -> None:
+        path = self.dir / "index.json"
+        path.write_text('{"abc:1080p": {"source": ')
+
+        index = ReencodeIndex(path)
+        self.assertEqual(index.outputs(), set())
+        index.add("abc", "1080p", self.dir / "video.mkv", self.dir / "video_1080p.mkv")
+        self.assertEqual(ReencodeIndex(path).outputs(), {(self.dir / "video_1080p.mkv").absolute()})
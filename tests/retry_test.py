@@ -0,0 +1,37 @@
+import email.utils
+import time
+import unittest
+
+import requests
+
+from autocana.data.retry import retry_after
+
+
+def _error(retry_after: str | None) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = 503
+    if retry_after is not None:
+        response.headers["Retry-After"] = retry_after
+    return requests.HTTPError(response=response)
+
+
+class RetryAfterTestCase(unittest.TestCase):
+    def test_seconds(self) -> None:
+        self.assertEqual(retry_after(_error("120")), 120.0)
+        self.assertIsNone(retry_after(_error(None)))
+        self.assertIsNone(retry_after(_error("soon")))
+        self.assertIsNone(retry_after(requests.ConnectionError()))
+
+    def test_http_dates(self) -> None:
+        later = time.time() + 60
+        for value in (
+            email.utils.formatdate(later, usegmt=True),  # GMT
+            email.utils.formatdate(later),  # '-0000', parsed as a naive datetime
+            email.utils.formatdate(later, localtime=True),
+        ):
+            delay = retry_after(_error(value))
+            assert delay is not None, value
+            self.assertAlmostEqual(delay, 60, delta=2, msg=value)
+
+        # dates in the past do not wait
+        self.assertEqual(retry_after(_error(email.utils.formatdate(time.time() - 60))), 0.0)
@@ -0,0 +1,122 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from autocana.data.period import Period
+from autocana.data.timetracking import ExportIndex, load_work_log
+
+_CSV = """\
+Project,Description,Start date,Duration
+Cronos,"Review, part 1",2025-02-27,04:00:00
+Cronos,Meetings,2025-03-03,02:30:00
+Cronos,"Multi
+line",2025-03-03,05:30:00
+Support,On call,2025-03-08,01:00:00
+Cronos,Development,2025-04-01,08:00:00
+Cronos,Late entry,2025-03-31,03:15:00
+"""
+
+_ICS = """\
+BEGIN:VCALENDAR\r
+VERSION:2.0\r
+BEGIN:VEVENT\r
+DTSTART;TZID=Europe/Madrid:20250303T090000\r
+DTEND;TZID=Europe/Madrid:20250303T133000\r
+SUMMARY:Cronos\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+DTSTART:20250304T080000Z\r
+DURATION:PT7H45M\r
+CATEGORIES:Support,On call\r
+SUMMARY:A very long summary that is folded by the exporter into \r
+ two lines\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+DTSTART;VALUE=DATE:20250305\r
+SUMMARY:Holiday\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+DTSTART:20250401T090000\r
+DTEND:20250401T170000\r
+SUMMARY:Cronos\r
+END:VEVENT\r
+END:VCALENDAR\r
+"""
+
+
+class TimeTrackingTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.cache = self.dir / "cache"
+
+    def _export(self, name: str, content: str) -> Path:
+        path = self.dir / name
+        path.write_bytes(content.encode())
+        return path
+
+    def test_csv_export(self) -> None:
+        log = load_work_log(self._export("export.csv", _CSV), Period.of(3, 2025), self.cache)
+
+        self.assertEqual(log.days, [3, 8, 31])
+        self.assertEqual(log.hours(3), 8.0)
+        self.assertEqual(log.total_hours, 12.25)
+        self.assertEqual(log.billed_days, 3)
+        self.assertEqual(log.activities(), {"Cronos": 11.25, "Support": 1.0})
+
+    def test_semicolon_csv_with_decimal_comma(self) -> None:
+        export = self._export("export.csv", "\ufefffecha;horas;actividad\n03/03/2025;7,5;Cronos\n04/03/2025;8;Cronos\n")
+        log = load_work_log(export, Period.of(3, 2025), self.cache)
+
+        self.assertEqual(log.days, [3, 4])
+        self.assertEqual(log.total_hours, 15.5)
+
+    def test_ical_export(self) -> None:
+        log = load_work_log(self._export("calendar.ics", _ICS), Period.of(3, 2025), self.cache)
+
+        self.assertEqual(log.days, [3, 4])
+        self.assertEqual(log.hours(3), 4.5)
+        self.assertEqual(log.activities(), {"Cronos": 4.5, "Support": 7.75})
+
+    def test_utc_times_are_bucketed_by_local_day(self) -> None:
+        self.enterContext(mock.patch.dict(os.environ, {"TZ": "Europe/Madrid"}))
+        time.tzset()
+        self.addCleanup(time.tzset)
+        late = _ICS.replace("DTSTART:20250304T080000Z", "DTSTART:20250305T233000Z")
+
+        log = load_work_log(self._export("calendar.ics", late), Period.of(3, 2025), self.cache)
+
+        # 23:30 UTC is already past midnight in Madrid
+        self.assertEqual(log.days, [3, 6])
+        self.assertEqual(log.hours(6), 7.75)
+
+    def test_indexed_reads(self) -> None:
+        for name, content in (("export.csv", _CSV), ("calendar.ics", _ICS)):
+            export = self._export(name, content)
+            full_reads = {m: load_work_log(export, Period.of(m, 2025), self.cache / str(m)) for m in (2, 3, 4)}
+
+            load_work_log(export, Period.of(1, 2025), self.cache)
+            index = ExportIndex(export, self.cache)
+            assert index.months is not None
+            for month, log in full_reads.items():
+                self.assertEqual(load_work_log(export, Period.of(month, 2025), self.cache), log)
+                self.assertEqual(f"2025-{month:02d}" in index.months, bool(log.days))
+
+    def test_index_is_rebuilt_when_the_export_changes(self) -> None:
+        export = self._export("export.csv", _CSV)
+        load_work_log(export, Period.of(3, 2025), self.cache)
+
+        export.write_text(_CSV + "Cronos,Extra,2025-03-10,02:00:00\n", encoding="utf-8")
+        log = load_work_log(export, Period.of(3, 2025), self.cache)
+
+        self.assertEqual(log.days, [3, 8, 10, 31])
+
+    def test_invalid_exports(self) -> None:
+        with self.assertRaises(ValueError):
+            load_work_log(self._export("export.csv", "who,what\nme,this\n"), Period.of(3, 2025), self.cache)
+        with self.assertRaises(ValueError):
+            load_work_log(self._export("bad.csv", "date,hours\nyesterday,8\n"), Period.of(3, 2025), self.cache)
+        with self.assertRaises(ValueError):
+            load_work_log(self._export("export.xlsx", ""), Period.of(3, 2025), self.cache)
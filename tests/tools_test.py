@@ -0,0 +1,61 @@
+import io
+import unittest
+from collections import deque
+from pathlib import Path
+
+from autocana.data.tools import FFmpegParser, HandBrakeParser, OutputParser, _read
+from autocana.reporters.progress import PERCENT, SECONDS, Progress
+
+_FIXTURES = Path(__file__).parent / "fixtures" / "tools"
+
+
+def _lines(fixture: str) -> list[str]:
+    return (_FIXTURES / fixture).read_text().splitlines()
+
+
+class OutputParserTestCase(unittest.TestCase):
+    def test_parsers_implement_feed(self) -> None:
+        with self.assertRaises(TypeError):
+            OutputParser()  # type: ignore[abstract]
+
+    def test_ffmpeg_duration(self) -> None:
+        parser, progress = FFmpegParser(), Progress("lecture.mkv", unit=SECONDS)
+
+        updates = [parser.feed(line, progress) for line in _lines("ffmpeg_stderr.txt")]
+
+        # the duration of the first input, later inputs are ignored
+        self.assertEqual(progress.total, 90.52)
+        self.assertEqual(progress.done, 0.0)
+        self.assertFalse(any(updates))
+
+    def test_ffmpeg_progress_blocks(self) -> None:
+        parser, progress = FFmpegParser(), Progress("lecture.mkv", unit=SECONDS, total=90.52)
+
+        # a single update per block, once it is complete
+        updates = [
+            (progress.done, progress.fps) for line in _lines("ffmpeg_progress.txt") if parser.feed(line, progress)
+        ]
+
+        self.assertEqual(updates, [(0.0, 0.0), (45.272, 75.35), (90.52, 75.41)])
+        self.assertEqual(progress.fraction, 1.0)
+
+    def test_handbrake_status_lines(self) -> None:
+        parser, progress = HandBrakeParser(), Progress("lecture.mkv", unit=PERCENT)
+
+        updates = [(progress.done, progress.fps) for line in _lines("handbrake.txt") if parser.feed(line, progress)]
+
+        # the first status lines do not report the speed yet
+        self.assertEqual(updates, [(0.0, None), (0.52, None), (45.23, 87.12), (99.87, 91.4)])
+        self.assertEqual(progress.total, 100.0)
+
+    def test_read_splits_rewritten_status_lines(self) -> None:
+        parser, progress = HandBrakeParser(), Progress("lecture.mkv", unit=PERCENT)
+        tail: deque[str] = deque(maxlen=3)
+        lines = _lines("handbrake.txt")
+
+        # HandBrake rewrites its status line with '\r', the other lines end with '\n'
+        output = "\n".join(lines[:2]) + "\n" + "\r".join(lines[2:6]) + "\n" + "\n".join(lines[6:])
+        _read(io.BytesIO(output.encode()), tail, parser, progress)
+
+        self.assertEqual((progress.done, progress.fps), (99.87, 91.4))
+        self.assertEqual(list(tail), lines[-3:])
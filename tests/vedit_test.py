@@ -0,0 +1,79 @@
+import unittest
+from pathlib import Path
+from typing import Any
+
+from autocana.data.vedit import VEditAction, VEditConfig, build_stage_command, plan_stages
+
+_STREAMS = {
+    "video.mkv": ["video", "audio", "audio", "subtitle"],
+    "other.mkv": ["video", "audio"],
+    "subs.srt": ["subtitle"],
+}
+
+
+def _probe(path: Path) -> list[dict[str, Any]]:
+    return [{"codec_type": k, "avg_frame_rate": "25/1"} for k in _STREAMS[path.name]]
+
+
+def _actions(*raw: str) -> list[VEditAction]:
+    return [VEditAction.parse(r) for r in raw]
+
+
+class VEditTestCase(unittest.TestCase):
+    def test_parse_action(self) -> None:
+        self.assertEqual(VEditAction.parse("hasten=4.8"), VEditAction("hasten", "4.8"))
+        self.assertEqual(VEditAction.parse("extract"), VEditAction("extract", None))
+        with self.assertRaises(ValueError):
+            VEditAction.parse("unknown")
+        with self.assertRaises(ValueError):
+            VEditAction.parse("append")
+
+    def test_plan_fuses_typical_chain(self) -> None:
+        stages = plan_stages(_actions("extract", "atempo", "hasten=4.8", "append=other.mkv"))
+        self.assertEqual(len(stages), 1)
+
+    def test_plan_breaks_when_required(self) -> None:
+        self.assertEqual(len(plan_stages(_actions("extract", "extract=1"))), 2)
+        self.assertEqual(len(plan_stages(_actions("append=other.mkv", "hasten=1"))), 2)
+        self.assertEqual(len(plan_stages(_actions("atempo", "append_subs=subs.srt"))), 2)
+
+    def test_output_suffix_follows_the_last_stage(self) -> None:
+        def suffix(*raw: str) -> str:
+            config = VEditConfig(Path("video.mkv"), _actions(*raw), output_name=None, output_dir=Path("out"))
+            return config.output_path.suffix
+
+        self.assertEqual(suffix("atempo"), ".mkv")
+        self.assertEqual(suffix("extract", "atempo"), ".mka")
+        self.assertEqual(suffix("extract", "append_subs=subs.srt"), ".mka")
+        self.assertEqual(suffix("extract", "atempo", "append=other.mkv"), ".mkv")
+        self.assertEqual(suffix("extract", "append=other.mkv", "extract=1"), ".mka")
+
+    def test_build_extract_chain(self) -> None:
+        cmd = build_stage_command(
+            Path("video.mkv"),
+            _actions("extract=1", "atempo", "atempo_with=1.01", "hasten=4.8"),
+            Path("out.mka"),
+            probe=_probe,
+        )
+        graph = cmd[cmd.index("-filter_complex") + 1]
+        self.assertEqual(graph, "[0:a:1]atempo=0.96863,atrim=start=4.8,asetpts=PTS-STARTPTS[a0]")
+        self.assertEqual(cmd.count("-i"), 1)
+        self.assertIn("flac", cmd)
+
+    def test_build_append_keeps_other_streams_copied(self) -> None:
+        cmd = build_stage_command(
+            Path("video.mkv"),
+            _actions("extract", "atempo", "append=other.mkv"),
+            Path("out.mkv"),
+            probe=_probe,
+        )
+        maps = [cmd[i + 1] for i, arg in enumerate(cmd) if arg == "-map"]
+        self.assertEqual(maps, ["1", "[a0]"])
+        self.assertEqual(cmd[cmd.index("-c:0") + 1], "copy")
+        self.assertEqual(cmd[cmd.index("-c:1") + 1], "copy")
+        self.assertEqual(cmd[cmd.index("-c:2") + 1], "flac")
+
+    def test_build_subtitles_language(self) -> None:
+        cmd = build_stage_command(Path("video.mkv"), _actions("append_subs=subs.srt"), Path("out.mkv"), probe=_probe)
+        self.assertIn("-metadata:s:4", cmd)
+        self.assertEqual(cmd[cmd.index("-metadata:s:4") + 1], "language=spa")